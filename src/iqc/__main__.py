@@ -0,0 +1,7 @@
+# src/iqc/__main__.py
+
+import sys
+
+from iqc.cli import main
+
+sys.exit(main())
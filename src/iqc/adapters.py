@@ -0,0 +1,352 @@
+# src/iqc/adapters.py
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import json
+import time
+
+from iqc.core import Provider, ProviderResponse, _raise_for_status
+from iqc.sessions import http_post
+from iqc.timing import current_timing
+
+
+Usage = Tuple[Optional[int], Optional[int]]  # (prompt tokens, completion tokens)
+
+
+# ---------- Shared request / stream plumbing ----------
+
+@dataclass
+class PreparedRequest:
+    url: str
+    headers: Dict[str, str]
+    payload: Dict[str, Any]
+
+
+class _StreamClock:
+    """Collects content-chunk arrival times for one streamed response."""
+
+    def __init__(self, t0: float) -> None:
+        self.t0 = t0
+        self.parts: List[str] = []
+        self.arrivals: List[float] = []
+        self.usage: Usage = (None, None)
+        self.finish_reason: Optional[str] = None
+
+    def add(self, text: Optional[str]) -> None:
+        if text:
+            self.arrivals.append(time.perf_counter())
+            self.parts.append(text)
+
+    def finish(self) -> ProviderResponse:
+        total_ms = (time.perf_counter() - self.t0) * 1000.0
+        ttft_ms = None
+        itl_mean_ms = itl_p95_ms = None
+        if self.arrivals:
+            ttft_ms = (self.arrivals[0] - self.t0) * 1000.0
+            gaps = sorted(
+                (b - a) * 1000.0 for a, b in zip(self.arrivals, self.arrivals[1:])
+            )
+            if gaps:
+                itl_mean_ms = sum(gaps) / len(gaps)
+                itl_p95_ms = gaps[min(len(gaps) - 1, int(0.95 * len(gaps)))]
+        return ProviderResponse(
+            text="".join(self.parts),
+            total_ms=total_ms,
+            streamed=True,
+            ttft_ms=ttft_ms,
+            itl_mean_ms=itl_mean_ms,
+            itl_p95_ms=itl_p95_ms,
+            chunks=len(self.arrivals),
+            prompt_tokens=self.usage[0],
+            completion_tokens=self.usage[1],
+            finish_reason=self.finish_reason,
+        )
+
+
+def _as_int(v: Any) -> Optional[int]:
+    try:
+        return None if v is None else int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _iter_stream_events(resp: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Yield decoded JSON events from a streaming response, one at a time.
+    Handles both server-sent events (`data: {...}`) and newline-delimited
+    JSON, which is what Cohere's v1 chat stream uses.
+    """
+    for raw in resp.iter_lines():
+        if not raw:
+            continue
+        line = raw.decode("utf-8", errors="replace") if isinstance(raw, bytes) else raw
+        if line.startswith("data:"):
+            data = line[5:].strip()
+        elif line.startswith("{"):
+            data = line
+        else:
+            continue  # SSE comments, event:/id:/retry: fields
+        if data == "[DONE]":
+            return
+        timing = current_timing()
+        td = time.perf_counter()
+        try:
+            ev = json.loads(data)
+        except ValueError:
+            continue
+        if timing is not None:
+            timing.since("decode_ms", td)
+        yield ev
+
+
+# ---------- Adapter interface ----------
+
+class ProviderAdapter:
+    """
+    Wire format of one provider family. Subclasses describe how to build a
+    request and read its response; `call` does the HTTP round trip.
+    """
+
+    kind: str = ""
+    # Endpoint to name in OpenAI-style batch jobs (iqc.batch); None when
+    # the provider family has no batch API.
+    batch_endpoint: Optional[str] = None
+
+    def auth_headers(self, provider: Provider, api_key: str) -> Dict[str, str]:
+        headers = {}
+        if api_key:
+            headers[provider.auth_header] = f"{provider.bearer_prefix}{api_key}"
+        headers.update(provider.extra_headers)
+        return headers
+
+    def build_request(
+        self,
+        provider: Provider,
+        api_key: str,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        stream: bool = False,
+    ) -> PreparedRequest:
+        raise NotImplementedError
+
+    def parse_response(self, data: Dict[str, Any]) -> str:
+        raise NotImplementedError
+
+    def parse_usage(self, data: Dict[str, Any]) -> Usage:
+        return None, None
+
+    def parse_finish_reason(self, data: Dict[str, Any]) -> Optional[str]:
+        return None
+
+    def parse_stream_event(self, event: Dict[str, Any], clock: _StreamClock) -> None:
+        """Fold one streamed event into `clock` (text, usage, finish reason)."""
+        raise NotImplementedError
+
+    def call(
+        self,
+        provider: Provider,
+        api_key: str,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        stream: bool = False,
+        timeout: float = 60.0,
+    ) -> ProviderResponse:
+        req = self.build_request(
+            provider, api_key, model, messages, temperature, max_tokens, stream
+        )
+        timing = current_timing()
+        t0 = time.perf_counter()
+        if stream:
+            with http_post(
+                req.url, headers=req.headers, json=req.payload, timeout=timeout, stream=True
+            ) as resp:
+                _raise_for_status(resp, provider.name)
+                clock = _StreamClock(t0)
+                for ev in _iter_stream_events(resp):
+                    td = time.perf_counter()
+                    self.parse_stream_event(ev, clock)
+                    if timing is not None:
+                        timing.since("decode_ms", td)
+                if timing is not None:
+                    timing.body_read()
+                return clock.finish()
+
+        resp = http_post(req.url, headers=req.headers, json=req.payload, timeout=timeout)
+        _raise_for_status(resp, provider.name)
+        td = time.perf_counter()
+        data = resp.json()
+        text = self.parse_response(data)
+        prompt_tokens, completion_tokens = self.parse_usage(data)
+        finish_reason = self.parse_finish_reason(data)
+        if timing is not None:
+            timing.since("decode_ms", td)
+        return ProviderResponse(
+            text=text,
+            total_ms=(time.perf_counter() - t0) * 1000.0,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            finish_reason=finish_reason,
+        )
+
+
+# ---------- Built-in adapters ----------
+
+class OpenAICompatibleAdapter(ProviderAdapter):
+    kind = "openai_compatible"
+    path = "/v1/chat/completions"
+    batch_endpoint = path
+
+    def build_request(self, provider, api_key, model, messages, temperature, max_tokens, stream=False):
+        if not provider.base_url:
+            raise ValueError("Base URL is required for this provider.")
+        headers = {"Content-Type": "application/json"}
+        headers.update(self.auth_headers(provider, api_key))
+        payload: Dict[str, Any] = {
+            "model": model,
+            "messages": messages,
+            "temperature": float(temperature),
+            "max_tokens": int(max_tokens),
+            "stream": bool(stream),
+        }
+        if stream:
+            payload["stream_options"] = {"include_usage": True}
+            headers["Accept"] = "text/event-stream"
+        return PreparedRequest(provider.base_url.rstrip("/") + self.path, headers, payload)
+
+    def parse_response(self, data):
+        try:
+            return data["choices"][0]["message"]["content"]
+        except Exception:  # noqa: BLE001
+            return json.dumps(data, indent=2)
+
+    def parse_usage(self, data):
+        # Groq reports streaming usage under `x_groq.usage`.
+        u = data.get("usage") or (data.get("x_groq") or {}).get("usage") or {}
+        return _as_int(u.get("prompt_tokens")), _as_int(u.get("completion_tokens"))
+
+    def parse_finish_reason(self, data):
+        return ((data.get("choices") or [{}])[0] or {}).get("finish_reason")
+
+    def parse_stream_event(self, event, clock):
+        for ch in event.get("choices") or []:
+            clock.add((ch.get("delta") or {}).get("content"))
+            clock.finish_reason = ch.get("finish_reason") or clock.finish_reason
+        usage = self.parse_usage(event)
+        if usage != (None, None):
+            clock.usage = usage
+
+
+class CohereChatAdapter(ProviderAdapter):
+    kind = "cohere_chat"
+
+    def build_request(self, provider, api_key, model, messages, temperature, max_tokens, stream=False):
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        }
+        headers.update(provider.extra_headers)
+        user_turns = [m["content"] for m in messages if m["role"] == "user"]
+        prompt = "\n\n".join(user_turns) if user_turns else messages[-1]["content"]
+        payload: Dict[str, Any] = {
+            "model": model,
+            "message": prompt,
+            "temperature": float(temperature),
+            "max_tokens": int(max_tokens),
+        }
+        if stream:
+            payload["stream"] = True
+        base = (provider.base_url or "https://api.cohere.com").rstrip("/")
+        return PreparedRequest(base + "/v1/chat", headers, payload)
+
+    def parse_response(self, data):
+        return data.get("text") or data.get("message", {}).get(
+            "content", json.dumps(data, indent=2)
+        )
+
+    def parse_usage(self, data):
+        meta = data.get("meta") or {}
+        u = meta.get("billed_units") or meta.get("tokens") or {}
+        return _as_int(u.get("input_tokens")), _as_int(u.get("output_tokens"))
+
+    def parse_finish_reason(self, data):
+        return data.get("finish_reason")
+
+    def parse_stream_event(self, event, clock):
+        etype = event.get("event_type")
+        if etype == "text-generation":
+            clock.add(event.get("text"))
+        elif etype == "stream-end":
+            clock.finish_reason = event.get("finish_reason")
+            clock.usage = self.parse_usage(event.get("response") or {})
+
+
+class GeminiAdapter(ProviderAdapter):
+    kind = "gemini"
+
+    def build_request(self, provider, api_key, model, messages, temperature, max_tokens, stream=False):
+        contents = []
+        for m in messages:
+            role = "user" if m["role"] != "assistant" else "model"
+            contents.append({"role": role, "parts": [{"text": m["content"]}]})
+        method = "streamGenerateContent?alt=sse&" if stream else "generateContent?"
+        base = (provider.base_url or "https://generativelanguage.googleapis.com").rstrip("/")
+        url = f"{base}/v1beta/models/{model}:{method}key={api_key}"
+        payload = {
+            "contents": contents,
+            "generationConfig": {
+                "temperature": float(temperature),
+                "maxOutputTokens": int(max_tokens),
+            },
+        }
+        headers = {"Content-Type": "application/json"}
+        headers.update(provider.extra_headers)
+        return PreparedRequest(url, headers, payload)
+
+    def parse_response(self, data):
+        try:
+            return data["candidates"][0]["content"]["parts"][0]["text"]
+        except Exception:  # noqa: BLE001
+            return json.dumps(data, indent=2)
+
+    def parse_usage(self, data):
+        u = data.get("usageMetadata") or {}
+        return _as_int(u.get("promptTokenCount")), _as_int(u.get("candidatesTokenCount"))
+
+    def parse_finish_reason(self, data):
+        return ((data.get("candidates") or [{}])[0] or {}).get("finishReason")
+
+    def parse_stream_event(self, event, clock):
+        for cand in event.get("candidates") or []:
+            for part in (cand.get("content") or {}).get("parts") or []:
+                clock.add(part.get("text"))
+            clock.finish_reason = cand.get("finishReason") or clock.finish_reason
+        usage = self.parse_usage(event)
+        if usage != (None, None):
+            clock.usage = usage
+
+
+# ---------- Registry ----------
+
+ADAPTERS: Dict[str, ProviderAdapter] = {}
+
+
+def register_adapter(adapter: ProviderAdapter) -> ProviderAdapter:
+    ADAPTERS[adapter.kind] = adapter
+    return adapter
+
+
+def get_adapter(kind: str) -> ProviderAdapter:
+    try:
+        return ADAPTERS[kind]
+    except KeyError:
+        raise RuntimeError(f"No adapter registered for provider kind: {kind}") from None
+
+
+for _adapter in (OpenAICompatibleAdapter(), CohereChatAdapter(), GeminiAdapter()):
+    register_adapter(_adapter)
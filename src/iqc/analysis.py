@@ -0,0 +1,614 @@
+# src/iqc/analysis.py
+
+"""
+Vectorized analytics over exported runs.
+
+`load_runs` reads one or more runs into a `RunArrays`: one NumPy array per
+field, with text fields (run, provider, model, question) held as integer
+codes plus a label table. Every statistic below is then a few array
+operations over all rows at once (sort, bincount, fancy indexing), with no
+per-row Python:
+
+    summarize(arrays, by=("run_id", "provider", "model"))
+        rows, errors, error_rate, latency mean / percentiles, token
+        throughput, output-token and response-length distributions
+    length_histogram(arrays, by=("provider", "model"))
+    compare_runs(arrays, "base", "new") / pairwise_comparisons(arrays)
+
+Loading is the expensive part. A run compacted to Parquet (`iqc compact`,
+needs pyarrow) loads column by column in C and is preferred automatically;
+JSONL run files are parsed line by line as a fallback.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from itertools import combinations
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import json
+
+import numpy as np
+
+from iqc.columnar import default_dataset_dir, open_dataset, pyarrow_available, read_runs
+from iqc.export import RUN_FILE_PREFIX, SHARD_RE, run_files
+
+
+KEY_FIELDS = ("run_id", "provider", "model", "question_id")
+PERCENTILES = (50, 90, 95, 99)
+SOURCES = ("auto", "parquet", "jsonl")
+_COLUMNS = (
+    "run_id",
+    "provider",
+    "model",
+    "question_id",
+    "cell_key",
+    "status",
+    "latency_ms",
+    "token_input",
+    "token_output",
+    "cache_hit",
+    "dedup_of",
+    "warmup",
+    "response_text",
+)
+_COLUMN_TYPES = {
+    "latency_ms": "float64",
+    "token_input": "int64",
+    "token_output": "int64",
+    "cache_hit": "bool",
+    "warmup": "bool",
+}
+
+
+# ---------- Arrays ----------
+
+@dataclass
+class RunArrays:
+    """
+    Column arrays over the rows of one or more runs. `codes[f]` indexes
+    `labels[f]` for each of KEY_FIELDS. `measured` marks rows whose
+    latency describes a provider call: ok, not cached, not a shared copy.
+    Missing numbers are NaN.
+    """
+
+    codes: Dict[str, np.ndarray]
+    labels: Dict[str, List[Optional[str]]]
+    ok: np.ndarray
+    measured: np.ndarray
+    cache_hit: np.ndarray
+    latency_ms: np.ndarray
+    token_input: np.ndarray
+    token_output: np.ndarray
+    response_chars: np.ndarray
+    source: str = "jsonl"
+    runs: List[str] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.ok)
+
+    def select(self, mask: np.ndarray) -> "RunArrays":
+        """Rows where `mask` is true; label tables are shared."""
+        return RunArrays(
+            codes={k: v[mask] for k, v in self.codes.items()},
+            labels=self.labels,
+            ok=self.ok[mask],
+            measured=self.measured[mask],
+            cache_hit=self.cache_hit[mask],
+            latency_ms=self.latency_ms[mask],
+            token_input=self.token_input[mask],
+            token_output=self.token_output[mask],
+            response_chars=self.response_chars[mask],
+            source=self.source,
+            runs=self.runs,
+        )
+
+    def where(self, **values: Any) -> "RunArrays":
+        """Rows whose key fields equal the given labels, e.g. run_id="r1"."""
+        mask = np.ones(len(self), dtype=bool)
+        for name, value in values.items():
+            labels = self.labels[name]
+            code = labels.index(value) if value in labels else -1
+            mask &= self.codes[name] == code
+        return self.select(mask)
+
+    def to_pandas(self) -> Any:
+        """DataFrame with categorical key columns (needs pandas)."""
+        import pandas as pd
+
+        data: Dict[str, Any] = {
+            name: pd.Categorical.from_codes(self.codes[name], self.labels[name])
+            if None not in self.labels[name]
+            else np.asarray(self.labels[name], dtype=object)[self.codes[name]]
+            for name in KEY_FIELDS
+        }
+        for name in (
+            "ok",
+            "measured",
+            "cache_hit",
+            "latency_ms",
+            "token_input",
+            "token_output",
+            "response_chars",
+        ):
+            data[name] = getattr(self, name)
+        return pd.DataFrame(data)
+
+
+class _Encoder:
+    """Label -> dense int code, in first-seen order."""
+
+    def __init__(self) -> None:
+        self.index: Dict[Optional[str], int] = {}
+        self.codes: List[int] = []
+
+    def add(self, value: Any) -> None:
+        value = None if value is None else str(value)
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.index)
+        self.codes.append(code)
+
+    def arrays(self) -> Tuple[np.ndarray, List[Optional[str]]]:
+        return np.asarray(self.codes, dtype=np.int32), list(self.index)
+
+
+def _num(values: List[Any]) -> np.ndarray:
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+# ---------- Loading ----------
+
+def discover_runs(export_dir: Path) -> List[str]:
+    """Run ids with a manifest in `export_dir`, shards excluded."""
+    out = []
+    for path in sorted(Path(export_dir).glob(f"{RUN_FILE_PREFIX}*.manifest.json")):
+        run_id = path.name[len(RUN_FILE_PREFIX) : -len(".manifest.json")]
+        if not SHARD_RE.search(run_id):
+            out.append(run_id)
+    return out
+
+
+def _compacted(root: Path, run_ids: Sequence[str]) -> bool:
+    return all((root / f"run_id={r}").is_dir() for r in run_ids)
+
+
+def _from_jsonl(export_dir: Path, run_ids: Sequence[str], all_rows: bool) -> RunArrays:
+    keys = {name: _Encoder() for name in KEY_FIELDS}
+    cells: Dict[Tuple[str, str], int] = {}
+    unkeyed: List[int] = []
+    status: List[Any] = []
+    cache_hit: List[bool] = []
+    shared: List[bool] = []
+    latency: List[Any] = []
+    tok_in: List[Any] = []
+    tok_out: List[Any] = []
+    chars: List[int] = []
+    loads = json.loads
+    for run_id in run_ids:
+        for path in run_files(export_dir, run_id):
+            with path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    row = loads(line)
+                    if row.get("warmup"):
+                        continue
+                    if row.get("cell_key"):
+                        cells[(run_id, row["cell_key"])] = len(status)
+                    else:
+                        unkeyed.append(len(status))
+                    for name, enc in keys.items():
+                        enc.add(row.get(name))
+                    status.append(row.get("status"))
+                    cache_hit.append(bool(row.get("cache_hit")))
+                    shared.append(bool(row.get("dedup_of")))
+                    latency.append(row.get("latency_ms"))
+                    tok_in.append(row.get("token_input"))
+                    tok_out.append(row.get("token_output"))
+                    chars.append(len(row.get("response_text") or ""))
+
+    codes, labels = {}, {}
+    for name, enc in keys.items():
+        codes[name], labels[name] = enc.arrays()
+    ok = np.array([s == "ok" for s in status], dtype=bool)
+    hit = np.asarray(cache_hit, dtype=bool)
+    arrays = RunArrays(
+        codes=codes,
+        labels=labels,
+        ok=ok,
+        measured=ok & ~hit & ~np.asarray(shared, dtype=bool),
+        cache_hit=hit,
+        latency_ms=_num(latency),
+        token_input=_num(tok_in),
+        token_output=_num(tok_out),
+        response_chars=np.asarray(chars, dtype=np.float64),
+        source="jsonl",
+        runs=list(run_ids),
+    )
+    if all_rows or len(cells) + len(unkeyed) == len(arrays):
+        return arrays
+    # A resumed run appends retried cells again; the last row is current.
+    # Rows without a cell_key (older exports) are all kept.
+    keep = np.zeros(len(arrays), dtype=bool)
+    keep[np.fromiter(cells.values(), dtype=np.int64, count=len(cells))] = True
+    keep[np.asarray(unkeyed, dtype=np.int64)] = True
+    return arrays.select(keep)
+
+
+def _from_parquet(root: Path, run_ids: Sequence[str]) -> RunArrays:
+    # Project to the fields used here; older datasets may lack some.
+    names = set(open_dataset(root).schema.names)
+    table = read_runs(root, [c for c in _COLUMNS if c in names], run_id=list(run_ids))
+    return _from_table(table, "parquet", run_ids)
+
+
+def _read_jsonl_arrow(
+    export_dir: Path, run_ids: Sequence[str], all_rows: bool
+) -> Optional[Any]:
+    """
+    Run files through pyarrow's multi-threaded JSON reader, or None when it
+    cannot take them (no pyarrow, or values that do not fit the expected
+    types, e.g. numeric question ids) and the Python parser must.
+    """
+    if not pyarrow_available():
+        return None
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.json as pj
+
+    schema = pa.schema([(c, _COLUMN_TYPES.get(c, "string")) for c in _COLUMNS])
+    parse = pj.ParseOptions(explicit_schema=schema, unexpected_field_behavior="ignore")
+    read = pj.ReadOptions(block_size=16 << 20)
+    tables = []
+    try:
+        for run_id in run_ids:
+            parts = [
+                pj.read_json(path, read_options=read, parse_options=parse)
+                for path in run_files(export_dir, run_id)
+            ]
+            table = pa.concat_tables(parts) if len(parts) > 1 else parts[0]
+            if not all_rows and table.num_rows:
+                # Last row per cell_key, as a resume appends retried cells.
+                keys = table.column("cell_key")
+                codes = pc.index_in(keys, value_set=pc.unique(keys))
+                codes = pc.fill_null(codes, -1).to_numpy(zero_copy_only=False)
+                n = len(codes)
+                _, first = np.unique(codes[::-1], return_index=True)
+                keep = np.zeros(n, dtype=bool)
+                keep[n - 1 - first] = True
+                keep |= codes == -1
+                if not keep.all():
+                    table = table.filter(pa.array(keep))
+            tables.append(table)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None
+    return pa.concat_tables(tables)
+
+
+def _from_table(table: Any, source: str, run_ids: Sequence[str]) -> RunArrays:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    names = set(table.schema.names)
+    n = table.num_rows
+
+    def col(name: str) -> Any:
+        return table.column(name) if name in names else None
+
+    def flag(name: str) -> np.ndarray:
+        c = col(name)
+        if c is None:
+            return np.zeros(n, dtype=bool)
+        if not pa.types.is_boolean(c.type):
+            c = pc.is_valid(c)
+        return pc.fill_null(c, False).to_numpy(zero_copy_only=False).astype(bool)
+
+    def number(name: str) -> np.ndarray:
+        c = col(name)
+        if c is None:
+            return np.full(n, np.nan)
+        return c.cast(pa.float64()).to_numpy(zero_copy_only=False).astype(np.float64)
+
+    warm = flag("warmup")
+    codes, labels = {}, {}
+    for name in KEY_FIELDS:
+        c = col(name)
+        if c is None:
+            codes[name], labels[name] = np.zeros(n, dtype=np.int32), [None]
+            continue
+        c = c.cast(pa.string())
+        uniq = pc.unique(c)
+        codes[name] = (
+            pc.index_in(c, value_set=uniq).to_numpy(zero_copy_only=False).astype(np.int32)
+        )
+        labels[name] = uniq.to_pylist()
+    status = col("status")
+    ok = (
+        pc.fill_null(pc.equal(status.cast(pa.string()), "ok"), False)
+        .to_numpy(zero_copy_only=False)
+        .astype(bool)
+    )
+    text = col("response_text")
+    chars = (
+        np.zeros(n)
+        if text is None
+        else pc.fill_null(pc.utf8_length(text), 0).to_numpy(zero_copy_only=False)
+    )
+    hit = flag("cache_hit")
+    arrays = RunArrays(
+        codes=codes,
+        labels=labels,
+        ok=ok,
+        measured=ok & ~hit & ~flag("dedup_of"),
+        cache_hit=hit,
+        latency_ms=number("latency_ms"),
+        token_input=number("token_input"),
+        token_output=number("token_output"),
+        response_chars=chars.astype(np.float64),
+        source=source,
+        runs=list(run_ids),
+    )
+    return arrays.select(~warm) if warm.any() else arrays
+
+
+def load_runs(
+    export_dir: Path,
+    run_ids: Optional[Iterable[str]] = None,
+    *,
+    source: str = "auto",
+    dataset: Optional[Path] = None,
+    all_rows: bool = False,
+) -> RunArrays:
+    """
+    Load `run_ids` (default: every run in `export_dir`) into arrays.
+
+    `source` "parquet" reads the compacted dataset (`dataset`, default
+    <export_dir>/parquet), "jsonl" the run files; "auto" uses Parquet when
+    pyarrow is installed and every run has been compacted. Warm-up rows
+    are dropped. From JSONL only the latest row per cell is kept unless
+    `all_rows` (compaction already keeps just the latest by default).
+    """
+    if source not in SOURCES:
+        raise ValueError(f"Unknown source: {source}")
+    export_dir = Path(export_dir)
+    run_ids = list(run_ids) if run_ids is not None else discover_runs(export_dir)
+    if not run_ids:
+        raise FileNotFoundError(f"No runs in {export_dir}")
+    root = Path(dataset) if dataset is not None else default_dataset_dir(export_dir)
+    if source == "auto":
+        source = (
+            "parquet" if pyarrow_available() and _compacted(root, run_ids) else "jsonl"
+        )
+    if source == "parquet":
+        return _from_parquet(root, run_ids)
+    missing = [r for r in run_ids if not run_files(export_dir, r)]
+    if missing:
+        raise FileNotFoundError(f"No run files for {', '.join(missing)} in {export_dir}")
+    table = _read_jsonl_arrow(export_dir, run_ids, all_rows)
+    if table is not None:
+        return _from_table(table, "jsonl", run_ids)
+    return _from_jsonl(export_dir, run_ids, all_rows)
+
+
+# ---------- Grouped statistics ----------
+
+def group_rows(arrays: RunArrays, by: Sequence[str]) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+    """
+    Group id per row for the key fields `by`, and the key labels of each
+    group (groups sorted by code, i.e. first-seen order per field).
+    """
+    for name in by:
+        if name not in KEY_FIELDS:
+            raise ValueError(f"Cannot group by {name}; use {', '.join(KEY_FIELDS)}")
+    if not by:
+        return np.zeros(len(arrays), dtype=np.int64), [{}]
+    dims = tuple(max(1, len(arrays.labels[name])) for name in by)
+    flat = np.ravel_multi_index(tuple(arrays.codes[name] for name in by), dims)
+    uniq, group = np.unique(flat, return_inverse=True)
+    parts = np.unravel_index(uniq, dims)
+    keys = [
+        {name: arrays.labels[name][int(c)] for name, c in zip(by, combo)}
+        for combo in zip(*parts)
+    ]
+    return group.reshape(-1), keys
+
+
+def grouped_percentiles(
+    values: np.ndarray, group: np.ndarray, n_groups: int, qs: Sequence[float]
+) -> np.ndarray:
+    """
+    (groups × len(qs)) percentiles of `values` per group, NaN ignored,
+    linear interpolation as in numpy.percentile. One sort for all groups.
+    """
+    out = np.full((n_groups, len(qs)), np.nan)
+    valid = ~np.isnan(values)
+    v, g = values[valid], group[valid]
+    # Sort by value, then stably by group: cheaper than np.lexsort, and a
+    # stable sort of small ints is a radix sort.
+    order = np.argsort(v)
+    small = np.uint16 if n_groups <= np.iinfo(np.uint16).max else np.int64
+    order = order[np.argsort(g[order].astype(small), kind="stable")]
+    v, g = v[order], g[order]
+    counts = np.bincount(g, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    has = counts > 0
+    for j, q in enumerate(qs):
+        pos = starts[has] + (counts[has] - 1) * (q / 100.0)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.ceil(pos).astype(np.int64)
+        out[has, j] = v[lo] + (v[hi] - v[lo]) * (pos - lo)
+    return out
+
+
+def _grouped_mean(values: np.ndarray, group: np.ndarray, n_groups: int) -> np.ndarray:
+    valid = ~np.isnan(values)
+    n = np.bincount(group[valid], minlength=n_groups)
+    total = np.bincount(group[valid], weights=values[valid], minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, total / np.maximum(n, 1), np.nan)
+
+
+def _value(x: Any) -> Any:
+    if isinstance(x, (np.floating, float)):
+        return None if np.isnan(x) else float(x)
+    if isinstance(x, np.integer):
+        return int(x)
+    return x
+
+
+def summarize(
+    arrays: RunArrays,
+    by: Sequence[str] = ("run_id", "provider", "model"),
+    percentiles: Sequence[float] = PERCENTILES,
+) -> List[Dict[str, Any]]:
+    """
+    One row of statistics per group:
+
+      rows, errors, error_rate, cache_hits
+      latency_mean_ms, latency_p<q>_ms      over measured calls
+      output_tokens_per_s                   sum(output tokens) / sum(latency)
+      output_tokens_per_s_p50               median per-call rate
+      token_output_mean, token_output_p<q>  ok rows
+      response_chars_mean, response_chars_p<q>
+    """
+    group, keys = group_rows(arrays, by)
+    n = len(keys)
+    rows = np.bincount(group, minlength=n)
+    errors = np.bincount(group, weights=~arrays.ok, minlength=n)
+    hits = np.bincount(group, weights=arrays.cache_hit, minlength=n)
+
+    latency = np.where(arrays.measured, arrays.latency_ms, np.nan)
+    lat_q = grouped_percentiles(latency, group, n, percentiles)
+    tokens = np.where(arrays.measured, arrays.token_output, np.nan)
+    both = ~np.isnan(latency) & ~np.isnan(tokens)
+    tok_sum = np.bincount(group[both], weights=tokens[both], minlength=n)
+    lat_sum = np.bincount(group[both], weights=latency[both], minlength=n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rate = np.where(both, tokens / (latency / 1000.0), np.nan)
+        throughput = np.where(lat_sum > 0, tok_sum / (lat_sum / 1000.0), np.nan)
+    rate_p50 = grouped_percentiles(rate, group, n, (50,))[:, 0]
+
+    out_tokens = np.where(arrays.ok, arrays.token_output, np.nan)
+    tok_q = grouped_percentiles(out_tokens, group, n, percentiles)
+    chars = np.where(arrays.ok, arrays.response_chars, np.nan)
+    chars_q = grouped_percentiles(chars, group, n, percentiles)
+
+    columns: Dict[str, np.ndarray] = {
+        "rows": rows,
+        "errors": errors.astype(np.int64),
+        "error_rate": errors / np.maximum(rows, 1),
+        "cache_hits": hits.astype(np.int64),
+        "latency_mean_ms": _grouped_mean(latency, group, n),
+    }
+    for j, q in enumerate(percentiles):
+        columns[f"latency_p{q:g}_ms"] = lat_q[:, j]
+    columns["output_tokens_per_s"] = throughput
+    columns["output_tokens_per_s_p50"] = rate_p50
+    columns["token_output_mean"] = _grouped_mean(out_tokens, group, n)
+    for j, q in enumerate(percentiles):
+        columns[f"token_output_p{q:g}"] = tok_q[:, j]
+    columns["response_chars_mean"] = _grouped_mean(chars, group, n)
+    for j, q in enumerate(percentiles):
+        columns[f"response_chars_p{q:g}"] = chars_q[:, j]
+
+    return [
+        dict(key, **{name: _value(col[i]) for name, col in columns.items()})
+        for i, key in enumerate(keys)
+    ]
+
+
+def length_histogram(
+    arrays: RunArrays,
+    by: Sequence[str] = ("provider", "model"),
+    metric: str = "response_chars",
+    bins: int = 20,
+) -> Dict[str, Any]:
+    """
+    Distribution of `metric` ("response_chars" or "token_output") over ok
+    rows, as counts per group on shared bin edges.
+    """
+    if metric not in ("response_chars", "token_output"):
+        raise ValueError(f"Unknown length metric: {metric}")
+    group, keys = group_rows(arrays, by)
+    values = getattr(arrays, metric)
+    valid = arrays.ok & ~np.isnan(values)
+    v, g = values[valid], group[valid]
+    edges = np.histogram_bin_edges(v, bins=bins) if len(v) else np.linspace(0, 1, bins + 1)
+    idx = np.clip(np.searchsorted(edges, v, side="right") - 1, 0, bins - 1)
+    counts = np.bincount(g * bins + idx, minlength=len(keys) * bins).reshape(len(keys), bins)
+    return {
+        "metric": metric,
+        "edges": edges.tolist(),
+        "groups": [dict(key, counts=counts[i].tolist()) for i, key in enumerate(keys)],
+    }
+
+
+# ---------- Run comparisons ----------
+
+_COMPARED = (
+    "rows",
+    "error_rate",
+    "latency_mean_ms",
+    "latency_p50_ms",
+    "latency_p95_ms",
+    "output_tokens_per_s",
+    "response_chars_mean",
+)
+
+
+def _pair(
+    by_key: Dict[Tuple[Any, ...], Dict[str, Dict[str, Any]]],
+    by: Sequence[str],
+    base: str,
+    other: str,
+) -> List[Dict[str, Any]]:
+    out = []
+    for key, per_run in by_key.items():
+        a, b = per_run.get(base), per_run.get(other)
+        if a is None or b is None:
+            continue
+        row: Dict[str, Any] = dict(zip(by, key), base_run=base, run_id=other)
+        for stat in _COMPARED:
+            x, y = a.get(stat), b.get(stat)
+            delta = f"{stat[:-3]}_delta_ms" if stat.endswith("_ms") else f"{stat}_delta"
+            row[f"base_{stat}"] = x
+            row[stat] = y
+            row[delta] = None if x is None or y is None else y - x
+        x, y = a.get("latency_p50_ms"), b.get("latency_p50_ms")
+        row["latency_p50_ratio"] = y / x if x and y is not None else None
+        out.append(row)
+    return out
+
+
+def pairwise_comparisons(
+    arrays: RunArrays,
+    run_ids: Optional[Sequence[str]] = None,
+    by: Sequence[str] = ("provider", "model"),
+) -> List[Dict[str, Any]]:
+    """
+    Compare every pair of runs (earlier run in `run_ids` order as the base)
+    per `by` group present in both: each statistic of the newer run next
+    to its `base_` value and delta, plus the p50 latency ratio.
+    """
+    run_ids = list(run_ids) if run_ids is not None else list(arrays.runs)
+    if "run_id" in by:
+        raise ValueError("run_id is the compared dimension; group by other fields")
+    by_key: Dict[Tuple[Any, ...], Dict[str, Dict[str, Any]]] = {}
+    for row in summarize(arrays, ("run_id",) + tuple(by), percentiles=(50, 95)):
+        key = tuple(row[name] for name in by)
+        by_key.setdefault(key, {})[row["run_id"]] = row
+    out: List[Dict[str, Any]] = []
+    for base, other in combinations(run_ids, 2):
+        out.extend(_pair(by_key, by, base, other))
+    return out
+
+
+def compare_runs(
+    arrays: RunArrays,
+    base: str,
+    other: str,
+    by: Sequence[str] = ("provider", "model"),
+) -> List[Dict[str, Any]]:
+    """`pairwise_comparisons` for one pair."""
+    return pairwise_comparisons(arrays, [base, other], by)
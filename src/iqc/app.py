@@ -11,6 +11,7 @@ if str(SRC) not in sys.path:
 
 import streamlit as st
 
+from iqc.core import DEFAULT_SYSTEM_PROMPT, QuestionBank
 from iqc.ui import setup_page
 from iqc.config_ui import (
     providers_config_section,
@@ -20,20 +21,17 @@ from iqc.matrix import (
     matrix_selection_section,
     export_directory_section,
     run_matrix_section,
+    jobs_section,
 )
 
 
 def system_prompt_section() -> None:
     if "system_prompt" not in st.session_state:
-        st.session_state.system_prompt = (
-            "You are a transparent, careful assistant. "
-            "If uncertain, say so explicitly; avoid speculation; "
-            "use cautious, calibrated language."
-        )
+        st.session_state.system_prompt = DEFAULT_SYSTEM_PROMPT
     if "experiment_tag" not in st.session_state:
         st.session_state["experiment_tag"] = None
     if "q_bank" not in st.session_state:
-        st.session_state["q_bank"] = []
+        st.session_state["q_bank"] = QuestionBank((), ())
     if "yaml_entries" not in st.session_state:
         st.session_state["yaml_entries"] = []
 
@@ -57,6 +55,7 @@ def main() -> None:
     selected_q_idxs, selected_model_idxs = matrix_selection_section()
     export_directory_section()
     run_matrix_section(selected_q_idxs, selected_model_idxs)
+    jobs_section()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,177 @@
+# src/iqc/batch.py
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional
+import json
+
+from iqc.adapters import ProviderAdapter
+from iqc.core import Provider, ProviderResponse, _raise_for_status
+from iqc.sessions import http_get, http_post
+
+
+# ---------- OpenAI-style batch jobs ----------
+#
+# Flow: upload a JSONL file of requests (POST /v1/files, purpose=batch),
+# create a job over it (POST /v1/batches), poll GET /v1/batches/<id> until
+# it reaches a terminal status, then download the output and error files
+# (GET /v1/files/<id>/content). Each request line carries a `custom_id`
+# that comes back on its result line.
+
+BATCH_TERMINAL = frozenset({"completed", "failed", "expired", "cancelled"})
+DEFAULT_BATCH_POLL_S = 30.0
+DEFAULT_COMPLETION_WINDOW = "24h"
+
+
+@dataclass
+class BatchItem:
+    custom_id: str
+    response: Optional[ProviderResponse] = None
+    error: Optional[str] = None
+
+
+class BatchJob:
+    """One batch job against a single provider endpoint."""
+
+    def __init__(
+        self,
+        provider: Provider,
+        adapter: ProviderAdapter,
+        api_key: str,
+        *,
+        batch_id: Optional[str] = None,
+        completion_window: str = DEFAULT_COMPLETION_WINDOW,
+        timeout: float = 120.0,
+    ) -> None:
+        if not adapter.batch_endpoint:
+            raise RuntimeError(f"{provider.name} has no batch API.")
+        if not provider.base_url:
+            raise ValueError("Base URL is required for this provider.")
+        self.provider = provider
+        self.adapter = adapter
+        self.api_key = api_key
+        self.batch_id = batch_id
+        self.completion_window = completion_window
+        self.timeout = timeout
+        self.status: Optional[str] = None
+        self.info: Dict[str, Any] = {}
+
+    def _url(self, path: str) -> str:
+        return self.provider.base_url.rstrip("/") + path
+
+    def _headers(self) -> Dict[str, str]:
+        return self.adapter.auth_headers(self.provider, self.api_key)
+
+    @property
+    def done(self) -> bool:
+        return self.status in BATCH_TERMINAL
+
+    def submit(
+        self, bodies: Dict[str, Dict[str, Any]], metadata: Optional[Dict[str, str]] = None
+    ) -> str:
+        """Upload `{custom_id: request body}` and start the job; returns its id."""
+        lines = "".join(
+            json.dumps(
+                {
+                    "custom_id": cid,
+                    "method": "POST",
+                    "url": self.adapter.batch_endpoint,
+                    "body": body,
+                },
+                ensure_ascii=False,
+            )
+            + "\n"
+            for cid, body in bodies.items()
+        )
+        resp = http_post(
+            self._url("/v1/files"),
+            headers=self._headers(),
+            data={"purpose": "batch"},
+            files={"file": ("batch.jsonl", lines.encode("utf-8"), "application/jsonl")},
+            timeout=self.timeout,
+        )
+        _raise_for_status(resp, self.provider.name)
+        file_id = resp.json()["id"]
+
+        payload: Dict[str, Any] = {
+            "input_file_id": file_id,
+            "endpoint": self.adapter.batch_endpoint,
+            "completion_window": self.completion_window,
+        }
+        if metadata:
+            payload["metadata"] = metadata
+        resp = http_post(
+            self._url("/v1/batches"),
+            headers={"Content-Type": "application/json", **self._headers()},
+            json=payload,
+            timeout=self.timeout,
+        )
+        _raise_for_status(resp, self.provider.name)
+        self._update(resp.json())
+        self.batch_id = self.info["id"]
+        return self.batch_id
+
+    def _update(self, info: Dict[str, Any]) -> None:
+        self.info = info
+        self.status = info.get("status")
+
+    def poll(self) -> str:
+        """Refresh and return the job status."""
+        resp = http_get(
+            self._url(f"/v1/batches/{self.batch_id}"),
+            headers=self._headers(),
+            timeout=self.timeout,
+        )
+        _raise_for_status(resp, self.provider.name)
+        self._update(resp.json())
+        return self.status or ""
+
+    def _download(self, file_id: Optional[str]) -> Iterator[Dict[str, Any]]:
+        if not file_id:
+            return
+        resp = http_get(
+            self._url(f"/v1/files/{file_id}/content"),
+            headers=self._headers(),
+            timeout=self.timeout,
+        )
+        _raise_for_status(resp, self.provider.name)
+        for line in resp.text.splitlines():
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def _item(self, rec: Dict[str, Any]) -> BatchItem:
+        cid = str(rec.get("custom_id"))
+        resp = rec.get("response") or {}
+        status_code = int(resp.get("status_code") or 0)
+        body = resp.get("body")
+        if rec.get("error") or status_code >= 400 or not isinstance(body, dict):
+            detail = rec.get("error") or body
+            return BatchItem(
+                cid,
+                error=f"{self.provider.name} error {status_code or '-'}: "
+                f"{json.dumps(detail, ensure_ascii=False)}",
+            )
+        prompt_tokens, completion_tokens = self.adapter.parse_usage(body)
+        return BatchItem(
+            cid,
+            response=ProviderResponse(
+                text=self.adapter.parse_response(body),
+                total_ms=0.0,  # no per-request timing in batch mode
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                finish_reason=self.adapter.parse_finish_reason(body),
+            ),
+        )
+
+    def results(self) -> Dict[str, BatchItem]:
+        """Result per custom_id, from the output and error files."""
+        items: Dict[str, BatchItem] = {}
+        for file_key in ("output_file_id", "error_file_id"):
+            for rec in self._download(self.info.get(file_key)):
+                item = self._item(rec)
+                items[item.custom_id] = item
+        return items
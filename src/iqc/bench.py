@@ -0,0 +1,245 @@
+# src/iqc/bench.py
+
+"""
+Load test of the matrix engine against the local mock server: no API
+credits, no network. Measures what the harness itself costs.
+
+Run:
+    iqc bench --calls 2000 --concurrency 32 --kind openai --kind cohere
+
+With `--rpm` every bench entry is rate limited and the report checks the
+mock's arrival times against that ceiling, retries included:
+    iqc bench --calls 1000 --rpm 600 --error-rate 0.3
+"""
+
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+import math
+import tempfile
+import time
+import tracemalloc
+
+from iqc.mockserver import MockConfig, MockServer
+from iqc.retry import RetryPolicy
+from iqc.runner import MatrixRun, RunOptions
+from iqc.timing import percentile
+
+try:  # not available on Windows
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None  # type: ignore[assignment]
+
+
+# Which registry provider stands in for each wire format.
+BENCH_PROVIDERS: Dict[str, str] = {
+    "openai": "Vercel AI Gateway (Custom)",
+    "cohere": "Cohere (Chat)",
+    "gemini": "Google AI Studio (Gemini)",
+}
+
+
+@dataclass
+class BenchReport:
+    calls: int
+    ok: int
+    errors: int
+    retried: int                  # calls that needed more than one attempt
+    wall_s: float
+    calls_per_s: float
+    latency_ms: Dict[str, float] = field(default_factory=dict)   # p50/p95/p99
+    overhead_ms: Dict[str, float] = field(default_factory=dict)  # latency − mock service time
+    efficiency: Optional[float] = None  # ideal wall time / actual (1.0 = perfect overlap)
+    peak_rss_mb: Optional[float] = None
+    traced_peak_mb: Optional[float] = None
+    rpm: Optional[float] = None
+    rpm_excess: Optional[float] = None  # worst window's requests above the rpm budget
+    server: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def rpm_exceeded(self) -> bool:
+        # One request of slack: arrivals at the mock jitter against the
+        # times the limiter admitted them.
+        return self.rpm_excess is not None and self.rpm_excess > 1.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _summary(values: Sequence[float]) -> Dict[str, float]:
+    return {f"p{q}": percentile(values, q) for q in (50, 95, 99)}
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024.0 * 1024.0) if rss > 1 << 32 else rss / 1024.0
+
+
+def rate_excess(times: Sequence[float], rpm: float) -> float:
+    """
+    Most requests any time window of `times` (seconds) holds beyond what
+    the limiter's bucket admits over it: `rpm` at once, plus rpm/60 per
+    second. Zero or less means the ceiling held.
+    """
+    rate = rpm / 60.0
+    worst, lowest = -math.inf, math.inf
+    # Window [i, j] holds j - i + 1 requests; with a_k = k - rate * t_k its
+    # excess is a_j - a_i + 1 - rpm, maximised by the lowest a_i so far.
+    for k, t in enumerate(sorted(times)):
+        a = k - rate * t
+        lowest = min(lowest, a)
+        worst = max(worst, a - lowest + 1.0)
+    return worst - rpm if times else 0.0
+
+
+def bench_entries(
+    base_url: str,
+    kinds: Sequence[str],
+    max_attempts: int = 4,
+    rpm: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    return [
+        {
+            "name": BENCH_PROVIDERS[k],
+            "model": f"mock-{k}",
+            "api_key": "mock-key",
+            "base_url": base_url,
+            "temperature": 0.0,
+            "max_tokens": 64,
+            "max_attempts": max_attempts,
+            **({"rpm": rpm} if rpm else {}),
+        }
+        for k in kinds
+    ]
+
+
+def run_benchmark(
+    calls: int = 1000,
+    concurrency: int = 16,
+    kinds: Sequence[str] = ("openai",),
+    stream: bool = False,
+    config: Optional[MockConfig] = None,
+    mock_url: Optional[str] = None,
+    export_dir: Optional[Path] = None,
+    max_attempts: int = 4,
+    trace_memory: bool = False,
+    rpm: Optional[float] = None,
+) -> BenchReport:
+    """
+    Run about `calls` cells (split evenly over `kinds`) through MatrixRun.
+    Starts an in-process mock server unless `mock_url` points at one; an
+    in-process server shares the GIL with the harness, so run `iqc mock`
+    separately for the cleanest overhead numbers.
+
+    With `rpm` each entry gets that limit; with the in-process server the
+    report then holds `rpm_excess` over every route's arrivals.
+    """
+    config = config or MockConfig()
+    kinds = list(kinds) or ["openai"]
+    unknown = [k for k in kinds if k not in BENCH_PROVIDERS]
+    if unknown:
+        raise ValueError(f"Unknown benchmark kind(s): {', '.join(unknown)}")
+
+    server = None if mock_url else MockServer(config).start()
+    url = mock_url or server.url
+    tmp = None if export_dir else tempfile.TemporaryDirectory(prefix="iqc-bench-")
+    out_dir = Path(export_dir or tmp.name)
+
+    n_q = max(1, int(math.ceil(calls / len(kinds))))
+    q_bank = [{"id": f"B{i + 1}", "text": f"Benchmark question {i + 1}?"} for i in range(n_q)]
+    entries = bench_entries(url, kinds, max_attempts, rpm)
+
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        run = MatrixRun(
+            entries=entries,
+            q_bank=q_bank,
+            selected_q_idxs=list(range(n_q)),
+            selected_model_idxs=list(range(len(entries))),
+            system_prompt="You are a benchmark target.",
+            export_dir=out_dir,
+            run_id=f"bench-{int(time.time())}",
+            options=RunOptions(
+                max_concurrency=concurrency,
+                stream=stream,
+                cache_mode="bypass",
+                retry=RetryPolicy(max_attempts=max_attempts),
+            ),
+        )
+        latencies: List[float] = []
+        retried = 0
+        t0 = time.perf_counter()
+        for result in run.results():
+            retried += int(result.attempts > 1)
+            if result.status == "ok" and result.latency_ms is not None:
+                latencies.append(result.latency_ms)
+        wall_s = time.perf_counter() - t0
+        excess = None
+        if rpm and server is not None:
+            excess = max(rate_excess(t, rpm) for t in server.arrivals.values())
+        traced_peak = None
+        if trace_memory:
+            traced_peak = tracemalloc.get_traced_memory()[1] / (1024.0 * 1024.0)
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+        if server is not None:
+            server.stop()
+        if tmp is not None:
+            tmp.cleanup()
+
+    # Exact for the "fixed" distribution; an approximation otherwise.
+    service_ms = config.latency_ms
+    if stream:
+        service_ms += config.itl_ms * max(0, min(config.stream_chunks, config.reply_words) - 1)
+    overheads = [max(0.0, v - service_ms) for v in latencies]
+    ideal_s = run.total * service_ms / 1000.0 / max(1, min(concurrency, run.total))
+
+    return BenchReport(
+        calls=run.total,
+        ok=run.done - run.errors,
+        errors=run.errors,
+        retried=retried,
+        wall_s=wall_s,
+        calls_per_s=run.total / wall_s if wall_s > 0 else math.nan,
+        latency_ms=_summary(latencies),
+        overhead_ms=_summary(overheads),
+        efficiency=(ideal_s / wall_s) if service_ms and wall_s > 0 else None,
+        peak_rss_mb=_peak_rss_mb(),
+        traced_peak_mb=traced_peak,
+        rpm=rpm,
+        rpm_excess=excess,
+        server=asdict(server.stats) if server is not None else {},
+    )
+
+
+def format_report(r: BenchReport) -> str:
+    def ms(d: Dict[str, float]) -> str:
+        return " / ".join(f"{d[k]:.2f}" for k in ("p50", "p95", "p99"))
+
+    lines = [
+        f"calls          {r.calls} ({r.ok} ok, {r.errors} error(s), {r.retried} retried)",
+        f"wall           {r.wall_s:.2f} s",
+        f"throughput     {r.calls_per_s:.1f} calls/s",
+        f"latency ms     {ms(r.latency_ms)}  (p50 / p95 / p99)",
+        f"overhead ms    {ms(r.overhead_ms)}  (p50 / p95 / p99)",
+    ]
+    if r.efficiency is not None:
+        lines.append(f"efficiency     {r.efficiency * 100:.1f}% of ideal overlap")
+    if r.peak_rss_mb is not None:
+        lines.append(f"peak RSS       {r.peak_rss_mb:.1f} MB")
+    if r.traced_peak_mb is not None:
+        lines.append(f"traced peak    {r.traced_peak_mb:.1f} MB (Python allocations)")
+    if r.rpm_excess is not None:
+        verdict = "exceeded" if r.rpm_exceeded else "held"
+        lines.append(
+            f"rpm ceiling    {verdict} at {r.rpm:g} rpm "
+            f"(worst window {r.rpm_excess:+.1f} requests vs budget)"
+        )
+    return "\n".join(lines)
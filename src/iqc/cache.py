@@ -0,0 +1,191 @@
+# src/iqc/cache.py
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+# ---------- Cache keys + modes ----------
+
+CACHE_MODES = ("use", "refresh", "bypass")
+# use     -> read hits, store fresh results
+# refresh -> ignore existing entries, overwrite them with fresh results
+# bypass  -> do not touch the cache at all
+
+DEFAULT_CACHE_FILE = "cache/responses.sqlite3"
+
+
+def cache_key(
+    provider: str,
+    model: str,
+    temperature: float,
+    max_tokens: int,
+    system_prompt: str,
+    question_text: str,
+    kind: str = "",
+    base_url: str = "",
+) -> str:
+    """
+    Full sha256 over everything that determines the request payload and
+    where it is sent: two entries with the same display name but different
+    endpoints (or an endpoint that changed) never share answers.
+    """
+    material = json.dumps(
+        [
+            provider,
+            kind,
+            base_url,
+            model,
+            float(temperature),
+            int(max_tokens),
+            system_prompt or "",
+            question_text or "",
+        ],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+# ---------- SQLite store ----------
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key           TEXT PRIMARY KEY,
+    provider      TEXT,
+    model         TEXT,
+    response_text TEXT NOT NULL,
+    meta          TEXT,
+    size          INTEGER NOT NULL,
+    created_at    REAL NOT NULL,
+    accessed_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at);
+CREATE INDEX IF NOT EXISTS responses_created ON responses (created_at);
+"""
+
+
+class ResponseCache:
+    """
+    Persistent response cache with TTL and size-based (LRU) eviction.
+    Safe to share across threads; all access is serialized on one connection.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        ttl_s: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_s = ttl_s or None
+        self.max_entries = max_entries or None
+        self.max_bytes = max_bytes or None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._puts_since_evict = 0
+        self.evict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response_text, meta, created_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            text, meta, created_at = row
+            if self.ttl_s is not None and created_at + self.ttl_s < now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+        out = json.loads(meta) if meta else {}
+        out["response_text"] = text
+        out["cached_at"] = created_at
+        return out
+
+    def put(
+        self,
+        key: str,
+        response_text: str,
+        *,
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        now = time.time()
+        meta_json = json.dumps(meta, ensure_ascii=False) if meta else None
+        size = len(response_text.encode("utf-8")) + len(meta_json or "")
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, provider, model, response_text, meta, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, model, response_text, meta_json, size, now, now),
+            )
+            self._conn.commit()
+            self._puts_since_evict += 1
+            due = self._puts_since_evict >= 256
+        if due:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries, then least-recently-used ones over the size caps."""
+        removed = 0
+        with self._lock:
+            self._puts_since_evict = 0
+            if self.ttl_s is not None:
+                cur = self._conn.execute(
+                    "DELETE FROM responses WHERE created_at < ?",
+                    (time.time() - self.ttl_s,),
+                )
+                removed += cur.rowcount
+            if self.max_entries is not None:
+                cur = self._conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    " SELECT key FROM responses ORDER BY accessed_at DESC"
+                    " LIMIT -1 OFFSET ?)",
+                    (int(self.max_entries),),
+                )
+                removed += cur.rowcount
+            if self.max_bytes is not None:
+                total = self._conn.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()[0]
+                if total > self.max_bytes:
+                    doomed = []
+                    for key, size in self._conn.execute(
+                        "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+                    ):
+                        if total <= self.max_bytes:
+                            break
+                        doomed.append((key,))
+                        total -= size
+                    self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+                    removed += len(doomed)
+            self._conn.commit()
+        return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,921 @@
+# src/iqc/cli.py
+
+"""
+Headless entrypoint.
+
+Run:
+    iqc run --providers configs/providers.yaml \
+            --questions configs/questions.yaml \
+            --out atl_data/exports
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from iqc.analysis import (
+    KEY_FIELDS,
+    SOURCES,
+    length_histogram,
+    load_runs,
+    pairwise_comparisons,
+    summarize,
+)
+from iqc.batch import DEFAULT_BATCH_POLL_S, DEFAULT_COMPLETION_WINDOW
+from iqc.bench import BENCH_PROVIDERS, format_report, run_benchmark
+from iqc.cache import CACHE_MODES
+from iqc.columnar import compact_run
+from iqc.core import (
+    DEFAULT_EXPORT_DIR,
+    DEFAULT_SYSTEM_PROMPT,
+    new_run_id,
+    parse_providers_yaml,
+    parse_questions_yaml,
+)
+from iqc.export import iter_run_rows, shard_run_id
+from iqc.index import ResultsIndex
+from iqc.journal import RunJournal
+from iqc.live import format_duration
+from iqc.mockserver import LATENCY_DISTS, MockConfig, MockServer
+from iqc.retry import RetryPolicy
+from iqc.runner import DEFAULT_MAX_CONCURRENCY, MatrixRun, RunOptions
+from iqc.sampling import (
+    DEFAULT_BOOTSTRAP,
+    DEFAULT_CONFIDENCE,
+    SAMPLE_METRIC,
+    summarize_samples,
+    write_sample_summary,
+)
+from iqc.shard import DUPLICATE_POLICIES, MergeReport, merge_shards, parse_shard_spec
+from iqc.timing import format_timing_table, summarize_timing
+
+
+def _read_text(path: str) -> str:
+    return Path(path).expanduser().read_text(encoding="utf-8", errors="ignore")
+
+
+def _select(
+    n: int, picks: Optional[List[str]], labels: List[Optional[str]], what: str
+) -> List[int]:
+    """Indices for `--question` / `--entry` filters (ids or 1-based positions)."""
+    if not picks:
+        return list(range(n))
+    out: List[int] = []
+    for pick in picks:
+        if pick in labels:
+            out.extend(i for i, lbl in enumerate(labels) if lbl == pick)
+        elif pick.isdigit() and 1 <= int(pick) <= n:
+            out.append(int(pick) - 1)
+        else:
+            raise SystemExit(f"Unknown {what}: {pick}")
+    return sorted(set(out))
+
+
+def _build_run(
+    args: argparse.Namespace, shard: Optional[Tuple[int, int]] = None
+) -> MatrixRun:
+    entries = parse_providers_yaml(_read_text(args.providers))
+    q_bank = parse_questions_yaml(_read_text(args.questions))
+    if args.system_prompt_file:
+        system_prompt = _read_text(args.system_prompt_file).strip()
+    elif args.system_prompt is not None:
+        system_prompt = args.system_prompt
+    else:
+        system_prompt = DEFAULT_SYSTEM_PROMPT
+
+    q_idxs = _select(len(q_bank), args.question, [q.get("id") for q in q_bank], "question")
+    m_idxs = _select(len(entries), args.entry, [None] * len(entries), "entry")
+
+    return MatrixRun(
+        entries=entries,
+        q_bank=q_bank,
+        selected_q_idxs=q_idxs,
+        selected_model_idxs=m_idxs,
+        system_prompt=system_prompt,
+        export_dir=Path(args.out).expanduser(),
+        run_id=args.run_id or new_run_id(),
+        options=RunOptions(
+            max_concurrency=args.concurrency,
+            stream=args.stream,
+            cache_mode=args.cache_mode,
+            cache_ttl_s=args.cache_ttl_h * 3600.0 if args.cache_ttl_h else None,
+            experiment_tag=args.tag,
+            resume=args.resume,
+            retry=RetryPolicy(
+                max_attempts=args.max_attempts,
+                max_total_s=args.retry_budget_s,
+            ),
+            batch=args.batch,
+            batch_poll_s=args.batch_poll_s,
+            batch_window=args.batch_window,
+            parquet=args.parquet,
+            index=not args.no_index,
+            shard=shard,
+            dedupe=not args.no_dedupe,
+            repeats=args.repeats,
+            warmup=args.warmup,
+        ),
+    )
+
+
+def cmd_run(args: argparse.Namespace) -> int:
+    if args.resume and not args.run_id:
+        raise SystemExit("--resume needs --run-id")
+    if args.shard and args.shards:
+        raise SystemExit("Use either --shard K/N (one shard) or --shards N (all, locally).")
+    shard = None
+    if args.shard:
+        if not (args.run_id or os.getenv("RUN_ID")):
+            raise SystemExit("--shard needs --run-id, shared by every shard of the run")
+        try:
+            shard = parse_shard_spec(args.shard)
+        except ValueError as e:
+            raise SystemExit(str(e))
+    elif args.shards and args.shards > 1:
+        return _run_sharded(args)
+
+    run = _build_run(args, shard)
+    for msg in run.warnings:
+        print(f"warning: {msg}", file=sys.stderr)
+    print(
+        f"run {run.part_id}: {len(run.selected_q_idxs)} question(s) × "
+        f"{len(run.selected_model_idxs)} model(s) = {run.total} calls"
+        + (f" ({run.resumed} already done)" if run.resumed else ""),
+        file=sys.stderr,
+    )
+
+    t0 = time.monotonic()
+    last = 0.0
+    for _ in run.results():
+        now = time.monotonic()
+        if not args.quiet and (now - last >= 1.0 or run.done == run.total):
+            last = now
+            eta = run.live.eta_s()
+            print(
+                f"\r{run.done}/{run.total} done, {run.errors} error(s), "
+                f"{run.cache_hits} cached, {now - t0:.1f}s, "
+                f"{run.live.rate():.1f} calls/s, ETA {'?' if eta is None else format_duration(eta)}   ",
+                end="",
+                file=sys.stderr,
+                flush=True,
+            )
+    if not args.quiet and run.done > run.resumed:
+        print(file=sys.stderr)
+    if args.timing:
+        print(format_timing_table(run.timing.summary()), file=sys.stderr)
+
+    print(run.run_file)
+    if run.samples_file is not None:
+        print(run.samples_file)
+    if run.parquet_dir is not None:
+        print(run.parquet_dir)
+    return 1 if run.errors and run.errors == run.done else 0
+
+
+def _run_shard_worker(args: argparse.Namespace, index: int, count: int) -> None:
+    """Body of one local shard process."""
+    try:
+        run = _build_run(args, (index, count))
+        for _ in run.results():
+            pass
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+
+def _run_sharded(args: argparse.Namespace) -> int:
+    """Run all `--shards` shards as local processes, then merge them."""
+    count = args.shards
+    args.run_id = args.run_id or new_run_id()
+    export_dir = Path(args.out).expanduser()
+    plan = _build_run(args)  # for warnings and the cell count; not executed
+    for msg in plan.warnings:
+        print(f"warning: {msg}", file=sys.stderr)
+    print(
+        f"run {plan.run_id}: {plan.total} calls in {count} shard processes",
+        file=sys.stderr,
+    )
+
+    ctx = multiprocessing.get_context("spawn")
+    procs = [
+        ctx.Process(
+            target=_run_shard_worker, args=(args, i, count), name=f"iqc-shard-{i + 1}"
+        )
+        for i in range(count)
+    ]
+    journals = [RunJournal(export_dir, shard_run_id(args.run_id, i, count)) for i in range(count)]
+    for p in procs:
+        p.start()
+    t0 = time.monotonic()
+    try:
+        while any(p.is_alive() for p in procs):
+            if not args.quiet:
+                done = sum(len(j.load()) for j in journals)
+                running = sum(p.is_alive() for p in procs)
+                print(
+                    f"\r{done}/{plan.total} done, {running}/{count} shard(s) running, "
+                    f"{time.monotonic() - t0:.1f}s   ",
+                    end="",
+                    file=sys.stderr,
+                    flush=True,
+                )
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        for p in procs:
+            p.join()
+        print(
+            f"\ninterrupted; continue with --run-id {args.run_id} --shards {count} --resume",
+            file=sys.stderr,
+        )
+        return 130
+    for p in procs:
+        p.join()
+    if not args.quiet:
+        print(file=sys.stderr)
+
+    failed = [i + 1 for i, p in enumerate(procs) if p.exitcode != 0]
+    if failed:
+        print(f"warning: shard(s) {failed} crashed; merging the rest", file=sys.stderr)
+    report, rows = merge_shards(
+        export_dir, args.run_id, args.merge_policy, allow_missing=bool(failed)
+    )
+    _after_merge(args, export_dir, rows)
+    print(_format_merge(report), file=sys.stderr)
+    if args.timing:
+        # The shards ran in other processes; aggregate from the merged rows.
+        print(format_timing_table(summarize_timing(rows)), file=sys.stderr)
+    print(report.path)
+    errors = sum(r.get("status") != "ok" for r in rows)
+    return 1 if failed or (rows and errors == len(rows)) else 0
+
+
+def _after_merge(args: argparse.Namespace, export_dir: Path, rows: List[dict]) -> None:
+    if not args.no_index:
+        with ResultsIndex.for_export_dir(export_dir) as index:
+            index.add_rows(rows)
+    samples = write_sample_summary(export_dir, args.run_id, rows)
+    if samples is not None:
+        print(samples)
+    if args.parquet:
+        print(compact_run(export_dir, args.run_id))
+
+
+def _format_merge(report: MergeReport) -> str:
+    return (
+        f"merged {len(report.shards)}/{report.shard_count} shard(s) of {report.run_id}: "
+        f"{report.rows_in} row(s) -> {report.rows_out} ({report.policy}); "
+        f"{report.duplicate_cells} duplicate cell(s), "
+        f"{report.conflicting_cells} with differing status"
+        + (f"; missing shard(s) {report.missing}" if report.missing else "")
+    )
+
+
+def cmd_merge(args: argparse.Namespace) -> int:
+    export_dir = Path(args.out).expanduser()
+    try:
+        report, rows = merge_shards(
+            export_dir, args.run_id, args.policy, allow_missing=args.allow_missing
+        )
+    except (FileNotFoundError, ValueError) as e:
+        raise SystemExit(str(e))
+    _after_merge(args, export_dir, rows)
+    if args.json:
+        print(json.dumps(report.to_dict(), indent=2))
+    else:
+        print(_format_merge(report), file=sys.stderr)
+        print(report.path)
+    return 0
+
+
+def cmd_timing(args: argparse.Namespace) -> int:
+    summary = summarize_timing(iter_run_rows(Path(args.out).expanduser(), args.run_id))
+    if not summary:
+        raise SystemExit(f"No rows for run {args.run_id} in {args.out}")
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(format_timing_table(summary, args.stat))
+    return 0
+
+
+def cmd_samples(args: argparse.Namespace) -> int:
+    export_dir = Path(args.out).expanduser()
+    cells = summarize_samples(
+        iter_run_rows(export_dir, args.run_id),
+        metric=args.metric,
+        n_boot=args.bootstrap,
+        confidence=args.confidence,
+        seed=args.seed,
+    )
+    if not cells:
+        raise SystemExit(f"No repeated samples for run {args.run_id} in {args.out}")
+    if args.json:
+        print(json.dumps(cells, indent=2))
+    else:
+        _print_table(
+            cells,
+            [
+                "question_id",
+                "provider",
+                "model",
+                "n",
+                "errors",
+                "skipped",
+                "mean",
+                "std",
+                "p50",
+                "p95",
+                "p99",
+                "mean_ci_low",
+                "mean_ci_high",
+            ],
+        )
+    return 0
+
+
+def cmd_analyze(args: argparse.Namespace) -> int:
+    export_dir = Path(args.out).expanduser()
+    by = [f.strip() for f in args.by.split(",") if f.strip()]
+    t0 = time.perf_counter()
+    try:
+        arrays = load_runs(
+            export_dir,
+            args.run_id,
+            source=args.source,
+            dataset=Path(args.dataset).expanduser() if args.dataset else None,
+        )
+        if args.pairwise:
+            result: Any = pairwise_comparisons(arrays, by=[f for f in by if f != "run_id"])
+        elif args.histogram:
+            result = length_histogram(arrays, by=by, metric=args.histogram, bins=args.bins)
+        else:
+            result = summarize(arrays, by=by)
+    except (FileNotFoundError, ValueError) as e:
+        raise SystemExit(str(e))
+    print(
+        f"{len(arrays)} row(s) of {len(arrays.runs)} run(s) from {arrays.source} "
+        f"in {time.perf_counter() - t0:.2f}s",
+        file=sys.stderr,
+    )
+    if args.json:
+        print(json.dumps(result, indent=2))
+    elif args.pairwise:
+        _print_table(
+            result,
+            [f for f in by if f != "run_id"]
+            + [
+                "base_run",
+                "run_id",
+                "error_rate_delta",
+                "base_latency_p50_ms",
+                "latency_p50_ms",
+                "latency_p50_ratio",
+                "latency_p95_delta_ms",
+                "output_tokens_per_s_delta",
+            ],
+        )
+    elif args.histogram:
+        bins = [f"<{e:.4g}" for e in result["edges"][1:]]
+        _print_table(
+            [dict({f: g[f] for f in by}, **dict(zip(bins, g["counts"]))) for g in result["groups"]],
+            by + bins,
+        )
+    else:
+        _print_table(
+            result,
+            by
+            + [
+                "rows",
+                "error_rate",
+                "latency_mean_ms",
+                "latency_p50_ms",
+                "latency_p95_ms",
+                "latency_p99_ms",
+                "output_tokens_per_s",
+                "response_chars_p50",
+            ],
+        )
+    return 0
+
+
+def cmd_compact(args: argparse.Namespace) -> int:
+    export_dir = Path(args.out).expanduser()
+    dest = Path(args.dest).expanduser() if args.dest else None
+    for run_id in args.run_id:
+        try:
+            root = compact_run(
+                export_dir, run_id, dest, texts=args.texts, all_rows=args.all_rows
+            )
+        except (FileNotFoundError, RuntimeError) as e:
+            raise SystemExit(str(e))
+        print(f"{run_id} -> {root}", file=sys.stderr)
+    print(root)
+    return 0
+
+
+def _index_filters(args: argparse.Namespace) -> dict:
+    return {
+        "run_id": getattr(args, "run_id", None),
+        "provider": args.provider,
+        "model": args.model,
+        "question_id": args.question,
+        "status": args.status,
+        "experiment_tag": args.tag,
+        "since": args.since,
+        "until": args.until,
+    }
+
+
+def _open_index(args: argparse.Namespace) -> ResultsIndex:
+    index = ResultsIndex.for_export_dir(Path(args.out).expanduser())
+    if not args.no_ingest:
+        index.ingest_dir(Path(args.out).expanduser())
+    return index
+
+
+def _print_table(rows: List[dict], cols: List[str]) -> None:
+    def fmt(v: object) -> str:
+        if isinstance(v, float):
+            return f"{v:.3f}" if abs(v) < 1 else f"{v:.1f}"
+        return "-" if v is None else str(v)
+
+    cells = [[fmt(r.get(c)) for c in cols] for r in rows]
+    widths = [max([len(c)] + [len(row[i]) for row in cells]) for i, c in enumerate(cols)]
+    print("  ".join(c.ljust(w) for c, w in zip(cols, widths)))
+    for row in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(row, widths)))
+
+
+def cmd_ingest(args: argparse.Namespace) -> int:
+    export_dir = Path(args.out).expanduser()
+    with ResultsIndex.for_export_dir(export_dir) as index:
+        n = index.ingest_dir(export_dir)
+    print(f"indexed {n} row(s) into {index.path}", file=sys.stderr)
+    return 0
+
+
+def cmd_query(args: argparse.Namespace) -> int:
+    with _open_index(args) as index:
+        rows = index.query(
+            last_runs=args.last_runs, limit=args.limit, **_index_filters(args)
+        )
+    fields = args.field or None
+    for row in rows:
+        out = {k: row.get(k) for k in fields} if fields else row
+        print(json.dumps(out, ensure_ascii=False))
+    return 0
+
+
+def cmd_runs(args: argparse.Namespace) -> int:
+    filters = _index_filters(args)
+    with _open_index(args) as index:
+        if args.stats:
+            rows = index.stats(last_runs=args.limit, **filters)
+        else:
+            rows = index.runs(limit=args.limit, **filters)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    elif args.stats:
+        _print_table(
+            rows,
+            ["run_id", "provider", "model", "rows", "errors", "error_rate", "latency_mean_ms"],
+        )
+    else:
+        _print_table(
+            rows, ["run_id", "first_ts", "last_ts", "rows", "errors", "models", "experiment_tag"]
+        )
+    return 0
+
+
+def cmd_compare(args: argparse.Namespace) -> int:
+    filters = _index_filters(args)
+    filters.pop("run_id")
+    with _open_index(args) as index:
+        diff = index.compare(args.base, args.against, **filters)
+    if args.json:
+        print(json.dumps(diff, indent=2))
+    else:
+        models = [
+            {
+                "provider": m["provider"],
+                "model": m["model"],
+                "base_err": (m.get("base") or {}).get("error_rate"),
+                "err": (m.get("run") or {}).get("error_rate"),
+                "base_ms": (m.get("base") or {}).get("latency_mean_ms"),
+                "ms": (m.get("run") or {}).get("latency_mean_ms"),
+                "delta_ms": m.get("latency_mean_delta_ms"),
+            }
+            for m in diff["models"]
+        ]
+        _print_table(
+            models, ["provider", "model", "base_err", "err", "base_ms", "ms", "delta_ms"]
+        )
+        print(f"\n{len(diff['regressed'])} regressed (ok -> error), "
+              f"{len(diff['recovered'])} recovered (error -> ok)")
+        for c in diff["regressed"]:
+            print(f"  {c['provider']} / {c['model']} / {c['question_id']}")
+    return 1 if args.fail_on_regression and diff["regressed"] else 0
+
+
+def _add_index_args(p: argparse.ArgumentParser, run_id: bool = True) -> None:
+    p.add_argument("--out", default=DEFAULT_EXPORT_DIR, help="Export directory.")
+    g = p.add_argument_group("filters (repeatable; values may use * and ? globs)")
+    if run_id:
+        g.add_argument("--run-id", action="append")
+    g.add_argument("--provider", action="append")
+    g.add_argument("--model", action="append")
+    g.add_argument("--question", action="append", help="Question id.")
+    g.add_argument("--status", action="append", help="ok / error.")
+    g.add_argument("--tag", action="append", help="Experiment tag.")
+    g.add_argument("--since", help="Rows at or after this UTC time (2025-01-31[T12:00]).")
+    g.add_argument("--until", help="Rows before this UTC time.")
+    p.add_argument(
+        "--no-ingest",
+        action="store_true",
+        help="Query the index as is, without picking up new run files first.",
+    )
+
+
+def _mock_config(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        latency_ms=args.latency_ms,
+        latency_dist=args.latency_dist,
+        latency_spread=args.latency_spread,
+        error_rate=args.error_rate,
+        burst_every=args.burst_every,
+        burst_len=args.burst_len,
+        retry_after_s=args.retry_after_s,
+        reply_words=args.reply_words,
+        stream_chunks=args.stream_chunks,
+        itl_ms=args.itl_ms,
+        seed=args.seed,
+    )
+
+
+def cmd_mock(args: argparse.Namespace) -> int:
+    server = MockServer(_mock_config(args), host=args.host, port=args.port)
+    print(f"mock provider server on {server.url} (Ctrl+C to stop)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+def cmd_bench(args: argparse.Namespace) -> int:
+    report = run_benchmark(
+        calls=args.calls,
+        concurrency=args.concurrency,
+        kinds=args.kind or ["openai"],
+        stream=args.stream,
+        config=_mock_config(args),
+        mock_url=args.mock_url,
+        max_attempts=args.max_attempts,
+        trace_memory=args.trace_memory,
+        rpm=args.rpm,
+    )
+    if args.json:
+        print(json.dumps(report.to_dict(), indent=2))
+    else:
+        print(format_report(report))
+    if args.min_calls_per_s and report.calls_per_s < args.min_calls_per_s:
+        print(
+            f"throughput {report.calls_per_s:.1f} calls/s is below "
+            f"--min-calls-per-s {args.min_calls_per_s:g}",
+            file=sys.stderr,
+        )
+        return 1
+    if report.rpm_exceeded:
+        print(
+            f"requests exceeded --rpm {args.rpm:g} by {report.rpm_excess:.1f} "
+            "in the worst window",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+def _add_mock_args(p: argparse.ArgumentParser) -> None:
+    g = p.add_argument_group("mock server behaviour")
+    g.add_argument("--latency-ms", type=float, default=0.0, help="Mean service time.")
+    g.add_argument("--latency-dist", default="fixed", choices=LATENCY_DISTS)
+    g.add_argument(
+        "--latency-spread",
+        type=float,
+        default=0.5,
+        help="uniform: ± fraction of the mean; lognormal: sigma.",
+    )
+    g.add_argument("--error-rate", type=float, default=0.0, help="Fraction of HTTP 500s.")
+    g.add_argument("--burst-every", type=int, default=0, help="Start a 429 burst every N calls.")
+    g.add_argument("--burst-len", type=int, default=0, help="Calls per 429 burst.")
+    g.add_argument("--retry-after-s", type=float, default=1.0, help="Retry-After on 429s.")
+    g.add_argument("--reply-words", type=int, default=32)
+    g.add_argument("--stream-chunks", type=int, default=8)
+    g.add_argument("--itl-ms", type=float, default=0.0, help="Delay between stream chunks.")
+    g.add_argument("--seed", type=int)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="iqc",
+        description="Benchmark LLM providers over a shared question set.",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Run a questions × models matrix without the UI.")
+    run.add_argument("--providers", required=True, help="providers.yaml")
+    run.add_argument("--questions", required=True, help="questions.yaml")
+    run.add_argument("--out", default=DEFAULT_EXPORT_DIR, help="Export directory.")
+    sp = run.add_mutually_exclusive_group()
+    sp.add_argument("--system-prompt", help="System prompt text.")
+    sp.add_argument("--system-prompt-file", help="File holding the system prompt.")
+    run.add_argument("--run-id", help="Run id (default: $RUN_ID or random).")
+    run.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue --run-id, skipping cells its journal marks as done.",
+    )
+    run.add_argument(
+        "--question",
+        action="append",
+        help="Question id or 1-based position; repeatable (default: all).",
+    )
+    run.add_argument(
+        "--entry",
+        action="append",
+        help="1-based providers.yaml entry; repeatable (default: all).",
+    )
+    run.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENCY,
+        help="Max calls in flight.",
+    )
+    run.add_argument("--stream", action="store_true", help="Stream responses (TTFT).")
+    run.add_argument(
+        "--repeats",
+        type=int,
+        default=1,
+        help="Latency samples per cell (entries may set repeats:); writes a per-cell summary.",
+    )
+    run.add_argument(
+        "--warmup",
+        type=int,
+        default=0,
+        help="Unmeasured warm-up calls per cell before the samples.",
+    )
+    run.add_argument(
+        "--shard",
+        metavar="K/N",
+        help="Run only shard K of N (e.g. one per host; same config and --run-id).",
+    )
+    run.add_argument(
+        "--shards",
+        type=int,
+        metavar="N",
+        help="Split the run over N local worker processes and merge the results.",
+    )
+    run.add_argument(
+        "--merge-policy",
+        default="prefer-ok",
+        choices=DUPLICATE_POLICIES,
+        help="Which row to keep when a cell appears more than once (--shards).",
+    )
+    run.add_argument(
+        "--batch",
+        action="store_true",
+        help="Send each entry's calls as one provider batch job (OpenAI-compatible).",
+    )
+    run.add_argument(
+        "--batch-poll-s",
+        type=float,
+        default=DEFAULT_BATCH_POLL_S,
+        help="Seconds between batch status checks.",
+    )
+    run.add_argument(
+        "--batch-window",
+        default=DEFAULT_COMPLETION_WINDOW,
+        help="Batch completion window requested from the provider.",
+    )
+    run.add_argument(
+        "--max-attempts", type=int, default=4, help="Attempts per call (1 = no retry)."
+    )
+    run.add_argument(
+        "--retry-budget-s",
+        type=float,
+        default=120.0,
+        help="Max total backoff per call, in seconds.",
+    )
+    run.add_argument("--cache-mode", default="use", choices=CACHE_MODES)
+    run.add_argument("--cache-ttl-h", type=float, default=0.0, help="0 = no expiry.")
+    run.add_argument("--tag", help="Experiment tag stored on every row.")
+    run.add_argument("-q", "--quiet", action="store_true", help="No progress output.")
+    run.add_argument(
+        "--timing", action="store_true", help="Print per-provider phase timings at the end."
+    )
+    run.add_argument(
+        "--no-index",
+        action="store_true",
+        help="Do not add rows to the export directory's results index.",
+    )
+    run.add_argument(
+        "--no-dedupe",
+        action="store_true",
+        help="Send identical requests once per cell instead of once per run.",
+    )
+    run.add_argument(
+        "--parquet",
+        action="store_true",
+        help="Also compact the finished run into <out>/parquet (needs pyarrow).",
+    )
+    run.set_defaults(func=cmd_run)
+
+    timing = sub.add_parser("timing", help="Per-provider phase timings of a finished run.")
+    timing.add_argument("--run-id", required=True)
+    timing.add_argument("--out", default=DEFAULT_EXPORT_DIR, help="Export directory.")
+    timing.add_argument("--stat", default="mean", choices=("mean", "p50", "p95"))
+    timing.add_argument("--json", action="store_true")
+    timing.set_defaults(func=cmd_timing)
+
+    samples = sub.add_parser(
+        "samples", help="Per-cell latency statistics of a run with repeats."
+    )
+    samples.add_argument("--run-id", required=True)
+    samples.add_argument("--out", default=DEFAULT_EXPORT_DIR, help="Export directory.")
+    samples.add_argument(
+        "--metric",
+        default=SAMPLE_METRIC,
+        help="Row field to summarise, e.g. latency_ms, ttft_ms or wall_ms.",
+    )
+    samples.add_argument("--bootstrap", type=int, default=DEFAULT_BOOTSTRAP, help="Resamples.")
+    samples.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE)
+    samples.add_argument("--seed", type=int, default=0)
+    samples.add_argument("--json", action="store_true")
+    samples.set_defaults(func=cmd_samples)
+
+    analyze = sub.add_parser(
+        "analyze", help="Vectorized latency/error/throughput statistics over runs."
+    )
+    analyze.add_argument(
+        "--run-id", action="append", help="Repeatable (default: every run in --out)."
+    )
+    analyze.add_argument("--out", default=DEFAULT_EXPORT_DIR, help="Export directory.")
+    analyze.add_argument(
+        "--source",
+        default="auto",
+        choices=SOURCES,
+        help="auto: the Parquet dataset when every run is compacted, else run files.",
+    )
+    analyze.add_argument("--dataset", help="Parquet dataset root (default: <out>/parquet).")
+    analyze.add_argument(
+        "--by",
+        default="run_id,provider,model",
+        help=f"Comma-separated grouping fields from {', '.join(KEY_FIELDS)}.",
+    )
+    view = analyze.add_mutually_exclusive_group()
+    view.add_argument(
+        "--pairwise",
+        action="store_true",
+        help="Compare every pair of runs, in --run-id order, per group.",
+    )
+    view.add_argument(
+        "--histogram",
+        choices=("response_chars", "token_output"),
+        help="Length distribution per group instead of summary statistics.",
+    )
+    analyze.add_argument("--bins", type=int, default=20)
+    analyze.add_argument("--json", action="store_true")
+    analyze.set_defaults(func=cmd_analyze)
+
+    compact = sub.add_parser(
+        "compact", help="Convert run JSONL into a partitioned Parquet dataset."
+    )
+    compact.add_argument("--run-id", action="append", required=True, help="Repeatable.")
+    compact.add_argument("--out", default=DEFAULT_EXPORT_DIR, help="Export directory.")
+    compact.add_argument("--dest", help="Dataset root (default: <out>/parquet).")
+    compact.add_argument(
+        "--texts",
+        action="store_true",
+        help="Copy the system prompt and question texts in from the manifest.",
+    )
+    compact.add_argument(
+        "--all-rows",
+        action="store_true",
+        help="Keep every row, not just the latest one per cell.",
+    )
+    compact.set_defaults(func=cmd_compact)
+
+    merge = sub.add_parser("merge", help="Combine the shard files of a sharded run.")
+    merge.add_argument("--run-id", required=True)
+    merge.add_argument("--out", default=DEFAULT_EXPORT_DIR, help="Export directory.")
+    merge.add_argument(
+        "--policy",
+        default="prefer-ok",
+        choices=DUPLICATE_POLICIES,
+        help="Which row to keep when a cell appears more than once.",
+    )
+    merge.add_argument(
+        "--allow-missing",
+        action="store_true",
+        help="Merge even if some shards have not started yet.",
+    )
+    merge.add_argument("--no-index", action="store_true", help="Do not update the results index.")
+    merge.add_argument("--parquet", action="store_true", help="Also compact the merged run.")
+    merge.add_argument("--json", action="store_true", help="Print the merge report as JSON.")
+    merge.set_defaults(func=cmd_merge)
+
+    ingest = sub.add_parser(
+        "ingest", help="Add run files in the export directory to the results index."
+    )
+    ingest.add_argument("--out", default=DEFAULT_EXPORT_DIR, help="Export directory.")
+    ingest.set_defaults(func=cmd_ingest)
+
+    query = sub.add_parser("query", help="Rows from the results index, as JSON lines.")
+    _add_index_args(query)
+    query.add_argument(
+        "--last-runs", type=int, help="Only the N most recent runs with matching rows."
+    )
+    query.add_argument("--limit", type=int)
+    query.add_argument("--field", action="append", help="Output only these fields; repeatable.")
+    query.set_defaults(func=cmd_query)
+
+    runs = sub.add_parser("runs", help="Indexed runs, newest first.")
+    _add_index_args(runs)
+    runs.add_argument("--limit", type=int, help="At most N runs.")
+    runs.add_argument(
+        "--stats", action="store_true", help="Per run × provider × model error rate and latency."
+    )
+    runs.add_argument("--json", action="store_true")
+    runs.set_defaults(func=cmd_runs)
+
+    compare = sub.add_parser(
+        "compare", help="Error-rate/latency changes and regressed cells between two runs."
+    )
+    compare.add_argument("base", help="Baseline run id.")
+    compare.add_argument("against", help="Run id compared with the baseline.")
+    _add_index_args(compare, run_id=False)
+    compare.add_argument("--json", action="store_true")
+    compare.add_argument(
+        "--fail-on-regression",
+        action="store_true",
+        help="Exit 1 when any cell went from ok to error.",
+    )
+    compare.set_defaults(func=cmd_compare)
+
+    mock = sub.add_parser("mock", help="Serve mock OpenAI/Cohere/Gemini endpoints locally.")
+    mock.add_argument("--host", default="127.0.0.1")
+    mock.add_argument("--port", type=int, default=8765)
+    _add_mock_args(mock)
+    mock.set_defaults(func=cmd_mock)
+
+    bench = sub.add_parser(
+        "bench", help="Load-test the matrix engine against the mock server."
+    )
+    bench.add_argument("--calls", type=int, default=1000)
+    bench.add_argument("--concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY)
+    bench.add_argument(
+        "--kind",
+        action="append",
+        choices=sorted(BENCH_PROVIDERS),
+        help="Wire format(s) to exercise; repeatable (default: openai).",
+    )
+    bench.add_argument("--stream", action="store_true")
+    bench.add_argument("--max-attempts", type=int, default=4)
+    bench.add_argument(
+        "--mock-url", help="Use a running `iqc mock` instead of an in-process server."
+    )
+    bench.add_argument("--trace-memory", action="store_true", help="Also track Python allocations.")
+    bench.add_argument(
+        "--rpm",
+        type=float,
+        help="Rate-limit every bench entry and exit 1 if the mock sees more "
+        "(retries included; in-process mock only).",
+    )
+    bench.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    bench.add_argument(
+        "--min-calls-per-s",
+        type=float,
+        default=0.0,
+        help="Exit 1 when throughput falls below this (regression gate).",
+    )
+    _add_mock_args(bench)
+    bench.set_defaults(func=cmd_bench)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+# src/iqc/columnar.py
+
+"""
+Columnar copies of run files for analysis.
+
+JSONL stays the write path (append-only, resumable); this module compacts
+a finished run into a Parquet dataset partitioned hive-style by
+run_id/provider/model:
+
+    <export_dir>/parquet/run_id=<id>/provider=<name>/model=<model>/<id>-0.parquet
+
+Repeated strings (status, question ids, hashes, ...) are dictionary
+encoded, so projecting a few columns such as latency_ms and status reads a
+small fraction of the data and skips the response texts entirely.
+
+Needs the optional pyarrow dependency:  pip install "iqc[parquet]"
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+import importlib.util
+import json
+
+from iqc.export import iter_run_rows, run_files
+from iqc.timing import NETWORK_PHASES
+
+# Imported on first use: pyarrow (and the pandas it pulls in) would add
+# about half a second to every CLI start and shard process.
+pa: Any = None
+ds: Any = None
+
+
+PARQUET_DIR = "parquet"
+PARTITION_COLUMNS = ("run_id", "provider", "model")
+
+# Low-cardinality text: stored as dictionary indices. Per-question fields
+# stay plain strings: an Arrow dictionary is written whole into every row
+# group, which for thousands of questions costs more than it saves (Parquet
+# still dictionary-encodes them per row group).
+DICT_COLUMNS = (
+    "run_id",
+    "provider",
+    "model",
+    "status",
+    "finish_reason",
+    "experiment_tag",
+    "system_prompt_sha256",
+    "batch_id",
+)
+STRING_COLUMNS = (
+    "timestamp_utc",
+    "question_id",
+    "question_sha256",
+    "cell_key",
+    "sample_of",
+    "system_prompt",
+    "question_text",
+    "response_text",
+    "error_message",
+)
+FLOAT_COLUMNS = (
+    "temperature",
+    "latency_ms",
+    "wall_ms",
+    "backoff_ms",
+    "queue_ms",
+    "throttle_ms",
+    "ttft_ms",
+    "itl_mean_ms",
+    "itl_p95_ms",
+    "output_tokens_per_s",
+    "decode_tokens_per_s",
+) + NETWORK_PHASES
+INT_COLUMNS = ("max_tokens", "token_input", "token_output", "attempts", "sample")
+BOOL_COLUMNS = ("cache_hit", "streamed", "warmup")
+
+
+def pyarrow_available() -> bool:
+    return pa is not None or importlib.util.find_spec("pyarrow") is not None
+
+
+def _require_pyarrow() -> None:
+    global pa, ds
+    if pa is None:
+        try:
+            import pyarrow
+            import pyarrow.dataset
+        except ImportError:
+            raise RuntimeError(
+                'Parquet export needs pyarrow: pip install "iqc[parquet]"'
+            ) from None
+        pa, ds = pyarrow, pyarrow.dataset
+
+
+def default_dataset_dir(export_dir: Path) -> Path:
+    return Path(export_dir) / PARQUET_DIR
+
+
+def _known_type(name: str) -> Optional["pa.DataType"]:
+    if name in DICT_COLUMNS:
+        return pa.dictionary(pa.int32(), pa.string())
+    if name in STRING_COLUMNS:
+        return pa.string()
+    if name in FLOAT_COLUMNS:
+        return pa.float64()
+    if name in INT_COLUMNS:
+        return pa.int64()
+    if name in BOOL_COLUMNS:
+        return pa.bool_()
+    return None
+
+
+def _column(name: str, values: List[Any]) -> "pa.Array":
+    typ = _known_type(name)
+    if typ is not None:
+        if pa.types.is_dictionary(typ):
+            return pa.array(
+                [None if v is None else str(v) for v in values], pa.string()
+            ).dictionary_encode()
+        return pa.array(values, typ)
+    # Fields added later (or by custom adapters): let Arrow infer, and fall
+    # back to JSON text for mixed or nested values.
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array(
+            [None if v is None else json.dumps(v, ensure_ascii=False) for v in values],
+            pa.string(),
+        )
+
+
+def rows_to_table(rows: Iterable[Dict[str, Any]]) -> "pa.Table":
+    """Arrow table over export rows; columns are the union of row keys."""
+    _require_pyarrow()
+    rows = list(rows)
+    names: Dict[str, None] = {}
+    for row in rows:
+        for k in row:
+            names.setdefault(k, None)
+    return pa.table({k: _column(k, [r.get(k) for r in rows]) for k in names})
+
+
+def _latest_rows(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Last row per cell_key: a resumed run re-writes the cells it retried."""
+    latest: Dict[Any, Dict[str, Any]] = {}
+    for i, row in enumerate(rows):
+        latest[row.get("cell_key") or i] = row
+    return list(latest.values())
+
+
+def compact_run(
+    export_dir: Path,
+    run_id: str,
+    dest: Optional[Path] = None,
+    *,
+    texts: bool = False,
+    all_rows: bool = False,
+) -> Path:
+    """
+    Write run `run_id` into the Parquet dataset at `dest` (default
+    <export_dir>/parquet) and return the dataset root. Compacting the same
+    run again replaces its partitions.
+
+    By default only the latest row per cell is kept (`all_rows=True` keeps
+    every attempt written across resumes), and the system prompt and
+    question texts stay in the run manifest (`texts=True` copies them in).
+    """
+    _require_pyarrow()
+    if not run_files(export_dir, run_id):
+        raise FileNotFoundError(f"No run files for {run_id} in {export_dir}")
+    rows = iter_run_rows(export_dir, run_id, rehydrate=texts)
+    table = rows_to_table(rows if all_rows else _latest_rows(rows))
+
+    root = Path(dest) if dest is not None else default_dataset_dir(export_dir)
+    root.mkdir(parents=True, exist_ok=True)
+    partitioning = ds.partitioning(
+        pa.schema([(c, pa.string()) for c in PARTITION_COLUMNS]), flavor="hive"
+    )
+    # Partition keys are plain strings on the way in; they come back as
+    # dictionaries from the directory names.
+    for c in PARTITION_COLUMNS:
+        i = table.schema.get_field_index(c)
+        table = table.set_column(i, c, table.column(c).cast(pa.string()))
+    ds.write_dataset(
+        table,
+        root,
+        format="parquet",
+        partitioning=partitioning,
+        basename_template=f"{run_id}-{{i}}.parquet",
+        existing_data_behavior="delete_matching",
+    )
+    return root
+
+
+def open_dataset(root: Path) -> "ds.Dataset":
+    _require_pyarrow()
+    return ds.dataset(
+        Path(root),
+        format="parquet",
+        partitioning=ds.HivePartitioning.discover(infer_dictionary=True),
+    )
+
+
+Selector = Union[None, str, Sequence[str]]
+
+
+def _isin(field: str, value: Selector) -> Optional["ds.Expression"]:
+    if value is None:
+        return None
+    values = [value] if isinstance(value, str) else list(value)
+    return ds.field(field).isin(values)
+
+
+def read_runs(
+    root: Path,
+    columns: Optional[Sequence[str]] = None,
+    *,
+    run_id: Selector = None,
+    provider: Selector = None,
+    model: Selector = None,
+    filter: Optional["ds.Expression"] = None,
+) -> "pa.Table":
+    """
+    Load `columns` (default: all) from a compacted dataset. run_id /
+    provider / model select partitions, so unmatched directories are never
+    opened; `filter` is any extra pyarrow dataset expression.
+    """
+    dataset = open_dataset(root)
+    expr = filter
+    for field, value in (("run_id", run_id), ("provider", provider), ("model", model)):
+        e = _isin(field, value)
+        if e is not None:
+            expr = e if expr is None else expr & e
+    return dataset.to_table(columns=list(columns) if columns else None, filter=expr)
@@ -4,12 +4,11 @@ from io import StringIO
 from typing import Any
 
 import streamlit as st
-import yaml
 
 from iqc.core import (
-    sanitize_providers_yaml,
-    sanitize_questions_yaml,
-    extract_questions,
+    clear_preflight_cache,
+    load_providers_yaml,
+    load_questions_yaml,
     run_preflight,
 )
 
@@ -26,30 +25,32 @@ def providers_config_section() -> None:
     yaml_entries: list[dict[str, Any]] = []
 
     if prov_file:
+        # Parsed once per distinct upload; reruns hit the content-hash cache.
         try:
-            raw = prov_file.read().decode("utf-8", errors="ignore")
-            sanitized = sanitize_providers_yaml(raw)
-            cfg = yaml.safe_load(sanitized)
-            entries = cfg.get("providers", [])
-            if not isinstance(entries, list):
-                st.error("`providers` must be a list in the YAML.")
-            else:
-                yaml_entries = entries
-                st.session_state["yaml_entries"] = yaml_entries
-                st.success(f"Loaded {len(yaml_entries)} provider entries.")
+            yaml_entries = load_providers_yaml(prov_file.getvalue())
+            st.session_state["yaml_entries"] = yaml_entries
+            st.success(f"Loaded {len(yaml_entries)} provider entries.")
+        except ValueError as e:
+            st.error(str(e))
         except Exception as e:  # noqa: BLE001
             st.error(f"Failed to parse providers YAML: {e}")
 
-    col_check, col_dl = st.columns([1, 1])
+    col_check, col_recheck, col_dl = st.columns([1, 1, 1])
     with col_check:
         check_btn = st.button("Check APIs/Models", key="check_btn")
+    with col_recheck:
+        # Successful checks are cached for a few minutes; this forgets them,
+        # e.g. after a quota reset or a model being switched on.
+        recheck_btn = st.button("Re-check (ignore cache)", key="recheck_btn")
 
-    if check_btn:
+    if check_btn or recheck_btn:
         entries = st.session_state.get("yaml_entries", [])
         if not entries:
             st.error("Upload providers.yaml first.")
             return
 
+        if recheck_btn:
+            clear_preflight_cache()
         with st.spinner("Checking providers/models..."):
             results = run_preflight(entries)
 
@@ -96,9 +97,7 @@ def questions_config_section() -> None:
 
     if q_file:
         try:
-            raw_q = q_file.read().decode("utf-8", errors="ignore")
-            cfg_q = yaml.safe_load(sanitize_questions_yaml(raw_q))
-            st.session_state["q_bank"] = extract_questions(cfg_q)
+            st.session_state["q_bank"] = load_questions_yaml(q_file.getvalue())
             st.success(f"Loaded {len(st.session_state['q_bank'])} questions.")
         except Exception as e:  # noqa: BLE001
             st.error(f"Failed to parse questions YAML: {e}")
@@ -2,19 +2,30 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Optional, List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Sequence, Tuple
 from pathlib import Path
 from datetime import datetime
+from email.utils import parsedate_to_datetime
+import copy
 import os
-import json
 import re
+import sys
 import time
 import hashlib
+import threading
 
-import requests
 import yaml
-import streamlit as st
+
+
+DEFAULT_SYSTEM_PROMPT = (
+    "You are a transparent, careful assistant. "
+    "If uncertain, say so explicitly; avoid speculation; "
+    "use cautious, calibrated language."
+)
+DEFAULT_EXPORT_DIR = "atl_data/exports"
 
 
 # ---------- Provider registry ----------
@@ -22,11 +33,13 @@ import streamlit as st
 @dataclass
 class Provider:
     name: str
-    kind: str                  # "openai_compatible" or "custom"
+    kind: str                  # adapter key, see iqc.adapters.ADAPTERS
     base_url: Optional[str] = None
     auth_header: str = "Authorization"
     bearer_prefix: str = "Bearer "
     notes: str = ""
+    extra_headers: Dict[str, str] = field(default_factory=dict)
+    requires_api_key: bool = True
 
 
 PROVIDERS: List[Provider] = [
@@ -65,6 +78,7 @@ PROVIDERS: List[Provider] = [
         "openai_compatible",
         "https://models.api.github.com",
         notes="Use GitHub token.",
+        extra_headers={"Accept": "application/json"},
     ),
     Provider(
         "Vercel AI Gateway (Custom)",
@@ -80,13 +94,13 @@ PROVIDERS: List[Provider] = [
     ),
     Provider(
         "Cohere (Chat)",
-        "custom",
+        "cohere_chat",
         "https://api.cohere.com",
         notes="E.g., 'command-a-03-2025'.",
     ),
     Provider(
         "Google AI Studio (Gemini)",
-        "custom",
+        "gemini",
         "https://generativelanguage.googleapis.com",
         notes="E.g., 'gemini-1.5-flash'.",
     ),
@@ -95,6 +109,7 @@ PROVIDERS: List[Provider] = [
         "openai_compatible",
         "http://localhost:11434",
         notes="Local model via Ollama; e.g., 'llama3.2', 'mistral', etc.",
+        requires_api_key=False,
     ),
 ]
 
@@ -116,6 +131,14 @@ def _sanitize_yaml(raw: str) -> str:
     return "\n".join(lines)
 
 
+# libyaml's loader when PyYAML was built with it: same safe subset, ~10x faster.
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def _load_yaml(text: str) -> Any:
+    return yaml.load(text, Loader=_YAML_LOADER)  # noqa: S506 - safe loader
+
+
 def sanitize_providers_yaml(raw: str) -> str:
     return _sanitize_yaml(raw)
 
@@ -124,6 +147,149 @@ def sanitize_questions_yaml(raw: str) -> str:
     return _sanitize_yaml(raw)
 
 
+def parse_providers_yaml(raw: str) -> list[dict[str, Any]]:
+    cfg = _load_yaml(sanitize_providers_yaml(raw)) or {}
+    entries = cfg.get("providers", [])
+    if not isinstance(entries, list):
+        raise ValueError("`providers` must be a list in the YAML.")
+    return entries
+
+
+def parse_questions_yaml(raw: str) -> "QuestionBank":
+    return QuestionBank.from_questions(
+        extract_questions(_load_yaml(sanitize_questions_yaml(raw)))
+    )
+
+
+class QuestionBank(Sequence[Dict[str, Optional[str]]]):
+    """
+    Immutable question list stored as two parallel tuples. Items read like
+    the dicts `extract_questions` returns ({"id", "text"}), so it drops in
+    wherever a list of questions is expected; selection labels and the
+    id -> positions map are built once per bank.
+    """
+
+    __slots__ = ("ids", "texts", "digest", "_labels", "_positions")
+
+    def __init__(
+        self,
+        ids: Sequence[Optional[str]],
+        texts: Sequence[str],
+        digest: str = "",
+    ) -> None:
+        self.ids = tuple(ids)
+        self.texts = tuple(texts)
+        self.digest = digest
+        self._labels: Optional[Tuple[int, List[str]]] = None
+        self._positions: Optional[Dict[str, List[int]]] = None
+
+    @classmethod
+    def from_questions(
+        cls, questions: List[Dict[str, Any]], digest: str = ""
+    ) -> "QuestionBank":
+        return cls(
+            [q.get("id") for q in questions],
+            [q["text"] for q in questions],
+            digest,
+        )
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, i):  # type: ignore[override]
+        if isinstance(i, slice):
+            return QuestionBank(self.ids[i], self.texts[i])
+        return {"id": self.ids[i], "text": self.texts[i]}
+
+    def labels(self, width: int = 60) -> List[str]:
+        """"<id or position>: <text prefix>" per question, for pickers."""
+        if self._labels is None or self._labels[0] != width:
+            self._labels = (
+                width,
+                [
+                    f"{qid or str(i + 1)}: {text[:width]}{'…' if len(text) > width else ''}"
+                    for i, (qid, text) in enumerate(zip(self.ids, self.texts))
+                ],
+            )
+        return self._labels[1]
+
+    def positions(self, question_id: str) -> List[int]:
+        if self._positions is None:
+            pos: Dict[str, List[int]] = {}
+            for i, qid in enumerate(self.ids):
+                if qid is not None:
+                    pos.setdefault(qid, []).append(i)
+            self._positions = pos
+        return self._positions.get(question_id, [])
+
+
+# ---------- Memoized loading ----------
+#
+# The Streamlit app reruns its script on every widget interaction, which
+# used to re-parse the uploaded YAML each time. Parses are cached by the
+# sha256 of the raw bytes in a small LRU, so a rerun with an unchanged
+# upload is a hash and a dict lookup.
+
+YAML_CACHE_SIZE = 8
+
+
+class _ContentLRU:
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._items: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: tuple, compute: Any) -> Any:
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        value = compute()
+        with self._lock:
+            self._items[key] = value
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+_yaml_cache = _ContentLRU(YAML_CACHE_SIZE)
+
+
+def _content_digest(data: bytes | str) -> Tuple[bytes, str]:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return data, hashlib.sha256(data).hexdigest()
+
+
+def load_providers_yaml(data: bytes | str) -> list[dict[str, Any]]:
+    """
+    `parse_providers_yaml` memoized on content. Returns a fresh copy each
+    call, since entries are plain dicts callers may edit.
+    """
+    raw, digest = _content_digest(data)
+    entries = _yaml_cache.get_or_compute(
+        ("providers", digest),
+        lambda: parse_providers_yaml(raw.decode("utf-8", errors="ignore")),
+    )
+    return copy.deepcopy(entries)
+
+
+def load_questions_yaml(data: bytes | str) -> QuestionBank:
+    """`parse_questions_yaml` memoized on content; the bank is shared."""
+    raw, digest = _content_digest(data)
+
+    def parse() -> QuestionBank:
+        bank = parse_questions_yaml(raw.decode("utf-8", errors="ignore"))
+        bank.digest = digest
+        return bank
+
+    return _yaml_cache.get_or_compute(("questions", digest), parse)
+
+
 def extract_questions(yaml_obj: Any) -> list[dict[str, str]]:
     out: list[dict[str, str]] = []
     if isinstance(yaml_obj, dict):
@@ -176,245 +342,208 @@ def resolve_api_key(entry_key: Optional[str]) -> Optional[str]:
 
 
 def minimal_test_call(entry_name: str, entry_model: str, api_key: Optional[str]) -> None:
+    from iqc.adapters import get_adapter
+
     if entry_name not in PROVIDER_BY_NAME:
         raise RuntimeError(f"Unknown provider name: {entry_name}")
     p = PROVIDER_BY_NAME[entry_name]
 
-    if not api_key and p.kind != "custom" and p.name != "Ollama (local)":
+    if not api_key and p.requires_api_key:
         raise RuntimeError("Missing API key.")
 
     messages = [
         {"role": "system", "content": "ping"},
         {"role": "user", "content": "ping"},
     ]
-
-    if p.kind == "openai_compatible":
-        if not p.base_url:
-            raise RuntimeError("Missing base_url for provider.")
-        url = p.base_url.rstrip("/") + "/v1/chat/completions"
-        headers = {
-            "Content-Type": "application/json",
-            p.auth_header: f"{p.bearer_prefix}{api_key}",
-        }
-        payload = {
-            "model": entry_model,
-            "messages": messages,
-            "max_tokens": 1,
-            "temperature": 0.0,
-            "stream": False,
-        }
-        resp = requests.post(url, headers=headers, json=payload, timeout=25)
-        if resp.status_code >= 400:
-            raise RuntimeError(f"{p.name} {resp.status_code}: {resp.text[:200]}")
-        _ = resp.json()
-    elif p.name.startswith("Cohere"):
-        url = "https://api.cohere.com/v1/chat"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}",
-        }
-        payload = {
-            "model": entry_model,
-            "message": "ping",
-            "max_tokens": 1,
-            "temperature": 0.0,
-        }
-        resp = requests.post(url, headers=headers, json=payload, timeout=25)
-        if resp.status_code >= 400:
-            raise RuntimeError(f"Cohere {resp.status_code}: {resp.text[:200]}")
-        _ = resp.json()
-    elif p.name.startswith("Google AI Studio"):
-        url = (
-            f"https://generativelanguage.googleapis.com/v1beta/models/"
-            f"{entry_model}:generateContent?key={api_key}"
+    try:
+        get_adapter(p.kind).call(
+            p, api_key or "", entry_model, messages, 0.0, 1, timeout=25
         )
-        payload = {
-            "contents": [{"role": "user", "parts": [{"text": "ping"}]}],
-            "generationConfig": {"maxOutputTokens": 1},
-        }
-        headers = {"Content-Type": "application/json"}
-        resp = requests.post(url, headers=headers, json=payload, timeout=25)
-        if resp.status_code >= 400:
-            raise RuntimeError(f"Gemini {resp.status_code}: {resp.text[:200]}")
-        _ = resp.json()
-    else:
-        raise RuntimeError("Unsupported provider configuration for preflight test.")
-
-
-def run_preflight(entries: list[dict[str, Any]]) -> list[dict[str, Any]]:
-    results: list[dict[str, Any]] = []
-    for row in entries:
+    except ProviderHTTPError as e:
+        raise RuntimeError(str(e)[:200]) from None
+
+
+PREFLIGHT_DEADLINE_S = 30.0
+PREFLIGHT_CACHE_TTL_S = 300.0
+PREFLIGHT_MAX_WORKERS = 16
+
+# (provider, model, key hash) -> monotonic time of the last successful check
+_preflight_ok: Dict[tuple[str, str, str], float] = {}
+_preflight_lock = threading.Lock()
+
+
+def _preflight_row(
+    row: dict[str, Any], status: str, detail: str
+) -> dict[str, Any]:
+    return {
+        "provider": row.get("name") or "<missing>",
+        "model": row.get("model") or "<missing>",
+        "status": status,
+        "temperature": row.get("temperature"),
+        "max_tokens": row.get("max_tokens"),
+        "detail": detail,
+    }
+
+
+def clear_preflight_cache() -> None:
+    with _preflight_lock:
+        _preflight_ok.clear()
+
+
+def run_preflight(
+    entries: list[dict[str, Any]],
+    *,
+    deadline_s: float = PREFLIGHT_DEADLINE_S,
+    cache_ttl_s: float = PREFLIGHT_CACHE_TTL_S,
+    max_workers: int = PREFLIGHT_MAX_WORKERS,
+) -> list[dict[str, Any]]:
+    """
+    Check every entry concurrently. Entries sharing (provider, model, key)
+    are pinged once; successes are remembered for `cache_ttl_s` seconds, and
+    anything still pending after `deadline_s` is reported as timed out.
+    """
+    results: list[Optional[dict[str, Any]]] = [None] * len(entries)
+    groups: Dict[tuple[str, str, str], list[int]] = {}
+    keys: Dict[tuple[str, str, str], Optional[str]] = {}
+    now = time.monotonic()
+
+    for i, row in enumerate(entries):
         name = row.get("name")
         model = row.get("model")
-        entry_key = row.get("api_key")
-        t = row.get("temperature")
-        mt = row.get("max_tokens")
-
         if not name or not model:
-            results.append(
-                {
-                    "provider": name or "<missing>",
-                    "model": model or "<missing>",
-                    "status": "❌",
-                    "temperature": t,
-                    "max_tokens": mt,
-                    "detail": "name/model required",
-                }
+            results[i] = _preflight_row(row, "❌", "name/model required")
+            continue
+        resolved_key = resolve_api_key(row.get("api_key"))
+        key = (name, model, _hash_text(resolved_key or ""))
+        with _preflight_lock:
+            ok_at = _preflight_ok.get(key)
+        if ok_at is not None and now - ok_at < cache_ttl_s:
+            results[i] = _preflight_row(
+                row, "✅ OK", f"cached ({int(now - ok_at)}s ago)"
             )
             continue
+        groups.setdefault(key, []).append(i)
+        keys[key] = resolved_key
 
-        try:
-            resolved_key = resolve_api_key(entry_key)
-            minimal_test_call(name, model, resolved_key)
-            results.append(
-                {
-                    "provider": name,
-                    "model": model,
-                    "status": "✅ OK",
-                    "temperature": t,
-                    "max_tokens": mt,
-                    "detail": "",
-                }
-            )
-        except Exception as e:  # noqa: BLE001
-            results.append(
-                {
-                    "provider": name,
-                    "model": model,
-                    "status": "❌ Fail",
-                    "temperature": t,
-                    "max_tokens": mt,
-                    "detail": str(e),
-                }
-            )
-    return results
+    if groups:
+        pool = ThreadPoolExecutor(
+            max_workers=max(1, min(max_workers, len(groups))),
+            thread_name_prefix="iqc-preflight",
+        )
+        futures = {
+            pool.submit(minimal_test_call, key[0], key[1], keys[key]): key
+            for key in groups
+        }
+        done, _ = wait(futures, timeout=deadline_s)
+        # Don't let a hung endpoint hold the caller past the deadline.
+        pool.shutdown(wait=False, cancel_futures=True)
+
+        for fut, key in futures.items():
+            if fut not in done:
+                status, detail = "❌ Timeout", f"no answer within {deadline_s:.0f}s"
+            elif fut.exception() is not None:
+                status, detail = "❌ Fail", str(fut.exception())
+            else:
+                status, detail = "✅ OK", ""
+                with _preflight_lock:
+                    _preflight_ok[key] = time.monotonic()
+            for i in groups[key]:
+                results[i] = _preflight_row(entries[i], status, detail)
+
+    return [r for r in results if r is not None]
 
 
 # ---------- Networking helpers for benchmark loop ----------
 
-def post_openai_compatible(
-    provider: Provider,
-    api_key: str,
-    model: str,
-    messages: list[dict[str, str]],
-    temperature: float,
-    max_tokens: int,
-    extra_headers: Optional[dict[str, str]] = None,
-    path_override: Optional[str] = None,
-) -> str:
-    if not provider.base_url:
-        raise ValueError("Base URL is required for this provider.")
-    url = provider.base_url.rstrip("/") + (
-        "/v1/chat/completions" if not path_override else path_override
-    )
+class ProviderHTTPError(RuntimeError):
+    """HTTP error from a provider, with what the retry layer needs to know."""
 
-    headers = {"Content-Type": "application/json"}
-    if api_key:
-        headers[provider.auth_header] = f"{provider.bearer_prefix}{api_key}"
-    if extra_headers:
-        headers.update(extra_headers)
+    def __init__(
+        self, message: str, status_code: int, retry_after_s: Optional[float] = None
+    ) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after_s = retry_after_s
 
-    payload = {
-        "model": model,
-        "messages": messages,
-        "temperature": float(temperature),
-        "max_tokens": int(max_tokens),
-        "stream": False,
-    }
-    resp = requests.post(url, headers=headers, json=payload, timeout=60)
-    if resp.status_code >= 400:
-        raise RuntimeError(f"{provider.name} error {resp.status_code}: {resp.text}")
-    data = resp.json()
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """`Retry-After` as seconds; accepts delta-seconds or an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
     try:
-        return data["choices"][0]["message"]["content"]
-    except Exception:  # noqa: BLE001
-        return json.dumps(data, indent=2)
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
 
 
-def post_cohere_chat(
-    api_key: str,
-    model: str,
-    messages: list[dict[str, str]],
-    temperature: float,
-    max_tokens: int,
-) -> str:
-    url = "https://api.cohere.com/v1/chat"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}",
-    }
-    user_turns = [m["content"] for m in messages if m["role"] == "user"]
-    prompt = "\n\n".join(user_turns) if user_turns else messages[-1]["content"]
-    payload = {
-        "model": model,
-        "message": prompt,
-        "temperature": float(temperature),
-        "max_tokens": int(max_tokens),
-    }
-    resp = requests.post(url, headers=headers, json=payload, timeout=60)
+def _raise_for_status(resp: Any, label: str) -> None:
     if resp.status_code >= 400:
-        raise RuntimeError(f"Cohere error {resp.status_code}: {resp.text}")
-    data = resp.json()
-    return data.get("text") or data.get("message", {}).get(
-        "content", json.dumps(data, indent=2)
-    )
+        raise ProviderHTTPError(
+            f"{label} error {resp.status_code}: {resp.text}",
+            resp.status_code,
+            parse_retry_after(resp.headers.get("Retry-After")),
+        )
 
 
-def post_gemini_responses(
-    api_key: str,
-    model: str,
-    messages: list[dict[str, str]],
-    temperature: float,
-    max_tokens: int,
-) -> str:
-    contents = []
-    for m in messages:
-        role = "user" if m["role"] != "assistant" else "model"
-        contents.append({"role": role, "parts": [{"text": m["content"]}]})
-    url = (
-        f"https://generativelanguage.googleapis.com/v1beta/models/"
-        f"{model}:generateContent?key={api_key}"
-    )
-    payload = {
-        "contents": contents,
-        "generationConfig": {
-            "temperature": float(temperature),
-            "maxOutputTokens": int(max_tokens),
-        },
-    }
-    headers = {"Content-Type": "application/json"}
-    resp = requests.post(url, headers=headers, json=payload, timeout=60)
-    if resp.status_code >= 400:
-        raise RuntimeError(f"Google AI Studio error {resp.status_code}: {resp.text}")
-    data = resp.json()
-    try:
-        return data["candidates"][0]["content"]["parts"][0]["text"]
-    except Exception:  # noqa: BLE001
-        return json.dumps(data, indent=2)
+@dataclass
+class ProviderResponse:
+    text: str
+    total_ms: float
+    streamed: bool = False
+    ttft_ms: Optional[float] = None      # request start -> first content chunk
+    itl_mean_ms: Optional[float] = None  # mean gap between content chunks
+    itl_p95_ms: Optional[float] = None
+    chunks: int = 0
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    finish_reason: Optional[str] = None
 
 
 # ---------- JSONL export helpers ----------
 
-def _slug(s: str, maxlen: int = 40) -> str:
-    s = re.sub(r"[^\w\-]+", "-", s.strip())
-    s = re.sub(r"-{2,}", "-", s).strip("-")
-    return (s[:maxlen] or "model").lower()
-
-
 def _hash_text(s: str) -> str:
     return hashlib.sha256((s or "").encode("utf-8")).hexdigest()[:12]
 
 
+_local_state: dict[str, Any] = {}
+
+
+def _session_state() -> Any:
+    """
+    Streamlit's session state when running inside the app, otherwise a
+    plain module-level dict, so this module never imports streamlit itself.
+    """
+    st = sys.modules.get("streamlit")
+    if st is not None:
+        return st.session_state
+    return _local_state
+
+
+def new_run_id() -> str:
+    return os.getenv("RUN_ID", "") or os.urandom(8).hex()
+
+
 def get_export_dir() -> Path:
-    default = "atl_data/exports"
-    export_dir = Path(st.session_state.get("export_dir", default)).expanduser()
+    state = _session_state()
+    export_dir = Path(state.get("export_dir", DEFAULT_EXPORT_DIR)).expanduser()
     export_dir.mkdir(parents=True, exist_ok=True)
-    st.session_state["export_dir"] = str(export_dir)
+    state["export_dir"] = str(export_dir)
     return export_dir
 
 
-def export_interaction_jsonl_row(
+def utc_timestamp() -> str:
+    return datetime.utcnow().strftime("%Y-%m-%dT%H-%M-%SZ")
+
+
+def build_interaction_row(
     *,
+    run_id: str,
     provider: str,
     model: str,
     temperature: float,
@@ -429,23 +558,19 @@ def export_interaction_jsonl_row(
     token_input: Optional[int] = None,
     token_output: Optional[int] = None,
     experiment_tag: Optional[str] = None,
-) -> Path:
-    export_dir = get_export_dir()
-
-    ts = datetime.utcnow().strftime("%Y-%m-%dT%H-%M-%SZ")
-    model_tag = _slug(model)
-    qtag = question_id or "Q"
-    fname = f"{ts}-{model_tag}-{qtag}.jsonl"
-    fpath = export_dir / fname
-
-    if "current_run_id" not in st.session_state:
-        st.session_state["current_run_id"] = os.getenv("RUN_ID", "") or str(
-            os.urandom(8).hex()
-        )
-
+    cache_hit: bool = False,
+    timestamp_utc: Optional[str] = None,
+    include_texts: bool = True,
+    extra: Optional[dict[str, Any]] = None,
+) -> dict[str, Any]:
+    """
+    With include_texts=False the system prompt and question text are left
+    out; readers restore them from the run manifest by their hashes.
+    `extra` holds optional per-call metrics appended to the row.
+    """
     row = {
-        "run_id": st.session_state["current_run_id"],
-        "timestamp_utc": ts,
+        "run_id": run_id,
+        "timestamp_utc": timestamp_utc or utc_timestamp(),
         "provider": provider,
         "model": model,
         "temperature": float(temperature),
@@ -453,6 +578,7 @@ def export_interaction_jsonl_row(
         "system_prompt_sha256": _hash_text(system_prompt),
         "system_prompt": system_prompt,
         "question_id": question_id,
+        "question_sha256": _hash_text(question_text),
         "question_text": question_text,
         "response_text": response_text,
         "status": status,
@@ -461,9 +587,12 @@ def export_interaction_jsonl_row(
         "token_input": token_input,
         "token_output": token_output,
         "experiment_tag": experiment_tag,
+        "cache_hit": bool(cache_hit),
     }
+    if not include_texts:
+        del row["system_prompt"]
+        del row["question_text"]
+    if extra:
+        row.update(extra)
+    return row
 
-    with fpath.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(row, ensure_ascii=False) + "\n")
-
-    return fpath
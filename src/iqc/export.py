@@ -0,0 +1,253 @@
+# src/iqc/export.py
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional
+import json
+import os
+import re
+import threading
+import time
+
+from iqc.core import _hash_text
+
+
+# ---------- Run file layout ----------
+#
+# Every row of a run goes to one file:
+#     <export_dir>/run-<run_id>.jsonl
+# and, when size rotation is enabled, continues in
+#     <export_dir>/run-<run_id>.0001.jsonl, .0002.jsonl, ...
+# Texts shared by many rows (system prompt, questions) live once in
+#     <export_dir>/run-<run_id>.manifest.json
+# and rows refer to them by hash.
+# Shard k of n of a sharded run writes the same set of files under
+#     <export_dir>/run-<run_id>.shard-<k>-of-<n>...
+# (rows still carry the plain run_id) until `iqc merge` combines them.
+
+RUN_FILE_PREFIX = "run-"
+
+_PART_RE = re.compile(r"\.(\d{4})\.jsonl$")
+SHARD_RE = re.compile(r"\.shard-(\d+)-of-(\d+)$")
+
+
+def run_file_path(export_dir: Path, run_id: str, part: int = 0) -> Path:
+    suffix = ".jsonl" if part == 0 else f".{part:04d}.jsonl"
+    return Path(export_dir) / f"{RUN_FILE_PREFIX}{run_id}{suffix}"
+
+
+def shard_run_id(run_id: str, index: int, count: int) -> str:
+    """File-level id of shard `index` (0-based) of `count`."""
+    return f"{run_id}.shard-{index + 1:03d}-of-{count:03d}"
+
+
+def run_files(export_dir: Path, run_id: str) -> List[Path]:
+    """All data files of a run, in write order."""
+    export_dir = Path(export_dir)
+    first = run_file_path(export_dir, run_id)
+    parts = [
+        p
+        for p in export_dir.glob(f"{RUN_FILE_PREFIX}{run_id}.*.jsonl")
+        if _PART_RE.search(p.name)
+    ]
+    parts.sort(key=lambda p: int(_PART_RE.search(p.name).group(1)))
+    return ([first] if first.exists() else []) + parts
+
+
+def manifest_path(export_dir: Path, run_id: str) -> Path:
+    return Path(export_dir) / f"{RUN_FILE_PREFIX}{run_id}.manifest.json"
+
+
+# ---------- Run manifest ----------
+
+_SECRET_FIELD_RE = re.compile(r"(^|_)(key|token|secret|password)$", re.IGNORECASE)
+
+
+def redact_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy of a providers.yaml entry that is safe to write to disk.
+    `${ENV}` references are kept (they name a variable, not a secret).
+    """
+    out: Dict[str, Any] = {}
+    for k, v in entry.items():
+        if _SECRET_FIELD_RE.search(str(k)) and v:
+            sv = str(v).strip()
+            out[k] = sv if sv.startswith("${") and sv.endswith("}") else "***"
+        else:
+            out[k] = v
+    return out
+
+
+def load_run_manifest(export_dir: Path, run_id: str) -> Dict[str, Any]:
+    path = manifest_path(export_dir, run_id)
+    if not path.exists():
+        return {"run_id": run_id, "system_prompts": {}, "questions": {}, "providers": []}
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_run_manifest(
+    export_dir: Path,
+    run_id: str,
+    *,
+    system_prompt: str,
+    entries: Iterable[Dict[str, Any]],
+    questions: Iterable[Dict[str, Any]],
+    **extra: Any,
+) -> Path:
+    """
+    Record the run's shared texts once. Calling it again for the same run
+    (e.g. a resumed run) merges into the existing manifest.
+    """
+    manifest = load_run_manifest(export_dir, run_id)
+    manifest["system_prompts"][_hash_text(system_prompt)] = system_prompt
+
+    qmap = manifest["questions"]
+    for q in questions:
+        text = str(q.get("text", "")).strip()
+        slot = qmap.setdefault(_hash_text(text), {"text": text, "ids": []})
+        qid = q.get("id")
+        if qid not in slot["ids"]:
+            slot["ids"].append(qid)
+
+    known = {json.dumps(e, sort_keys=True, default=str) for e in manifest["providers"]}
+    for e in entries:
+        red = redact_entry(e)
+        sig = json.dumps(red, sort_keys=True, default=str)
+        if sig not in known:
+            known.add(sig)
+            manifest["providers"].append(red)
+
+    manifest.update(extra)
+    return save_run_manifest(export_dir, run_id, manifest)
+
+
+def save_run_manifest(export_dir: Path, run_id: str, manifest: Dict[str, Any]) -> Path:
+    path = manifest_path(export_dir, run_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".json.tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    return path
+
+
+def rehydrate_row(row: Dict[str, Any], manifest: Dict[str, Any]) -> Dict[str, Any]:
+    """Restore `system_prompt` / `question_text` from their hashes."""
+    if "system_prompt" not in row:
+        row["system_prompt"] = manifest["system_prompts"].get(
+            row.get("system_prompt_sha256")
+        )
+    if "question_text" not in row:
+        q = manifest["questions"].get(row.get("question_sha256"))
+        row["question_text"] = q["text"] if q else None
+    return row
+
+
+def iter_run_rows(
+    export_dir: Path,
+    run_id: str,
+    rehydrate: bool = False,
+) -> Iterator[Dict[str, Any]]:
+    manifest = load_run_manifest(export_dir, run_id) if rehydrate else None
+    for path in run_files(export_dir, run_id):
+        with path.open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    row = json.loads(line)
+                    yield rehydrate_row(row, manifest) if manifest else row
+
+
+# ---------- Buffered run writer ----------
+
+class RunWriter:
+    """
+    Append-only writer for all rows of one run.
+
+    Rows are serialized as they arrive but written in batches: after
+    `flush_every` rows or `flush_interval_s` seconds, whichever comes first.
+    With `max_bytes`, the run continues in a new numbered part file once the
+    current one grows past that size. `on_flush` callbacks receive each batch
+    of rows once it is safely on disk.
+    """
+
+    def __init__(
+        self,
+        export_dir: Path,
+        run_id: str,
+        *,
+        flush_every: int = 64,
+        flush_interval_s: float = 2.0,
+        max_bytes: Optional[int] = None,
+        on_flush: Optional[List[Callable[[List[Dict[str, Any]]], None]]] = None,
+    ) -> None:
+        self.export_dir = Path(export_dir)
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+        self.run_id = run_id
+        self.flush_every = max(1, int(flush_every))
+        self.flush_interval_s = float(flush_interval_s)
+        self.max_bytes = max_bytes or None
+        self.on_flush = list(on_flush or [])
+        self.rows_written = 0
+
+        self._lock = threading.Lock()
+        self._buffer: List[Dict[str, Any]] = []
+        self._last_flush = time.monotonic()
+        # Resuming an existing run appends to its newest part.
+        existing = run_files(self.export_dir, run_id)
+        m = _PART_RE.search(existing[-1].name) if existing else None
+        self._part = int(m.group(1)) if m else 0
+        self._fh: Optional[IO[str]] = None
+
+    @property
+    def path(self) -> Path:
+        return run_file_path(self.export_dir, self.run_id, self._part)
+
+    def _open(self) -> IO[str]:
+        if self._fh is None:
+            self._fh = self.path.open("a", encoding="utf-8")
+        return self._fh
+
+    def write(self, row: Dict[str, Any]) -> None:
+        with self._lock:
+            self._buffer.append(row)
+            due = (
+                len(self._buffer) >= self.flush_every
+                or time.monotonic() - self._last_flush >= self.flush_interval_s
+            )
+            if due:
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if self._buffer:
+            rows, self._buffer = self._buffer, []
+            fh = self._open()
+            fh.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows))
+            fh.flush()
+            self.rows_written += len(rows)
+            if self.max_bytes is not None and fh.tell() >= self.max_bytes:
+                fh.close()
+                self._fh = None
+                self._part += 1
+            for callback in self.on_flush:
+                callback(rows)
+        self._last_flush = time.monotonic()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    def __enter__(self) -> "RunWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
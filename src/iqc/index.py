@@ -0,0 +1,472 @@
+# src/iqc/index.py
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+
+from iqc.export import RUN_FILE_PREFIX, iter_run_rows
+
+
+# ---------- Results index ----------
+#
+# One SQLite file per export directory,
+#     <export_dir>/index/results.sqlite3
+# holding every exported row (latest per run and cell) with the columns
+# that queries filter on broken out and indexed. MatrixRun feeds it from
+# the RunWriter as batches reach disk; `ingest_dir` backfills runs written
+# before the index existed. The JSONL files remain the source of truth:
+# deleting the index loses nothing.
+
+DEFAULT_INDEX_FILE = "index/results.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    run_id         TEXT NOT NULL,
+    cell_key       TEXT NOT NULL,
+    provider       TEXT,
+    model          TEXT,
+    question_id    TEXT,
+    status         TEXT,
+    timestamp_utc  TEXT,
+    experiment_tag TEXT,
+    latency_ms     REAL,
+    token_output   INTEGER,
+    cache_hit      INTEGER,
+    sample         INTEGER,
+    warmup         INTEGER,
+    dedup_of       TEXT,
+    row            TEXT NOT NULL,
+    PRIMARY KEY (run_id, cell_key)
+);
+CREATE INDEX IF NOT EXISTS results_question ON results (question_id, provider, timestamp_utc);
+CREATE INDEX IF NOT EXISTS results_provider ON results (provider, model, timestamp_utc);
+CREATE INDEX IF NOT EXISTS results_model ON results (model, timestamp_utc);
+CREATE INDEX IF NOT EXISTS results_status ON results (status, timestamp_utc);
+CREATE INDEX IF NOT EXISTS results_time ON results (timestamp_utc);
+CREATE TABLE IF NOT EXISTS ingested_files (
+    path        TEXT PRIMARY KEY,
+    offset      INTEGER NOT NULL,
+    inode       INTEGER,
+    tail_sha256 TEXT
+);
+"""
+
+# Row fields broken out into columns (cell_key handled separately).
+_COLUMNS = (
+    "run_id",
+    "provider",
+    "model",
+    "question_id",
+    "status",
+    "timestamp_utc",
+    "experiment_tag",
+    "latency_ms",
+    "token_output",
+    "cache_hit",
+    "sample",
+    "warmup",
+    "dedup_of",
+)
+_BOOL_COLUMNS = ("cache_hit", "warmup")
+# Columns added after the first release, with their types, for migration.
+_ADDED_COLUMNS = {"sample": "INTEGER", "warmup": "INTEGER", "dedup_of": "TEXT"}
+# An ingested file is recognised by its inode and a hash of the bytes just
+# before the stored offset; if either changed, it is read again from 0.
+_FILE_COLUMNS = {"inode": "INTEGER", "tail_sha256": "TEXT"}
+_TAIL_BYTES = 4096
+# Rows that record a provider call of their own: statistics use only these.
+_MEASURED = (
+    "NOT COALESCE(cache_hit, 0) AND NOT COALESCE(warmup, 0) AND dedup_of IS NULL"
+)
+
+Selector = Union[None, str, Sequence[str]]
+
+_SHARD_FILE_RE = re.compile(r"\.shard-\d+-of-\d+\.")
+
+
+def _row_key(row: Dict[str, Any]) -> str:
+    # Rows from before cell keys existed: one per question × provider/model.
+    return row.get("cell_key") or "|".join(
+        str(row.get(k)) for k in ("provider", "model", "question_id", "timestamp_utc")
+    )
+
+
+def _column(row: Dict[str, Any], name: str) -> Any:
+    value = row.get(name)
+    if name in _BOOL_COLUMNS and value is not None:
+        return int(value)
+    return value
+
+
+def _tail_sha256(f: Any, offset: int) -> str:
+    """sha256 of the (up to) _TAIL_BYTES bytes of binary file `f` before `offset`."""
+    start = max(0, offset - _TAIL_BYTES)
+    f.seek(start)
+    return hashlib.sha256(f.read(offset - start)).hexdigest()
+
+
+def _where(field: str, value: Selector, clauses: List[str], params: List[Any]) -> None:
+    """Exact match, IN (...) for several values, GLOB when a value has * or ?."""
+    if value is None:
+        return
+    values = [value] if isinstance(value, str) else list(value)
+    if not values:
+        return
+    if any(ch in v for v in values for ch in "*?["):
+        clauses.append("(" + " OR ".join(f"{field} GLOB ?" for _ in values) + ")")
+    elif len(values) == 1:
+        clauses.append(f"{field} = ?")
+    else:
+        clauses.append(f"{field} IN ({','.join('?' * len(values))})")
+    params.extend(values)
+
+
+def _ts(value: str) -> str:
+    """Accept ISO-ish input ("2025-01-31T12:00") for the row timestamp format."""
+    return value.replace(":", "-")
+
+
+def forget_ingested(export_dir: Path, paths: Iterable[Path]) -> None:
+    """`ResultsIndex.forget_files` for the export directory's index, if it has one."""
+    path = Path(export_dir) / DEFAULT_INDEX_FILE
+    if path.exists():
+        with ResultsIndex(path) as index:
+            index.forget_files(paths)
+
+
+class ResultsIndex:
+    """
+    Query-able index over exported rows. Safe to share across threads; all
+    access is serialized on one connection.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+
+    def _migrate(self) -> None:
+        """Add columns missing from an older index and fill them from `row`."""
+        have = {r[1] for r in self._conn.execute("PRAGMA table_info(ingested_files)")}
+        for name, kind in _FILE_COLUMNS.items():
+            if name not in have:
+                # Left NULL: such entries are checked by the newline test only.
+                self._conn.execute(f"ALTER TABLE ingested_files ADD COLUMN {name} {kind}")
+        have = {r[1] for r in self._conn.execute("PRAGMA table_info(results)")}
+        missing = [c for c in _ADDED_COLUMNS if c not in have]
+        if not missing:
+            self._conn.commit()
+            return
+        for name in missing:
+            self._conn.execute(f"ALTER TABLE results ADD COLUMN {name} {_ADDED_COLUMNS[name]}")
+        found = self._conn.execute("SELECT rowid, row FROM results").fetchall()
+        self._conn.executemany(
+            f"UPDATE results SET {', '.join(f'{c} = ?' for c in missing)} WHERE rowid = ?",
+            (
+                tuple(_column(json.loads(row), c) for c in missing) + (rowid,)
+                for rowid, row in found
+            ),
+        )
+        self._conn.commit()
+
+    @classmethod
+    def for_export_dir(cls, export_dir: Path) -> "ResultsIndex":
+        return cls(Path(export_dir) / DEFAULT_INDEX_FILE)
+
+    # ----- ingestion -----
+
+    def add_rows(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Insert rows; a later row for the same run and cell replaces the earlier one."""
+        records = [
+            (_row_key(r),)
+            + tuple(_column(r, c) for c in _COLUMNS)
+            + (json.dumps(r, ensure_ascii=False),)
+            for r in rows
+        ]
+        if not records:
+            return 0
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO results (cell_key, {', '.join(_COLUMNS)}, row) "
+                f"VALUES ({','.join('?' * (len(_COLUMNS) + 2))})",
+                records,
+            )
+            self._conn.commit()
+        return len(records)
+
+    def _ingest_file(self, path: Path) -> int:
+        """
+        New lines of one run file since the last ingest. A file replaced or
+        rewritten since then (other inode, or the bytes before the stored
+        offset changed) is read again from the start; its rows replace
+        their earlier copies, so that is safe.
+        """
+        key = str(path.resolve())
+        with self._lock:
+            found = self._conn.execute(
+                "SELECT offset, inode, tail_sha256 FROM ingested_files WHERE path = ?",
+                (key,),
+            ).fetchone()
+        st = path.stat()
+        offset, inode, tail = found if found else (0, None, None)
+        if offset > st.st_size or (inode is not None and inode != st.st_ino):
+            offset = 0
+        rows: List[Dict[str, Any]] = []
+        with path.open("rb") as f:
+            if offset:
+                f.seek(offset - 1)
+                if f.read(1) != b"\n" or (tail is not None and _tail_sha256(f, offset) != tail):
+                    offset = 0
+            if st.st_size <= offset:
+                return 0
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partial line still being written
+                offset += len(line)
+                line = line.strip()
+                if line:
+                    rows.append(json.loads(line))
+            tail = _tail_sha256(f, offset)
+        n = self.add_rows(rows)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ingested_files (path, offset, inode, tail_sha256) "
+                "VALUES (?, ?, ?, ?)",
+                (key, offset, st.st_ino, tail),
+            )
+            self._conn.commit()
+        return n
+
+    def forget_files(self, paths: Iterable[Path]) -> None:
+        """Drop the ingest offsets of `paths`; the next ingest reads them from 0."""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM ingested_files WHERE path = ?",
+                [(str(Path(p).resolve()),) for p in paths],
+            )
+            self._conn.commit()
+
+    def ingest_dir(self, export_dir: Path) -> int:
+        """
+        Backfill every run file in `export_dir`. Incremental: files are read
+        from where the previous ingest stopped. Returns the rows added.
+        """
+        export_dir = Path(export_dir)
+        n = 0
+        for path in sorted(export_dir.glob(f"{RUN_FILE_PREFIX}*.jsonl")):
+            if path.name.endswith(".journal.jsonl") or _SHARD_FILE_RE.search(path.name):
+                continue  # shards are indexed when `iqc merge` combines them
+            n += self._ingest_file(path)
+        return n
+
+    def ingest_run(self, export_dir: Path, run_id: str) -> int:
+        return self.add_rows(iter_run_rows(export_dir, run_id))
+
+    # ----- queries -----
+
+    def _filters(
+        self,
+        *,
+        run_id: Selector = None,
+        provider: Selector = None,
+        model: Selector = None,
+        question_id: Selector = None,
+        status: Selector = None,
+        experiment_tag: Selector = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        alias: str = "",
+    ) -> Tuple[List[str], List[Any]]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        _where(alias + "run_id", run_id, clauses, params)
+        _where(alias + "provider", provider, clauses, params)
+        _where(alias + "model", model, clauses, params)
+        _where(alias + "question_id", question_id, clauses, params)
+        _where(alias + "status", status, clauses, params)
+        _where(alias + "experiment_tag", experiment_tag, clauses, params)
+        if since:
+            clauses.append(f"{alias}timestamp_utc >= ?")
+            params.append(_ts(since))
+        if until:
+            clauses.append(f"{alias}timestamp_utc < ?")
+            params.append(_ts(until))
+        return clauses, params
+
+    def _select(
+        self,
+        sql: str,
+        filters: Dict[str, Any],
+        last_runs: Optional[int],
+        tail: str = "",
+        where: Sequence[str] = (),
+    ) -> List[Tuple[Any, ...]]:
+        """`where` adds clauses that do not pick which runs are the last ones."""
+        clauses, params = self._filters(**filters)
+        if last_runs:
+            # The N most recent runs that have any matching row.
+            inner = " AND ".join(clauses) or "1"
+            clauses.append(
+                f"run_id IN (SELECT run_id FROM results WHERE {inner} "
+                "GROUP BY run_id ORDER BY MAX(timestamp_utc) DESC LIMIT ?)"
+            )
+            params = params + params + [int(last_runs)]
+        clauses.extend(where)
+        cond = " WHERE " + " AND ".join(clauses) if clauses else ""
+        with self._lock:
+            return self._conn.execute(sql + cond + tail, params).fetchall()
+
+    def query(
+        self,
+        *,
+        last_runs: Optional[int] = None,
+        limit: Optional[int] = None,
+        **filters: Any,
+    ) -> List[Dict[str, Any]]:
+        """
+        Rows matching all given filters, oldest first. Filters: run_id,
+        provider, model, question_id, status, experiment_tag (a value, a
+        list, or a glob like "Groq*") and since/until timestamps.
+        `last_runs=N` keeps only the N most recent runs with matching rows.
+        """
+        tail = " ORDER BY timestamp_utc, run_id"
+        if limit:
+            tail += f" LIMIT {int(limit)}"
+        found = self._select("SELECT row FROM results", filters, last_runs, tail)
+        return [json.loads(r[0]) for r in found]
+
+    def runs(self, *, limit: Optional[int] = None, **filters: Any) -> List[Dict[str, Any]]:
+        """One summary per run with matching rows, newest first."""
+        tail = " GROUP BY run_id ORDER BY MAX(timestamp_utc) DESC"
+        if limit:
+            tail += f" LIMIT {int(limit)}"
+        found = self._select(
+            "SELECT run_id, MIN(timestamp_utc), MAX(timestamp_utc), COUNT(*), "
+            "SUM(status != 'ok'), COUNT(DISTINCT provider || '/' || model), "
+            "MAX(experiment_tag) FROM results",
+            filters,
+            None,
+            tail,
+        )
+        return [
+            {
+                "run_id": r[0],
+                "first_ts": r[1],
+                "last_ts": r[2],
+                "rows": r[3],
+                "errors": r[4] or 0,
+                "models": r[5],
+                "experiment_tag": r[6],
+            }
+            for r in found
+        ]
+
+    def stats(
+        self, *, last_runs: Optional[int] = None, **filters: Any
+    ) -> List[Dict[str, Any]]:
+        """
+        Per run × provider × model: rows, error rate, latency mean/min/max.
+        Only rows of calls actually made count; cache hits, warm-ups and
+        shared (dedup) copies are left out of every aggregate.
+        """
+        found = self._select(
+            "SELECT run_id, provider, model, COUNT(*), SUM(status != 'ok'), "
+            "AVG(latency_ms), MIN(latency_ms), MAX(latency_ms), SUM(token_output) "
+            "FROM results",
+            filters,
+            last_runs,
+            " GROUP BY run_id, provider, model ORDER BY MAX(timestamp_utc), provider, model",
+            where=(_MEASURED,),
+        )
+        return [
+            {
+                "run_id": r[0],
+                "provider": r[1],
+                "model": r[2],
+                "rows": r[3],
+                "errors": r[4] or 0,
+                "error_rate": (r[4] or 0) / r[3] if r[3] else 0.0,
+                "latency_mean_ms": r[5],
+                "latency_min_ms": r[6],
+                "latency_max_ms": r[7],
+                "token_output": r[8],
+            }
+            for r in found
+        ]
+
+    def compare(self, base_run: str, run_id: str, **filters: Any) -> Dict[str, Any]:
+        """
+        Changes from `base_run` to `run_id`, matching cells on provider,
+        model, question_id and repeat index (`sample`): per-model error
+        rate and mean latency deltas, plus the cells that regressed
+        (ok -> error) or recovered. Warm-ups are not compared.
+        """
+        filters.pop("run_id", None)
+        per_model: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for s in self.stats(run_id=[base_run, run_id], **filters):
+            side = "base" if s["run_id"] == base_run else "run"
+            slot = per_model.setdefault(
+                (s["provider"], s["model"]), {"provider": s["provider"], "model": s["model"]}
+            )
+            slot[side] = {k: s[k] for k in ("rows", "errors", "error_rate", "latency_mean_ms")}
+        for slot in per_model.values():
+            b, r = slot.get("base"), slot.get("run")
+            if b and r:
+                slot["error_rate_delta"] = r["error_rate"] - b["error_rate"]
+                if b["latency_mean_ms"] is not None and r["latency_mean_ms"] is not None:
+                    slot["latency_mean_delta_ms"] = r["latency_mean_ms"] - b["latency_mean_ms"]
+
+        clauses, params = self._filters(alias="a.", **filters)
+        extra = "".join(f" AND {c}" for c in clauses)
+        with self._lock:
+            changed = self._conn.execute(
+                "SELECT a.provider, a.model, a.question_id, a.status, b.status, "
+                "a.latency_ms, b.latency_ms FROM results a JOIN results b "
+                "ON a.provider = b.provider AND a.model = b.model "
+                "AND a.question_id = b.question_id "
+                "AND COALESCE(a.sample, 0) = COALESCE(b.sample, 0) "
+                "WHERE a.run_id = ? AND b.run_id = ? AND a.status != b.status "
+                f"AND NOT COALESCE(a.warmup, 0) AND NOT COALESCE(b.warmup, 0){extra}",
+                [base_run, run_id] + params,
+            ).fetchall()
+        cells = [
+            {
+                "provider": c[0],
+                "model": c[1],
+                "question_id": c[2],
+                "base_status": c[3],
+                "status": c[4],
+                "base_latency_ms": c[5],
+                "latency_ms": c[6],
+            }
+            for c in changed
+        ]
+        return {
+            "base_run": base_run,
+            "run_id": run_id,
+            "models": list(per_model.values()),
+            "regressed": [c for c in cells if c["base_status"] == "ok"],
+            "recovered": [c for c in cells if c["status"] == "ok"],
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "ResultsIndex":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
@@ -0,0 +1,155 @@
+# src/iqc/jobs.py
+
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import os
+import threading
+import time
+
+from iqc.runner import MatrixRun
+
+
+# ---------- Background jobs ----------
+#
+# Runs a MatrixRun on a worker thread instead of the caller's, so the
+# Streamlit script can rerun (every widget click) without interrupting it.
+# The UI keeps one JobManager per process and polls `Job.snapshot()`,
+# which only reads counters the run already maintains.
+
+# Job states in lifecycle order. "cancelling" is only reported by
+# `Job.snapshot()`, for a running job whose cancel was requested; the
+# last three are final.
+JOB_STATES = ("queued", "running", "cancelling", "done", "failed", "cancelled")
+FINISHED_STATES = JOB_STATES[-3:]
+DEFAULT_MAX_JOBS = 2
+
+
+def new_job_id() -> str:
+    return os.urandom(4).hex()
+
+
+class Job:
+    def __init__(self, run: MatrixRun, label: str = "") -> None:
+        self.id = new_job_id()
+        self.run = run
+        self.label = label or run.run_id
+        self.state = "queued"
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.future: Optional[Future] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    @property
+    def progress(self) -> float:
+        return self.run.done / self.run.total if self.run.total else 1.0
+
+    def cancel(self) -> bool:
+        """
+        A queued job is dropped; a running one stops starting calls and
+        ends once in-flight calls finish. False if it already finished.
+        """
+        if self.finished:
+            return False
+        self.run.cancel()
+        if self.future is not None and self.future.cancel():
+            self.state = "cancelled"
+            self.finished_at = time.time()
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        run = self.run
+        running = self.state == "running"
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "label": self.label,
+            "run_id": run.run_id,
+            "state": "cancelling" if running and run.cancelled else self.state,
+            "done": run.done,
+            "total": run.total,
+            "errors": run.errors,
+            "cache_hits": run.cache_hits,
+            "progress": self.progress,
+            "calls_per_s": run.live.rate() if running else None,
+            "eta_s": run.live.eta_s() if running else None,
+            "elapsed_s": end - self.started_at if self.started_at else 0.0,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    Executes matrix runs as jobs on a small worker pool; at most
+    `max_workers` run at once and the rest wait in order. Each run keeps
+    its own `max_concurrency` for provider calls.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_JOBS) -> None:
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, int(max_workers)), thread_name_prefix="iqc-job"
+        )
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+
+    def submit(self, run: MatrixRun, label: str = "") -> Job:
+        with self._lock:
+            for other in self._jobs.values():
+                if not other.finished and other.run.run_id == run.run_id:
+                    # Two writers on one run file would interleave rows.
+                    raise ValueError(f"Run {run.run_id} is already in job {other.id}.")
+            job = Job(run, label)
+            self._jobs[job.id] = job
+            job.future = self._pool.submit(self._execute, job)
+        return job
+
+    @staticmethod
+    def _execute(job: Job) -> None:
+        job.state = "running"
+        job.started_at = time.time()
+        try:
+            for _ in job.run.results():
+                pass
+            job.state = "cancelled" if job.run.cancelled else "done"
+        except Exception as e:  # noqa: BLE001
+            job.error = str(e)
+            job.state = "failed"
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        """Newest first."""
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+    def active(self) -> List[Job]:
+        return [j for j in self.jobs() if not j.finished]
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        return job.cancel() if job is not None else False
+
+    def forget(self, job_id: str) -> bool:
+        """Drop a finished job from the list."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.finished:
+                return False
+            del self._jobs[job_id]
+            return True
+
+    def shutdown(self, cancel: bool = True) -> None:
+        if cancel:
+            for job in self.active():
+                job.cancel()
+        self._pool.shutdown(wait=True)
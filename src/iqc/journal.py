@@ -0,0 +1,71 @@
+# src/iqc/journal.py
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Optional, Set
+import json
+import threading
+
+from iqc.core import utc_timestamp
+from iqc.export import RUN_FILE_PREFIX
+
+
+# ---------- Run journal ----------
+#
+# <export_dir>/run-<run_id>.journal.jsonl holds one line per finished cell:
+#     {"cell_key": "...", "status": "ok" | "error", "ts": "..."}
+# Lines are appended right after the matching rows reach the run file, so
+# a cell is never marked done before its row is on disk.
+
+def journal_path(export_dir: Path, run_id: str) -> Path:
+    return Path(export_dir) / f"{RUN_FILE_PREFIX}{run_id}.journal.jsonl"
+
+
+class RunJournal:
+    def __init__(self, export_dir: Path, run_id: str) -> None:
+        self.path = journal_path(export_dir, run_id)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._fh: Optional[IO[str]] = None
+
+    def load(self) -> Dict[str, str]:
+        """Latest status per cell key (later lines win)."""
+        state: Dict[str, str] = {}
+        if not self.path.exists():
+            return state
+        with self.path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn last line after a crash
+                key = rec.get("cell_key")
+                if key:
+                    state[key] = rec.get("status", "error")
+        return state
+
+    def completed(self) -> Set[str]:
+        return {k for k, status in self.load().items() if status == "ok"}
+
+    def record_rows(self, rows: Iterable[Dict[str, Any]]) -> None:
+        ts = utc_timestamp()
+        lines = [
+            json.dumps({"cell_key": r["cell_key"], "status": r.get("status"), "ts": ts})
+            + "\n"
+            for r in rows
+            if r.get("cell_key")
+        ]
+        if not lines:
+            return
+        with self._lock:
+            if self._fh is None:
+                self._fh = self.path.open("a", encoding="utf-8")
+            self._fh.write("".join(lines))
+            self._fh.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
@@ -0,0 +1,160 @@
+# src/iqc/live.py
+
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+import math
+import threading
+import time
+
+from iqc.timing import percentile
+
+
+# ---------- Live run metrics ----------
+#
+# Fed one export row at a time while a run is in progress; snapshots are
+# cheap (percentiles over a bounded window) so the UI can redraw them
+# every second or so without slowing the run loop. Rows may be added on
+# one thread (a background job) while another thread takes snapshots.
+
+DEFAULT_WINDOW_S = 60.0       # rates and error rate: last minute
+DEFAULT_LATENCY_WINDOW = 200  # latency percentiles: last N live calls per group
+
+
+@dataclass
+class _Group:
+    done: int = 0
+    errors: int = 0
+    cache_hits: int = 0
+    tokens: int = 0
+    # (t, is_error, completion tokens) of results inside the time window
+    recent: Deque[Tuple[float, bool, int]] = field(default_factory=deque)
+    latencies: Deque[float] = field(default_factory=deque)
+
+
+class LiveMetrics:
+    def __init__(
+        self,
+        total: int,
+        *,
+        done: int = 0,
+        window_s: float = DEFAULT_WINDOW_S,
+        latency_window: int = DEFAULT_LATENCY_WINDOW,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.total = total
+        self.done = done            # includes cells skipped on resume
+        self.window_s = window_s
+        self.latency_window = latency_window
+        self.clock = clock
+        self.started = clock()
+        self.groups: Dict[Tuple[str, str], _Group] = {}
+        self._recent: Deque[float] = deque()  # completion times, all groups
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Restart the clock, e.g. when the run begins executing."""
+        self.started = self.clock()
+
+    def _trim(self, q: Deque[Any], now: float, key: Callable[[Any], float]) -> None:
+        horizon = now - self.window_s
+        while q and key(q[0]) < horizon:
+            q.popleft()
+
+    def add_row(self, row: Dict[str, Any]) -> None:
+        with self._lock:
+            self._add_row(row)
+
+    def _add_row(self, row: Dict[str, Any]) -> None:
+        now = self.clock()
+        key = (row.get("provider"), row.get("model"))
+        g = self.groups.get(key)
+        if g is None:
+            g = self.groups[key] = _Group(latencies=deque(maxlen=self.latency_window))
+        is_error = row.get("status") != "ok"
+        tokens = int(row.get("token_output") or 0)
+        g.done += 1
+        g.errors += int(is_error)
+        g.tokens += tokens
+        self.done += 1
+        if row.get("cache_hit") or row.get("dedup_of"):
+            # Instant (cached, or a copy of a shared call); counting them
+            # would inflate rates and shrink the ETA.
+            g.cache_hits += 1
+            return
+        g.recent.append((now, is_error, tokens))
+        self._trim(g.recent, now, lambda r: r[0])
+        if row.get("latency_ms") is not None and not row.get("warmup"):
+            g.latencies.append(float(row["latency_ms"]))
+        self._recent.append(now)
+        self._trim(self._recent, now, lambda t: t)
+
+    def _span(self, now: float) -> float:
+        return max(1e-6, min(self.window_s, now - self.started))
+
+    def rate(self) -> float:
+        """Completed live (non-cached) calls per second over the window."""
+        now = self.clock()
+        with self._lock:
+            self._trim(self._recent, now, lambda t: t)
+            return len(self._recent) / self._span(now)
+
+    def eta_s(self) -> Optional[float]:
+        remaining = self.total - self.done
+        if remaining <= 0:
+            return 0.0
+        rate = self.rate()
+        return remaining / rate if rate > 0 else None
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """One row per (provider, model), ready for a table."""
+        now = self.clock()
+        span = self._span(now)
+        out: List[Dict[str, Any]] = []
+        with self._lock:
+            groups = sorted(self.groups.items(), key=lambda kv: str(kv[0]))
+            for _, g in groups:
+                self._trim(g.recent, now, lambda r: r[0])
+            state = [
+                (key, g.done, g.errors, g.cache_hits, list(g.recent), list(g.latencies))
+                for key, g in groups
+            ]
+        for (provider, model), done, errors, cache_hits, recent, lat in state:
+            n_recent = len(recent)
+            out.append(
+                {
+                    "provider": provider,
+                    "model": model,
+                    "done": done,
+                    "errors": errors,
+                    "error_rate": (
+                        sum(1 for r in recent if r[1]) / n_recent if n_recent else 0.0
+                    ),
+                    "calls_per_s": n_recent / span,
+                    "tokens_per_s": sum(r[2] for r in recent) / span,
+                    "p50_ms": percentile(lat, 50) if lat else None,
+                    "p95_ms": percentile(lat, 95) if lat else None,
+                    "cache_hits": cache_hits,
+                }
+            )
+        return out
+
+    def summary_line(self) -> str:
+        eta = self.eta_s()
+        eta_txt = "—" if eta is None else format_duration(eta)
+        return (
+            f"{self.done}/{self.total} done · {self.rate():.1f} calls/s · "
+            f"ETA {eta_txt}"
+        )
+
+
+def format_duration(seconds: float) -> str:
+    if math.isinf(seconds) or math.isnan(seconds):
+        return "—"
+    s = int(round(seconds))
+    h, rem = divmod(s, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}h{m:02d}m" if h else (f"{m}m{s:02d}s" if m else f"{s}s")
+
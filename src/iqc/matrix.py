@@ -1,19 +1,22 @@
 # src/iqc/matrix.py
 
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 import streamlit as st
 
-from iqc.core import (
-    PROVIDER_BY_NAME,
-    resolve_api_key,
-    post_openai_compatible,
-    post_cohere_chat,
-    post_gemini_responses,
-    export_interaction_jsonl_row,
-    get_export_dir,
+from iqc.core import DEFAULT_EXPORT_DIR, QuestionBank, get_export_dir, new_run_id
+from iqc.batch import DEFAULT_BATCH_POLL_S
+from iqc.cache import CACHE_MODES
+from iqc.jobs import DEFAULT_MAX_JOBS, Job, JobManager
+from iqc.live import format_duration
+from iqc.retry import RetryPolicy
+from iqc.runner import (
+    DEFAULT_MAX_CONCURRENCY,
+    MatrixRun,
+    RunOptions,
 )
+from iqc.sampling import DEFAULT_CONFIDENCE, load_sample_summary
 
 
 
@@ -26,11 +29,9 @@ def matrix_selection_section() -> tuple[list[int], list[int]]:
     # ----- Questions -----
     q_bank = st.session_state.get("q_bank", [])
     if q_bank:
-        q_labels = [
-            f"{(q['id'] or str(i+1))}: "
-            f"{q['text'][:60]}{'…' if len(q['text']) > 60 else ''}"
-            for i, q in enumerate(q_bank)
-        ]
+        if not isinstance(q_bank, QuestionBank):
+            q_bank = st.session_state["q_bank"] = QuestionBank.from_questions(q_bank)
+        q_labels = q_bank.labels(60)  # built once per loaded bank
 
         q_preset = st.radio(
             "Question selection",
@@ -112,7 +113,7 @@ def matrix_selection_section() -> tuple[list[int], list[int]]:
 def export_directory_section() -> Path:
     st.markdown("### 📁 Export Directory")
 
-    default_export_path = st.session_state.get("export_dir", "atl_data/exports")
+    default_export_path = st.session_state.get("export_dir", DEFAULT_EXPORT_DIR)
 
     export_dir_input = st.text_input(
         "Choose or type an export directory:",
@@ -131,10 +132,178 @@ def export_directory_section() -> Path:
     return export_path
 
 
+def _live_table(rows: List[dict]) -> List[dict]:
+    def ms(v: Optional[float]) -> Optional[float]:
+        return None if v is None else round(v, 1)
+
+    return [
+        {
+            "provider": r["provider"],
+            "model": r["model"],
+            "done": r["done"],
+            "errors": r["errors"],
+            "error %": round(100.0 * r["error_rate"], 1),
+            "calls/s": round(r["calls_per_s"], 2),
+            "tok/s": round(r["tokens_per_s"], 1),
+            "p50 ms": ms(r["p50_ms"]),
+            "p95 ms": ms(r["p95_ms"]),
+        }
+        for r in rows
+    ]
+
+
 def run_matrix_section(
     selected_q_idxs: List[int],
     selected_model_idxs: List[int],
 ) -> None:
+    max_concurrency = st.number_input(
+        "Max concurrent calls",
+        min_value=1,
+        max_value=64,
+        value=DEFAULT_MAX_CONCURRENCY,
+        step=1,
+        help="Upper bound on provider calls in flight at once across the whole matrix.",
+        key="max_concurrency",
+    )
+
+    stream_responses = st.checkbox(
+        "Stream responses (measure time-to-first-token)",
+        value=False,
+        help=(
+            "Use server-sent events for OpenAI-compatible, Cohere and Gemini "
+            "providers. Entries can override this with `stream: true/false`."
+        ),
+        key="stream_responses",
+    )
+
+    st.number_input(
+        "Live metrics refresh (s)",
+        min_value=0.2,
+        value=1.0,
+        step=0.5,
+        help="How often the runs panel redraws while runs are active (rates and error % cover the last minute).",
+        key="live_refresh_s",
+    )
+
+    with st.expander("Batch mode", expanded=False):
+        use_batch = st.checkbox(
+            "Send each entry's calls as one provider batch job",
+            value=False,
+            help=(
+                "For large matrices on OpenAI-compatible providers with a batch "
+                "API: cheaper, higher limits, but results can take hours. "
+                "Entries can override with `batch: true/false`."
+            ),
+            key="use_batch",
+        )
+        batch_poll_s = st.number_input(
+            "Status check interval (s)",
+            min_value=1.0,
+            value=DEFAULT_BATCH_POLL_S,
+            step=5.0,
+            key="batch_poll_s",
+        )
+
+    with st.expander("Repeated sampling", expanded=False):
+        repeats = st.number_input(
+            "Samples per cell",
+            min_value=1,
+            max_value=100,
+            value=1,
+            step=1,
+            help=(
+                "Send every (question, model) cell this many times, interleaved "
+                "across providers, and summarise its latency (mean, p50/p95/p99, "
+                "std, bootstrap CIs). Repeats skip the response cache. Entries "
+                "can override with `repeats:`."
+            ),
+            key="repeats",
+        )
+        warmup = st.number_input(
+            "Warm-up calls per cell (not measured)",
+            min_value=0,
+            max_value=10,
+            value=0,
+            step=1,
+            key="warmup",
+        )
+
+    with st.expander("Retries", expanded=False):
+        max_attempts = st.number_input(
+            "Max attempts per call (1 = no retry)",
+            min_value=1,
+            max_value=10,
+            value=4,
+            step=1,
+            help=(
+                "429/5xx responses and timeouts are retried with jittered "
+                "exponential backoff, honouring Retry-After. Entries can "
+                "override with `max_attempts` / `retry_budget_s`."
+            ),
+            key="max_attempts",
+        )
+        retry_budget_s = st.number_input(
+            "Max total backoff per call (s)",
+            min_value=0.0,
+            value=120.0,
+            step=10.0,
+            key="retry_budget_s",
+        )
+
+    with st.expander("Response cache", expanded=False):
+        cache_mode = st.radio(
+            "Cache mode",
+            options=list(CACHE_MODES),
+            index=0,
+            horizontal=True,
+            help=(
+                "use: reuse cached responses and store new ones; "
+                "refresh: re-query everything and overwrite the cache; "
+                "bypass: ignore the cache for this run."
+            ),
+            key="cache_mode",
+        )
+        cache_ttl_h = st.number_input(
+            "Cache TTL (hours, 0 = never expire)",
+            min_value=0.0,
+            value=0.0,
+            step=1.0,
+            key="cache_ttl_h",
+        )
+        cache_max_entries = st.number_input(
+            "Max cached responses (0 = unlimited)",
+            min_value=0,
+            value=100_000,
+            step=1000,
+            key="cache_max_entries",
+        )
+
+    write_parquet = st.checkbox(
+        "Also write a Parquet dataset when the run finishes",
+        value=False,
+        help=(
+            "Compacts the run into <export dir>/parquet, partitioned by "
+            "run/provider/model, for fast loading in notebooks (needs pyarrow)."
+        ),
+        key="write_parquet",
+    )
+
+    resume_run = st.checkbox(
+        "Resume a previous run",
+        value=False,
+        help=(
+            "Skip cells the run's journal marks as done; re-run only missing "
+            "or failed ones and append to the same run file."
+        ),
+        key="resume_run",
+    )
+    resume_run_id = ""
+    if resume_run:
+        resume_run_id = st.text_input(
+            "Run ID to resume",
+            value=st.session_state.get("current_run_id", ""),
+        ).strip()
+
     run_matrix_btn = st.button(
         "Benchmark Matrix (Questions × Models)",
         type="primary",
@@ -157,125 +326,166 @@ def run_matrix_section(
         st.error("No provider entries loaded.")
         return
 
-    import time as _time
+    if resume_run:
+        if not resume_run_id:
+            st.error("Enter the run ID to resume.")
+            return
+        st.session_state["current_run_id"] = resume_run_id
+    else:
+        st.session_state["current_run_id"] = new_run_id()
+
+    run = MatrixRun(
+        entries=entries,
+        q_bank=q_bank,
+        selected_q_idxs=selected_q_idxs,
+        selected_model_idxs=selected_model_idxs,
+        system_prompt=st.session_state.get("system_prompt", ""),
+        export_dir=get_export_dir(),
+        run_id=st.session_state["current_run_id"],
+        options=RunOptions(
+            max_concurrency=int(max_concurrency),
+            stream=bool(stream_responses),
+            cache_mode=cache_mode,
+            cache_ttl_s=float(cache_ttl_h) * 3600.0,
+            cache_max_entries=int(cache_max_entries),
+            experiment_tag=st.session_state.get("experiment_tag"),
+            resume=bool(resume_run),
+            retry=RetryPolicy(
+                max_attempts=int(max_attempts),
+                max_total_s=float(retry_budget_s),
+            ),
+            batch=bool(use_batch),
+            batch_poll_s=float(batch_poll_s),
+            parquet=bool(write_parquet),
+            repeats=int(repeats),
+            warmup=int(warmup),
+        ),
+    )
+    for msg in run.warnings:
+        st.warning(msg)
 
-    total_runs = len(selected_q_idxs) * len(selected_model_idxs)
+    total_runs = run.total
     st.info(
-        f"Running matrix: {len(selected_q_idxs)} question(s) × "
-        f"{len(selected_model_idxs)} model(s) = {total_runs} calls."
+        f"Queued matrix `{run.run_id}`: {len(selected_q_idxs)} question(s) × "
+        f"{len(selected_model_idxs)} model(s) = {total_runs} calls "
+        f"(up to {int(max_concurrency)} concurrent)."
+        + (f" Resuming: {run.resumed} already done." if run.resumed else "")
     )
+    if not total_runs:
+        return
+    try:
+        _job_manager().submit(run)
+    except ValueError as e:
+        st.error(str(e))
+
+
+# ---------- Background jobs ----------
+#
+# Runs execute on the process-wide JobManager, outside the script thread,
+# so widget clicks (reruns) no longer interrupt them and several runs can
+# go at once. The panel below polls job state on a fragment timer.
+
+@st.cache_resource
+def _job_manager() -> JobManager:
+    return JobManager(max_workers=DEFAULT_MAX_JOBS)
+
+
+def _job_panel(job: Job) -> None:
+    snap = job.snapshot()
+    run = job.run
+    state = snap["state"]
+    st.markdown(f"**`{snap['run_id']}`** — {state}")
+    st.progress(snap["progress"])
+    if state in ("running", "cancelling"):
+        st.caption(
+            f"{run.live.summary_line()} · {snap['errors']} error(s) · "
+            f"{snap['cache_hits']} cached"
+        )
+        rows = run.live.snapshot()
+        if rows:
+            st.dataframe(_live_table(rows), hide_index=True)
+        if state == "running" and st.button("Cancel", key=f"cancel_job_{job.id}"):
+            job.cancel()
+        return
+    if state == "queued":
+        if st.button("Cancel", key=f"cancel_job_{job.id}"):
+            job.cancel()
+        return
 
-    progress = st.progress(0.0)
-    progress_text = st.empty()
-    run_count = 0
-    progress_text.markdown(f"**Progress:** 0.0% (0 / {total_runs})")
-
-    if "current_run_id" not in st.session_state:
-        st.session_state["current_run_id"] = __import__("uuid").uuid4().hex
-
-    system_prompt = st.session_state.get("system_prompt", "")
-    for qi in selected_q_idxs:
-        q_obj = q_bank[qi]
-        question_id = q_obj.get("id")
-        question_text = q_obj.get("text", "").strip()
-
-        for mi in selected_model_idxs:
-            row = entries[mi]
-            name = row.get("name")
-            entry_model = row.get("model")
-            entry_key = row.get("api_key")
-            temp = row.get("temperature", 0.7)
-            mtoks = row.get("max_tokens", 512)
-
-            if not name or not entry_model:
-                continue
-            if name not in PROVIDER_BY_NAME:
-                st.warning(f"Unknown provider in YAML: {name}. Skipping.")
-                continue
-            p = PROVIDER_BY_NAME[name]
-            resolved_key = resolve_api_key(entry_key)
-
-            if not resolved_key and p.kind != "custom" and p.name != "Ollama (local)":
-                st.warning(f"Missing API key for {name}. Skipping.")
-                continue
-
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": question_text},
-            ]
-
-            t0 = _time.perf_counter()
-            content = ""
-            status = "ok"
-            error_message = None
-
-            try:
-                if p.kind == "openai_compatible":
-                    path_override = None
-                    extra_headers = {}
-                    if p.name == "GitHub Models":
-                        extra_headers["Accept"] = "application/json"
-                    content = post_openai_compatible(
-                        provider=p,
-                        api_key=resolved_key or "",
-                        model=entry_model,
-                        messages=messages,
-                        temperature=temp,
-                        max_tokens=mtoks,
-                        extra_headers=extra_headers,
-                        path_override=path_override,
-                    )
-                elif p.name.startswith("Cohere"):
-                    content = post_cohere_chat(
-                        resolved_key or "",
-                        entry_model,
-                        messages,
-                        temp,
-                        mtoks,
-                    )
-                elif p.name.startswith("Google AI Studio"):
-                    content = post_gemini_responses(
-                        resolved_key or "",
-                        entry_model,
-                        messages,
-                        temp,
-                        mtoks,
-                    )
-                else:
-                    raise RuntimeError("Unsupported provider configuration.")
-            except Exception as e:  # noqa: BLE001
-                status = "error"
-                error_message = str(e)
-                content = ""
-
-            latency_ms = (_time.perf_counter() - t0) * 1000.0
-
-            export_interaction_jsonl_row(
-                provider=name,
-                model=entry_model,
-                temperature=temp,
-                max_tokens=mtoks,
-                system_prompt=system_prompt,
-                question_id=question_id,
-                question_text=question_text,
-                response_text=content,
-                status=status,
-                error_message=error_message,
-                latency_ms=latency_ms,
-                token_input=None,
-                token_output=None,
-                experiment_tag=st.session_state.get("experiment_tag"),
+    if state == "failed":
+        st.error(f"Run failed: {snap['error']}")
+    elif state == "cancelled":
+        st.warning(
+            f"Cancelled after {snap['done']}/{snap['total']} calls. "
+            "Resume it with the run ID above."
+        )
+    else:
+        st.success(
+            f"Finished matrix run: {run.done} calls ({run.cache_hits} from cache) "
+            f"in {format_duration(snap['elapsed_s'])}.\n\n"
+            f"JSONL saved to:\n{run.run_file.resolve()}"
+            + (f"\n\nParquet dataset:\n{run.parquet_dir.resolve()}" if run.parquet_dir else "")
+        )
+    if run.samples_file is not None:
+        with st.expander("Latency samples (ms per cell)", expanded=False):
+            st.caption(
+                f"{int(DEFAULT_CONFIDENCE * 100)}% bootstrap intervals; "
+                "warm-ups and cached or shared responses are left out."
             )
-
-            run_count += 1
-            frac = run_count / total_runs
-            pct = frac * 100.0
-            progress.progress(frac)
-            progress_text.markdown(
-                f"**Progress:** {pct:.1f}% ({run_count} / {total_runs})"
+            st.dataframe(
+                [
+                    {
+                        k: c[k]
+                        for k in (
+                            "question_id",
+                            "provider",
+                            "model",
+                            "n",
+                            "errors",
+                            "mean",
+                            "std",
+                            "p50",
+                            "p95",
+                            "p99",
+                            "mean_ci_low",
+                            "mean_ci_high",
+                        )
+                    }
+                    for c in load_sample_summary(run.export_dir, run.part_id)
+                ],
+                hide_index=True,
+            )
+    timing = run.timing.summary()
+    if timing:
+        with st.expander("Timing breakdown (mean ms per call)", expanded=False):
+            st.caption(
+                "queue/throttle/backoff are harness waits; dns…read are network "
+                "phases of the final attempt; ttfb is mostly model time."
+            )
+            st.dataframe(
+                [
+                    {"provider": provider}
+                    | {phase[:-3]: round(v["mean"], 1) for phase, v in phases.items()}
+                    for provider, phases in timing.items()
+                ]
             )
+    if st.button("Dismiss", key=f"dismiss_job_{job.id}"):
+        _job_manager().forget(job.id)
+        st.rerun(scope="fragment")
 
-    st.success(
-        f"Finished matrix run: {run_count} calls.\n\n"
-        f"JSONL files saved in:\n{get_export_dir().resolve()}"
-    )
+
+def jobs_section() -> None:
+    manager = _job_manager()
+    if not manager.jobs():
+        return
+    st.markdown("### ⏱️ Runs")
+    refresh_s = float(st.session_state.get("live_refresh_s", 1.0))
+
+    # Redraws only this fragment; polling reads counters, it never blocks a run.
+    @st.fragment(run_every=refresh_s if manager.active() else None)
+    def panel() -> None:
+        for job in manager.jobs():
+            with st.container(border=True):
+                _job_panel(job)
+
+    panel()
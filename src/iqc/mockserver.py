@@ -0,0 +1,476 @@
+# src/iqc/mockserver.py
+
+"""
+Local stand-in for provider APIs, for load tests and offline development.
+
+Speaks the request/response shapes the adapters use:
+    POST /v1/chat/completions                      OpenAI-compatible (+ SSE)
+    POST /v1/chat                                  Cohere v1 chat (+ NDJSON)
+    POST /v1beta/models/<m>:generateContent        Gemini
+    POST /v1beta/models/<m>:streamGenerateContent  Gemini SSE
+    POST /v1/files, /v1/batches; GET /v1/batches/<id>, /v1/files/<id>/content
+                                                   OpenAI-style batch jobs
+
+Run:
+    iqc mock --port 8765 --latency-ms 200 --latency-dist lognormal
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+import itertools
+import json
+import math
+import random
+import threading
+import time
+
+
+LATENCY_DISTS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+# ---------- Behaviour ----------
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 0.0          # mean service time before the first byte
+    latency_dist: str = "fixed"      # one of LATENCY_DISTS
+    latency_spread: float = 0.5      # uniform: ±fraction of the mean; lognormal: sigma
+    error_rate: float = 0.0          # fraction of calls answered with HTTP 500
+    burst_every: int = 0             # every N calls start a 429 burst (0 = never)
+    burst_len: int = 0               # ... lasting this many calls
+    retry_after_s: float = 1.0       # Retry-After sent with 429s
+    reply_words: int = 32            # length of every reply
+    stream_chunks: int = 8           # content chunks per streamed reply
+    itl_ms: float = 0.0              # delay between streamed chunks
+    seed: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        if self.latency_dist not in LATENCY_DISTS:
+            raise ValueError(f"Unknown latency distribution: {self.latency_dist}")
+
+
+@dataclass
+class MockStats:
+    requests: int = 0
+    errors: int = 0
+    throttled: int = 0
+    streamed: int = 0
+    by_route: Dict[str, int] = field(default_factory=dict)
+
+
+class _Behaviour:
+    """Thread-safe sampling of latency and injected failures."""
+
+    def __init__(self, config: MockConfig) -> None:
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.stats = MockStats()
+        self.arrivals: Dict[str, List[float]] = {}  # route -> monotonic arrival times
+        self._lock = threading.Lock()
+
+    def latency_s(self) -> float:
+        c = self.config
+        mean = max(0.0, c.latency_ms) / 1000.0
+        if mean == 0.0 or c.latency_dist == "fixed":
+            return mean
+        with self._lock:
+            if c.latency_dist == "uniform":
+                lo, hi = mean * (1 - c.latency_spread), mean * (1 + c.latency_spread)
+                return max(0.0, self.rng.uniform(lo, hi))
+            if c.latency_dist == "exponential":
+                return self.rng.expovariate(1.0 / mean)
+            # lognormal with the requested mean
+            sigma = max(0.0, c.latency_spread)
+            return self.rng.lognormvariate(math.log(mean) - sigma * sigma / 2.0, sigma)
+
+    def admit(self, route: str) -> Optional[int]:
+        """Count the call; returns an HTTP status to fail it with, if any."""
+        c = self.config
+        with self._lock:
+            n = self.stats.requests
+            self.stats.requests += 1
+            self.stats.by_route[route] = self.stats.by_route.get(route, 0) + 1
+            self.arrivals.setdefault(route, []).append(time.monotonic())
+            if c.burst_every and c.burst_len and n % c.burst_every < c.burst_len:
+                self.stats.throttled += 1
+                return 429
+            if c.error_rate and self.rng.random() < c.error_rate:
+                self.stats.errors += 1
+                return 500
+        return None
+
+    def count_stream(self) -> None:
+        with self._lock:
+            self.stats.streamed += 1
+
+    def reply(self, prompt: str) -> List[str]:
+        words = ["lorem", "ipsum", "dolor", "sit", "amet", "qubit", "gate", "noise"]
+        n = max(1, self.config.reply_words)
+        text = [words[i % len(words)] for i in range(n)]
+        k = max(1, min(self.config.stream_chunks, n))
+        step = int(math.ceil(n / k))
+        return [" ".join(text[i:i + step]) + " " for i in range(0, n, step)]
+
+
+def _words(text: str) -> int:
+    return len(str(text).split())
+
+
+# ---------- Wire formats ----------
+
+def _openai_body(model: str, text: str, usage: Tuple[int, int]) -> Dict[str, Any]:
+    return {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion",
+        "model": model,
+        "choices": [
+            {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+        ],
+        "usage": {
+            "prompt_tokens": usage[0],
+            "completion_tokens": usage[1],
+            "total_tokens": usage[0] + usage[1],
+        },
+    }
+
+
+def _openai_events(model: str, parts: List[str], usage: Tuple[int, int]) -> List[str]:
+    events = [
+        json.dumps({"model": model, "choices": [{"index": 0, "delta": {"content": p}}]})
+        for p in parts
+    ]
+    events.append(
+        json.dumps({"model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+    )
+    events.append(
+        json.dumps(
+            {
+                "model": model,
+                "choices": [],
+                "usage": {"prompt_tokens": usage[0], "completion_tokens": usage[1]},
+            }
+        )
+    )
+    return [f"data: {e}\n\n" for e in events] + ["data: [DONE]\n\n"]
+
+
+def _cohere_body(text: str, usage: Tuple[int, int]) -> Dict[str, Any]:
+    return {
+        "text": text,
+        "finish_reason": "COMPLETE",
+        "meta": {"billed_units": {"input_tokens": usage[0], "output_tokens": usage[1]}},
+    }
+
+
+def _cohere_events(parts: List[str], usage: Tuple[int, int]) -> List[str]:
+    events = [{"event_type": "stream-start", "is_finished": False}]
+    events += [{"event_type": "text-generation", "text": p} for p in parts]
+    events.append(
+        {
+            "event_type": "stream-end",
+            "finish_reason": "COMPLETE",
+            "response": _cohere_body("".join(parts), usage),
+        }
+    )
+    return [json.dumps(e) + "\n" for e in events]
+
+
+def _gemini_body(text: str, usage: Tuple[int, int], finish: Optional[str] = "STOP") -> Dict[str, Any]:
+    cand: Dict[str, Any] = {"content": {"role": "model", "parts": [{"text": text}]}}
+    if finish:
+        cand["finishReason"] = finish
+    return {
+        "candidates": [cand],
+        "usageMetadata": {"promptTokenCount": usage[0], "candidatesTokenCount": usage[1]},
+    }
+
+
+def _gemini_events(parts: List[str], usage: Tuple[int, int]) -> List[str]:
+    events = []
+    for i, p in enumerate(parts):
+        last = i == len(parts) - 1
+        body = _gemini_body(p, usage, "STOP" if last else None)
+        if not last:
+            body.pop("usageMetadata")
+        events.append(f"data: {json.dumps(body)}\n\n")
+    return events
+
+
+# ---------- HTTP handler ----------
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like real providers
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+    server: "_MockHTTPServer"
+
+    def log_message(self, *args: Any) -> None:  # quiet
+        pass
+
+    # --- plumbing ---
+
+    def _read_body(self) -> bytes:
+        n = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(n) if n else b""
+
+    def _json(self, status: int, obj: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        self._raw(status, json.dumps(obj).encode("utf-8"), "application/json", headers)
+
+    def _raw(
+        self,
+        status: int,
+        body: bytes,
+        content_type: str,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, chunks: List[str], content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        itl = self.server.behaviour.config.itl_ms / 1000.0
+        for i, chunk in enumerate(chunks):
+            if i and itl:
+                time.sleep(itl)
+            data = chunk.encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _fail(self, status: int) -> None:
+        headers = {}
+        if status == 429:
+            headers["Retry-After"] = f"{self.server.behaviour.config.retry_after_s:g}"
+        self._json(status, {"error": {"message": "mock failure", "code": status}}, headers)
+
+    # --- routes ---
+
+    def do_POST(self) -> None:  # noqa: N802
+        path = urlsplit(self.path).path
+        body = self._read_body()
+        if path == "/v1/files":
+            return self._upload(body)
+        if path == "/v1/batches":
+            return self._create_batch(json.loads(body or b"{}"))
+
+        if path.endswith("/chat/completions"):
+            route = "openai"
+        elif path.endswith("/v1/chat"):
+            route = "cohere"
+        elif ":generateContent" in path or ":streamGenerateContent" in path:
+            route = "gemini"
+        else:
+            return self._json(404, {"error": f"no route for {path}"})
+
+        try:
+            req = json.loads(body or b"{}")
+        except ValueError:
+            return self._json(400, {"error": "invalid JSON"})
+
+        b = self.server.behaviour
+        status = b.admit(route)
+        time.sleep(b.latency_s())
+        if status is not None:
+            return self._fail(status)
+
+        if route == "openai":
+            prompt = " ".join(str(m.get("content", "")) for m in req.get("messages") or [])
+            stream = bool(req.get("stream"))
+        elif route == "cohere":
+            prompt = str(req.get("message", ""))
+            stream = bool(req.get("stream"))
+        else:
+            prompt = " ".join(
+                str(p.get("text", ""))
+                for c in req.get("contents") or []
+                for p in c.get("parts") or []
+            )
+            stream = ":streamGenerateContent" in path
+
+        parts = b.reply(prompt)
+        usage = (_words(prompt), _words("".join(parts)))
+        model = str(req.get("model") or path.rsplit("/", 1)[-1].split(":")[0])
+        if stream:
+            b.count_stream()
+            if route == "openai":
+                return self._stream(_openai_events(model, parts, usage), "text/event-stream")
+            if route == "cohere":
+                return self._stream(_cohere_events(parts, usage), "application/x-ndjson")
+            return self._stream(_gemini_events(parts, usage), "text/event-stream")
+
+        text = "".join(parts)
+        if route == "openai":
+            return self._json(200, _openai_body(model, text, usage))
+        if route == "cohere":
+            return self._json(200, _cohere_body(text, usage))
+        return self._json(200, _gemini_body(text, usage))
+
+    def do_GET(self) -> None:  # noqa: N802
+        path = urlsplit(self.path).path
+        if path == "/health":
+            return self._json(200, {"ok": True})
+        if path.startswith("/v1/batches/"):
+            return self._get_batch(path.rsplit("/", 1)[-1])
+        if path.startswith("/v1/files/") and path.endswith("/content"):
+            content = self.server.files.get(path.split("/")[3])
+            if content is None:
+                return self._json(404, {"error": "no such file"})
+            return self._raw(200, content.encode("utf-8"), "application/jsonl")
+        self._json(404, {"error": f"no route for {path}"})
+
+    # --- batch jobs ---
+
+    def _upload(self, body: bytes) -> None:
+        ctype = self.headers.get("Content-Type", "")
+        msg = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {ctype}\r\n\r\n".encode() + body
+        )
+        content = None
+        for part in msg.iter_parts():
+            if part.get_param("name", header="content-disposition") == "file":
+                content = part.get_payload(decode=True).decode("utf-8")
+        if content is None:
+            return self._json(400, {"error": "missing file"})
+        fid = self.server.new_id("file")
+        self.server.files[fid] = content
+        self._json(200, {"id": fid, "object": "file", "purpose": "batch"})
+
+    def _create_batch(self, req: Dict[str, Any]) -> None:
+        if req.get("input_file_id") not in self.server.files:
+            return self._json(400, {"error": "unknown input_file_id"})
+        bid = self.server.new_id("batch")
+        self.server.batches[bid] = {
+            "id": bid,
+            "object": "batch",
+            "endpoint": req.get("endpoint"),
+            "input_file_id": req["input_file_id"],
+            "completion_window": req.get("completion_window"),
+            "status": "validating",
+            "metadata": req.get("metadata"),
+            "created_at": int(time.time()),
+        }
+        self._json(200, self.server.batches[bid])
+
+    def _get_batch(self, bid: str) -> None:
+        job = self.server.batches.get(bid)
+        if job is None:
+            return self._json(404, {"error": "no such batch"})
+        if job["status"] != "completed":
+            self._run_batch(job)
+        self._json(200, job)
+
+    def _run_batch(self, job: Dict[str, Any]) -> None:
+        b = self.server.behaviour
+        out: List[str] = []
+        errors: List[str] = []
+        for line in self.server.files[job["input_file_id"]].splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            body = item.get("body") or {}
+            status = b.admit("batch")
+            if status is not None:
+                rec = {"status_code": status, "body": {"error": {"message": "mock failure"}}}
+                errors.append(json.dumps({"custom_id": item.get("custom_id"), "response": rec}))
+                continue
+            prompt = " ".join(str(m.get("content", "")) for m in body.get("messages") or [])
+            text = "".join(b.reply(prompt))
+            usage = (_words(prompt), _words(text))
+            rec = {"status_code": 200, "body": _openai_body(str(body.get("model")), text, usage)}
+            out.append(json.dumps({"custom_id": item.get("custom_id"), "response": rec}))
+        job["output_file_id"] = self.server.new_id("file")
+        self.server.files[job["output_file_id"]] = "\n".join(out)
+        if errors:
+            job["error_file_id"] = self.server.new_id("file")
+            self.server.files[job["error_file_id"]] = "\n".join(errors)
+        job["status"] = "completed"
+        job["completed_at"] = int(time.time())
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, addr: Tuple[str, int], behaviour: _Behaviour) -> None:
+        super().__init__(addr, _Handler)
+        self.behaviour = behaviour
+        self.files: Dict[str, str] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self._ids = itertools.count(1)
+
+    def new_id(self, prefix: str) -> str:
+        return f"{prefix}-{next(self._ids)}"
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        # Clients dropping keep-alive connections is normal under load.
+        import sys
+
+        if not isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+            super().handle_error(request, client_address)
+
+
+# ---------- Public API ----------
+
+class MockServer:
+    """
+    Mock provider server on a background thread.
+
+        with MockServer(MockConfig(latency_ms=50)) as srv:
+            ...  # point entries at srv.url via `base_url:`
+    """
+
+    def __init__(
+        self, config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0
+    ) -> None:
+        self.behaviour = _Behaviour(config or MockConfig())
+        self._httpd = _MockHTTPServer((host, port), self.behaviour)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stats(self) -> MockStats:
+        return self.behaviour.stats
+
+    @property
+    def arrivals(self) -> Dict[str, List[float]]:
+        return self.behaviour.arrivals
+
+    def start(self) -> "MockServer":
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="iqc-mock", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "MockServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
@@ -0,0 +1,192 @@
+# src/iqc/ratelimit.py
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+import math
+import threading
+import time
+
+
+# ---------- Token buckets ----------
+
+class TokenBucket:
+    """Classic token bucket: `capacity` tokens, refilled at `rate` tokens/s."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        amount = min(float(amount), self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.tokens -= min(float(amount), self.capacity)
+
+
+def _per_minute_bucket(limit: Optional[float]) -> Optional[TokenBucket]:
+    if not limit:
+        return None
+    return TokenBucket(rate=float(limit) / 60.0, capacity=float(limit))
+
+
+# ---------- Per-provider limits ----------
+
+@dataclass
+class ProviderLimits:
+    rpm: Optional[float] = None
+    tpm: Optional[float] = None
+    max_concurrency: Optional[int] = None
+
+
+def _min_limit(a: Optional[float], b: Any) -> Optional[float]:
+    if b is None or b == "":
+        return a
+    b = float(b)
+    if b <= 0:
+        return a
+    return b if a is None else min(a, b)
+
+
+def limits_from_entries(entries: List[Dict[str, Any]]) -> Dict[str, ProviderLimits]:
+    """
+    Collect `rpm` / `tpm` / `max_concurrency` from providers.yaml entries.
+    Several entries may share one provider account, so the strictest value
+    configured for a provider name wins.
+    """
+    out: Dict[str, ProviderLimits] = {}
+    for row in entries:
+        name = row.get("name")
+        if not name:
+            continue
+        lim = out.setdefault(name, ProviderLimits())
+        lim.rpm = _min_limit(lim.rpm, row.get("rpm"))
+        lim.tpm = _min_limit(lim.tpm, row.get("tpm"))
+        mc = _min_limit(lim.max_concurrency, row.get("max_concurrency"))
+        lim.max_concurrency = None if mc is None else max(1, int(mc))
+    return out
+
+
+class ProviderLimiter:
+    """Request/token buckets plus an in-flight cap for one provider."""
+
+    def __init__(self, limits: ProviderLimits) -> None:
+        self.limits = limits
+        self.requests = _per_minute_bucket(limits.rpm)
+        self.tokens = _per_minute_bucket(limits.tpm)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens: int) -> float:
+        """
+        Reserve one request slot. Returns 0.0 on success, otherwise the
+        number of seconds to wait before retrying (`inf` when only a
+        completion can free capacity).
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            mc = self.limits.max_concurrency
+            if mc is not None and self.in_flight >= mc:
+                return math.inf
+            delay = self._take(tokens, now)
+            if delay == 0.0:
+                self.in_flight += 1
+            return delay
+
+    def acquire_retry(self, tokens: int) -> float:
+        """
+        Charge a retry against the request and token buckets, blocking
+        until they (and any pause) allow it. The call already holds its
+        in-flight slot from the first attempt. Returns the seconds waited.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                else:
+                    delay = self._take(tokens, now)
+            if delay == 0.0:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    def _take(self, tokens: int, now: float) -> float:
+        """Take one request and `tokens` from the buckets, or return the wait."""
+        waits = [0.0]
+        if self.requests is not None:
+            waits.append(self.requests.wait_time(1, now))
+        if self.tokens is not None:
+            waits.append(self.tokens.wait_time(tokens, now))
+        delay = max(waits)
+        if delay > 0:
+            return delay
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(tokens)
+        return 0.0
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back new calls, e.g. while the provider asks us to retry later."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class ProviderScheduler:
+    """Registry of `ProviderLimiter`s keyed by provider name."""
+
+    def __init__(self, limits: Optional[Dict[str, ProviderLimits]] = None) -> None:
+        self._limits = dict(limits or {})
+        self._limiters: Dict[str, ProviderLimiter] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_entries(cls, entries: List[Dict[str, Any]]) -> "ProviderScheduler":
+        return cls(limits_from_entries(entries))
+
+    def limiter(self, name: str) -> ProviderLimiter:
+        with self._lock:
+            lim = self._limiters.get(name)
+            if lim is None:
+                lim = ProviderLimiter(self._limits.get(name, ProviderLimits()))
+                self._limiters[name] = lim
+            return lim
+
+    def try_acquire(self, name: str, tokens: int) -> float:
+        return self.limiter(name).try_acquire(tokens)
+
+    def acquire_retry(self, name: str, tokens: int) -> float:
+        return self.limiter(name).acquire_retry(tokens)
+
+    def release(self, name: str) -> None:
+        self.limiter(name).release()
+
+    def pause(self, name: str, seconds: float) -> None:
+        self.limiter(name).pause(seconds)
+
+
+def estimate_tokens(system_prompt: str, question_text: str, max_tokens: int) -> int:
+    """Rough TPM cost of one call: ~4 chars/token for input plus the output cap."""
+    chars = len(system_prompt or "") + len(question_text or "")
+    return int(math.ceil(chars / 4.0)) + int(max_tokens or 0)
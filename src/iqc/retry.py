@@ -0,0 +1,116 @@
+# src/iqc/retry.py
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+import random
+import time
+
+import requests
+
+from iqc.core import ProviderHTTPError
+
+
+T = TypeVar("T")
+
+
+# ---------- Error classification ----------
+
+RETRYABLE_STATUS = frozenset({408, 425, 429, 500, 502, 503, 504, 529})
+
+_RETRYABLE_EXC = (
+    requests.exceptions.Timeout,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+def classify_error(exc: BaseException) -> Tuple[bool, Optional[float]]:
+    """(retryable, server-requested delay in seconds) for a failed call."""
+    if isinstance(exc, ProviderHTTPError):
+        return exc.status_code in RETRYABLE_STATUS, exc.retry_after_s
+    if isinstance(exc, _RETRYABLE_EXC):
+        return True, None
+    return False, None
+
+
+# ---------- Policy ----------
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 4
+    max_total_s: float = 120.0   # budget for backoff sleeps across all attempts
+    base_delay_s: float = 0.5
+    max_delay_s: float = 30.0
+
+    @classmethod
+    def from_entry(
+        cls, entry: Dict[str, Any], default: Optional["RetryPolicy"] = None
+    ) -> "RetryPolicy":
+        """Per-entry overrides: `max_attempts`, `retry_budget_s`."""
+        base = default or cls()
+        return cls(
+            max_attempts=max(1, int(entry.get("max_attempts", base.max_attempts))),
+            max_total_s=float(entry.get("retry_budget_s", base.max_total_s)),
+            base_delay_s=base.base_delay_s,
+            max_delay_s=base.max_delay_s,
+        )
+
+    def delay(self, attempt: int, retry_after_s: Optional[float] = None) -> float:
+        """
+        Full-jitter exponential backoff after failed attempt number
+        `attempt` (1-based). A server `Retry-After` is a floor, not a hint.
+        """
+        cap = min(self.max_delay_s, self.base_delay_s * (2 ** (attempt - 1)))
+        d = random.uniform(0.0, cap)
+        if retry_after_s is not None:
+            d = max(d, retry_after_s)
+        return d
+
+
+@dataclass
+class RetryStats:
+    attempts: int = 0
+    backoff_ms: float = 0.0
+    last_attempt_ms: float = 0.0
+    throttle_ms: float = 0.0  # waits for rate-limit capacity before retries
+
+
+def call_with_retry(
+    fn: Callable[[], T],
+    policy: RetryPolicy,
+    stats: RetryStats,
+    on_throttle: Optional[Callable[[float], None]] = None,
+    before_retry: Optional[Callable[[], float]] = None,
+) -> T:
+    """
+    Run `fn` until it succeeds, fails with a non-retryable error, or the
+    attempt / backoff budget runs out; the last error is re-raised.
+    `stats` is filled in either way. `on_throttle` is told about
+    server-requested pauses so other calls to the provider can back off too.
+    `before_retry` runs after each backoff sleep and blocks until the
+    provider's rate limits admit another attempt, returning the seconds
+    it waited; retries are requests like any other.
+    """
+    while True:
+        stats.attempts += 1
+        t0 = time.perf_counter()
+        try:
+            result = fn()
+            stats.last_attempt_ms = (time.perf_counter() - t0) * 1000.0
+            return result
+        except Exception as e:  # noqa: BLE001
+            stats.last_attempt_ms = (time.perf_counter() - t0) * 1000.0
+            retryable, retry_after = classify_error(e)
+            if not retryable or stats.attempts >= policy.max_attempts:
+                raise
+            delay = policy.delay(stats.attempts, retry_after)
+            if stats.backoff_ms / 1000.0 + delay > policy.max_total_s:
+                raise
+            if retry_after is not None and on_throttle is not None:
+                on_throttle(retry_after)
+            time.sleep(delay)
+            stats.backoff_ms += delay * 1000.0
+            if before_retry is not None:
+                stats.throttle_ms += before_retry() * 1000.0
@@ -0,0 +1,1056 @@
+# src/iqc/runner.py
+
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+import functools
+import hashlib
+import json
+import math
+import threading
+import time
+
+from iqc.core import (
+    PROVIDER_BY_NAME,
+    Provider,
+    ProviderResponse,
+    _hash_text,
+    build_interaction_row,
+    resolve_api_key,
+)
+from iqc.adapters import ProviderAdapter, get_adapter
+from iqc.batch import DEFAULT_BATCH_POLL_S, DEFAULT_COMPLETION_WINDOW, BatchJob
+from iqc.cache import CACHE_MODES, DEFAULT_CACHE_FILE, ResponseCache, cache_key
+from iqc.columnar import compact_run, pyarrow_available
+from iqc.export import (
+    RunWriter,
+    load_run_manifest,
+    run_file_path,
+    shard_run_id,
+    write_run_manifest,
+)
+from iqc.index import ResultsIndex
+from iqc.journal import RunJournal
+from iqc.live import LiveMetrics
+from iqc.ratelimit import ProviderScheduler, estimate_tokens
+from iqc.retry import RetryPolicy, RetryStats, call_with_retry, classify_error
+from iqc.sampling import write_sample_summary
+from iqc.sessions import DEFAULT_POOL_SIZE, configure_http_pool, http_pool_size
+from iqc.shard import select_shard
+from iqc.timing import NETWORK_PHASES, CallTiming, PhaseStats, measure_call
+
+
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+# ---------- Matrix planning ----------
+
+@dataclass
+class MatrixCell:
+    q_idx: int
+    m_idx: int
+    question_id: Optional[str]
+    question_text: str
+    name: str
+    model: str
+    temperature: float
+    max_tokens: int
+    provider: Provider
+    api_key: str
+    adapter: ProviderAdapter
+    stream: bool = False
+    key: str = ""
+    retry: RetryPolicy = field(default_factory=RetryPolicy)
+    batch: bool = False
+    request_key: str = ""  # identical requests share it, see request_key()
+    sample: int = 0  # repeat index; negative for warm-up calls
+    repeats: int = 1
+    warmup: int = 0
+    sample_of: Optional[str] = None  # key of sample 0, set when sampled
+
+    @property
+    def sampled(self) -> bool:
+        return self.repeats > 1 or self.warmup > 0
+
+    @property
+    def is_warmup(self) -> bool:
+        return self.sample < 0
+
+
+@dataclass
+class CellResult:
+    cell: MatrixCell
+    content: str
+    status: str
+    error_message: Optional[str]
+    latency_ms: Optional[float]
+    cache_hit: bool = False
+    response: Optional[ProviderResponse] = None
+    attempts: int = 0
+    backoff_ms: float = 0.0
+    wall_ms: Optional[float] = None
+    batch_id: Optional[str] = None
+    queue_ms: Optional[float] = None
+    throttle_ms: Optional[float] = None
+    timing: Dict[str, float] = field(default_factory=dict)  # final attempt, see iqc.timing
+    shared_with: List[str] = field(default_factory=list)  # cell keys that reused this call
+    dedup_of: Optional[str] = None  # cell key of the call this result was copied from
+
+
+def matrix_cell_key(q_obj: Dict[str, Any], mi: int, row: Dict[str, Any]) -> str:
+    """Stable id of a (question, providers.yaml entry) cell across restarts."""
+    return _hash_text(
+        json.dumps(
+            [
+                q_obj.get("id"),
+                q_obj.get("text", "").strip(),
+                mi,
+                row.get("name"),
+                row.get("model"),
+                row.get("temperature", 0.7),
+                row.get("max_tokens", 512),
+            ],
+            ensure_ascii=False,
+        )
+    )
+
+
+def sample_cell_key(base_key: str, sample: int) -> str:
+    """Key of repeat `sample` of a cell; sample 0 keeps the plain key."""
+    if sample == 0:
+        return base_key
+    return f"{base_key}:w{-sample}" if sample < 0 else f"{base_key}:{sample}"
+
+
+def request_key(
+    provider: Provider,
+    model: str,
+    temperature: float,
+    max_tokens: int,
+    question_text: str,
+    stream: bool,
+    sample: int = 0,
+) -> str:
+    """
+    Identity of the request a cell sends (the system prompt is run-wide).
+    Cells with equal keys would send byte-identical payloads to the same
+    endpoint, e.g. one question listed under two ids, or two entries with
+    the same provider/model/temperature/max_tokens. Repeats of a cell are
+    meant to be sent again, so `sample` is part of the key.
+    """
+    parts: List[Any] = [
+        provider.kind,
+        provider.base_url,
+        model,
+        float(temperature),
+        int(max_tokens),
+        question_text,
+        bool(stream),
+    ]
+    if sample:
+        parts.append(sample)
+    material = json.dumps(parts, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def plan_matrix(
+    entries: List[Dict[str, Any]],
+    q_bank: List[Dict[str, Any]],
+    selected_q_idxs: List[int],
+    selected_model_idxs: List[int],
+    stream: bool = False,
+    retry: Optional[RetryPolicy] = None,
+    batch: bool = False,
+    repeats: int = 1,
+    warmup: int = 0,
+) -> Tuple[List[MatrixCell], List[str]]:
+    """
+    Expand the selection into runnable (question, model) cells.
+    Entries that cannot run are skipped once and reported as warnings.
+    `stream`, `retry`, `batch`, `repeats` and `warmup` are run-wide
+    defaults; an entry's own `stream:`, `max_attempts:`, `retry_budget_s:`,
+    `batch:`, `repeats:` and `warmup:` override them. The provider
+    adapter is looked up here, once per entry, so calls never dispatch
+    on provider names; an entry's `base_url:` overrides the registry's.
+
+    Repeated cells are planned round by round (every warm-up, then sample
+    0 of every cell, then sample 1, ...), so the samples of each provider
+    are spread over the whole run instead of being taken back to back.
+    """
+    warnings: List[str] = []
+    runnable: List[Tuple[int, Dict[str, Any], Provider, ProviderAdapter, str, int, int]] = []
+
+    for mi in selected_model_idxs:
+        row = entries[mi]
+        name = row.get("name")
+        entry_model = row.get("model")
+
+        if not name or not entry_model:
+            continue
+        if name not in PROVIDER_BY_NAME:
+            warnings.append(f"Unknown provider in YAML: {name}. Skipping.")
+            continue
+        p = PROVIDER_BY_NAME[name]
+        if row.get("base_url"):
+            p = replace(p, base_url=row["base_url"])
+        resolved_key = resolve_api_key(row.get("api_key"))
+
+        if not resolved_key and p.requires_api_key:
+            warnings.append(f"Missing API key for {name}. Skipping.")
+            continue
+        try:
+            adapter = get_adapter(p.kind)
+        except RuntimeError as e:
+            warnings.append(f"{e} ({name}). Skipping.")
+            continue
+        n_repeats = max(1, int(row.get("repeats", repeats) or 1))
+        n_warmup = max(0, int(row.get("warmup", warmup) or 0))
+        if row.get("batch", batch) and not adapter.batch_endpoint:
+            warnings.append(f"{name} has no batch API; its calls run live.")
+        elif row.get("batch", batch) and (n_repeats > 1 or n_warmup):
+            warnings.append(f"{name} takes repeated latency samples; its calls run live.")
+        runnable.append((mi, row, p, adapter, resolved_key or "", n_repeats, n_warmup))
+
+    cells: List[MatrixCell] = []
+    first = -max((r[6] for r in runnable), default=0)
+    last = max((r[5] for r in runnable), default=1)
+    for sample in range(first, last):
+        for qi in selected_q_idxs:
+            q_obj = q_bank[qi]
+            text = q_obj.get("text", "").strip()
+            for mi, row, p, adapter, api_key, n_repeats, n_warmup in runnable:
+                if not -n_warmup <= sample < n_repeats:
+                    continue
+                sampled = n_repeats > 1 or n_warmup > 0
+                temperature = row.get("temperature", 0.7)
+                max_tokens = row.get("max_tokens", 512)
+                cell_stream = bool(row.get("stream", stream))
+                base_key = matrix_cell_key(q_obj, mi, row)
+                cells.append(
+                    MatrixCell(
+                        q_idx=qi,
+                        m_idx=mi,
+                        question_id=q_obj.get("id"),
+                        question_text=text,
+                        name=row["name"],
+                        model=row["model"],
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        provider=p,
+                        api_key=api_key,
+                        adapter=adapter,
+                        stream=cell_stream,
+                        key=sample_cell_key(base_key, sample),
+                        retry=RetryPolicy.from_entry(row, retry),
+                        batch=bool(
+                            row.get("batch", batch) and adapter.batch_endpoint and not sampled
+                        ),
+                        request_key=request_key(
+                            p, row["model"], temperature, max_tokens, text, cell_stream, sample
+                        ),
+                        sample=sample,
+                        repeats=n_repeats,
+                        warmup=n_warmup,
+                        sample_of=base_key if sampled else None,
+                    )
+                )
+    return cells, warnings
+
+
+def group_identical(
+    cells: List[MatrixCell],
+) -> Tuple[List[MatrixCell], Dict[str, List[MatrixCell]]]:
+    """
+    Split cells into the ones that must actually be sent (first of each
+    request_key) and, per key, the later cells that can reuse that result.
+    Sampled cells are always sent: their repeats measure the provider, so
+    like cache reads, sharing another cell's call would leave them empty.
+    """
+    leaders: List[MatrixCell] = []
+    followers: Dict[str, List[MatrixCell]] = {}
+    seen: Dict[str, MatrixCell] = {}
+    for cell in cells:
+        rk = cell.request_key or cell.key
+        if cell.sampled:
+            leaders.append(cell)
+        elif rk in seen:
+            followers.setdefault(rk, []).append(cell)
+        else:
+            seen[rk] = cell
+            leaders.append(cell)
+    return leaders, followers
+
+
+def fan_out(result: CellResult, followers: List[MatrixCell]) -> List[CellResult]:
+    """The leader's result followed by a copy for each cell that shares it."""
+    if not followers:
+        return [result]
+    result.shared_with = [c.key for c in followers]
+    return [result] + [
+        replace(result, cell=c, shared_with=[], dedup_of=result.cell.key) for c in followers
+    ]
+
+
+# ---------- Cell execution ----------
+
+def _send(cell: MatrixCell, messages: List[Dict[str, str]]) -> ProviderResponse:
+    return cell.adapter.call(
+        cell.provider,
+        cell.api_key,
+        cell.model,
+        messages,
+        cell.temperature,
+        cell.max_tokens,
+        stream=cell.stream,
+    )
+
+
+def _cell_messages(cell: MatrixCell, system_prompt: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": cell.question_text},
+    ]
+
+
+def call_cell(
+    cell: MatrixCell,
+    system_prompt: str,
+    on_throttle: Optional[Callable[[float], None]] = None,
+    queued_at: Optional[float] = None,
+    throttle_ms: Optional[float] = None,
+    before_retry: Optional[Callable[[], float]] = None,
+) -> CellResult:
+    """
+    Run one cell with retries. `queued_at` (a perf_counter value) and
+    `throttle_ms` come from the dispatcher and end up in the timing fields;
+    `before_retry` charges each retry against the provider's rate limits
+    (see `call_with_retry`), and its waits are added to `throttle_ms`.
+    """
+    messages = _cell_messages(cell, system_prompt)
+
+    t0 = time.perf_counter()
+    content = ""
+    status = "ok"
+    error_message = None
+    response: Optional[ProviderResponse] = None
+    stats = RetryStats()
+    last = CallTiming()
+
+    def attempt() -> ProviderResponse:
+        nonlocal last
+        with measure_call() as timing:
+            last = timing
+            return _send(cell, messages)
+
+    try:
+        response = call_with_retry(
+            attempt,
+            cell.retry,
+            stats,
+            on_throttle=on_throttle,
+            before_retry=before_retry,
+        )
+        content = response.text
+    except Exception as e:  # noqa: BLE001
+        status = "error"
+        error_message = str(e)
+        content = ""
+
+    # latency_ms is the final attempt only; wall_ms adds failed attempts
+    # and backoff sleeps.
+    return CellResult(
+        cell=cell,
+        content=content,
+        status=status,
+        error_message=error_message,
+        latency_ms=stats.last_attempt_ms,
+        response=response,
+        attempts=stats.attempts,
+        backoff_ms=stats.backoff_ms,
+        wall_ms=(time.perf_counter() - t0) * 1000.0,
+        queue_ms=None if queued_at is None else (t0 - queued_at) * 1000.0,
+        throttle_ms=(
+            (throttle_ms or 0.0) + stats.throttle_ms
+            if throttle_ms is not None or stats.throttle_ms
+            else None
+        ),
+        timing=last.phases,
+    )
+
+
+def result_row(
+    result: CellResult,
+    *,
+    run_id: str,
+    system_prompt: str,
+    experiment_tag: Optional[str] = None,
+) -> Dict[str, Any]:
+    cell = result.cell
+    resp = result.response
+    extra: Dict[str, Any] = {
+        "cell_key": cell.key,
+        "attempts": result.attempts,
+        "backoff_ms": result.backoff_ms,
+        "wall_ms": result.wall_ms,
+        "finish_reason": resp.finish_reason if resp else None,
+        "output_tokens_per_s": None,
+        "decode_tokens_per_s": None,
+        "streamed": bool(resp and resp.streamed),
+        "ttft_ms": resp.ttft_ms if resp else None,
+        "itl_mean_ms": resp.itl_mean_ms if resp else None,
+        "itl_p95_ms": resp.itl_p95_ms if resp else None,
+        "batch_id": result.batch_id,
+        "queue_ms": result.queue_ms,
+        "throttle_ms": result.throttle_ms,
+        "shared_with": result.shared_with or None,
+        "dedup_of": result.dedup_of,
+        "sample": cell.sample if cell.sampled else None,
+        "sample_of": cell.sample_of,
+        "warmup": cell.is_warmup,
+    }
+    for phase in NETWORK_PHASES:
+        extra[phase] = result.timing.get(phase)
+    if resp and resp.completion_tokens and not result.cache_hit and not result.dedup_of:
+        # End-to-end rate over the whole call; for streamed calls also the
+        # generation rate after the first token arrived.
+        if result.latency_ms:
+            extra["output_tokens_per_s"] = resp.completion_tokens / (
+                result.latency_ms / 1000.0
+            )
+        if resp.ttft_ms is not None and resp.total_ms > resp.ttft_ms:
+            extra["decode_tokens_per_s"] = resp.completion_tokens / (
+                (resp.total_ms - resp.ttft_ms) / 1000.0
+            )
+    return build_interaction_row(
+        run_id=run_id,
+        provider=cell.name,
+        model=cell.model,
+        temperature=cell.temperature,
+        max_tokens=cell.max_tokens,
+        system_prompt=system_prompt,
+        question_id=cell.question_id,
+        question_text=cell.question_text,
+        response_text=result.content,
+        status=result.status,
+        error_message=result.error_message,
+        latency_ms=result.latency_ms,
+        token_input=resp.prompt_tokens if resp else None,
+        token_output=resp.completion_tokens if resp else None,
+        experiment_tag=experiment_tag,
+        cache_hit=result.cache_hit,
+        include_texts=False,
+        extra=extra,
+    )
+
+
+def cell_cache_key(cell: MatrixCell, system_prompt: str) -> str:
+    return cache_key(
+        cell.name,
+        cell.model,
+        cell.temperature,
+        cell.max_tokens,
+        system_prompt,
+        cell.question_text,
+        kind=cell.provider.kind,
+        base_url=cell.provider.base_url or "",
+    )
+
+
+def _cached_result(
+    cell: MatrixCell, system_prompt: str, cache: ResponseCache
+) -> Optional[CellResult]:
+    t0 = time.perf_counter()
+    hit = cache.get(cell_cache_key(cell, system_prompt))
+    if hit is None:
+        return None
+    latency_ms = (time.perf_counter() - t0) * 1000.0
+    return CellResult(
+        cell=cell,
+        content=hit["response_text"],
+        status="ok",
+        error_message=None,
+        latency_ms=latency_ms,
+        cache_hit=True,
+        response=ProviderResponse(
+            text=hit["response_text"],
+            total_ms=latency_ms,
+            prompt_tokens=hit.get("prompt_tokens"),
+            completion_tokens=hit.get("completion_tokens"),
+            finish_reason=hit.get("finish_reason"),
+        ),
+    )
+
+
+def _store_result(result: CellResult, system_prompt: str, cache: ResponseCache) -> None:
+    cell = result.cell
+    if cell.sampled:
+        return  # repeats never read the cache, so don't churn its LRU with them
+    resp = result.response
+    cache.put(
+        cell_cache_key(cell, system_prompt),
+        result.content,
+        provider=cell.name,
+        model=cell.model,
+        meta={
+            "latency_ms": result.latency_ms,
+            "prompt_tokens": resp.prompt_tokens if resp else None,
+            "completion_tokens": resp.completion_tokens if resp else None,
+            "finish_reason": resp.finish_reason if resp else None,
+        },
+    )
+
+
+def iter_matrix_results(
+    cells: List[MatrixCell],
+    system_prompt: str,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    scheduler: Optional[ProviderScheduler] = None,
+    cache: Optional[ResponseCache] = None,
+    cache_mode: str = "use",
+    cancel: Optional[threading.Event] = None,
+    dedupe: bool = True,
+) -> Iterator[CellResult]:
+    """
+    Fan cells out over a thread pool, keeping at most `max_concurrency`
+    calls in flight, and yield results in completion order.
+
+    Cells are queued per provider and dispatched round-robin; a provider
+    whose `scheduler` budget (rpm / tpm / max_concurrency) is exhausted is
+    simply passed over, so it never holds worker slots that other providers
+    could use. Retries stay on their worker and keep its slot, but each
+    one is charged against the rpm / tpm buckets again before it is sent.
+
+    With a `cache`, hits are yielded first (mode "use") and successful
+    fresh results are stored (modes "use" and "refresh").
+
+    Results are yielded on the caller's thread, so progress updates and
+    exports done by the consumer never race each other.
+
+    Once `cancel` is set, queued cells are dropped; calls already in flight
+    still finish and are yielded, so nothing paid for is lost.
+
+    With `dedupe`, cells whose requests are identical (same request_key)
+    make one call; the result is yielded for each of them, the copies
+    marked `dedup_of` and the original listing them in `shared_with`.
+    """
+    max_concurrency = max(1, int(max_concurrency))
+    scheduler = scheduler or ProviderScheduler()
+    if cache_mode not in CACHE_MODES:
+        raise ValueError(f"Unknown cache mode: {cache_mode}")
+    if cache_mode == "bypass":
+        cache = None
+
+    followers: Dict[str, List[MatrixCell]] = {}
+    if dedupe:
+        cells, followers = group_identical(cells)
+
+    def emit(result: CellResult) -> List[CellResult]:
+        cell = result.cell
+        return fan_out(result, followers.get(cell.request_key or cell.key, []))
+
+    queued_at = time.perf_counter()
+    blocked_since: Dict[int, float] = {}  # id(cell) -> first limiter refusal
+    queues: Dict[str, Deque[MatrixCell]] = {}
+    for cell in cells:
+        # Repeats measure the provider, so they never read the cache.
+        if cache is not None and cache_mode == "use" and not cell.sampled:
+            hit = _cached_result(cell, system_prompt, cache)
+            if hit is not None:
+                yield from emit(hit)
+                continue
+        queues.setdefault(cell.name, deque()).append(cell)
+    in_flight: Dict[Future, str] = {}
+
+    with ThreadPoolExecutor(
+        max_workers=min(max_concurrency, max(1, len(cells))),
+        thread_name_prefix="iqc-matrix",
+    ) as pool:
+        while queues or in_flight:
+            if cancel is not None and cancel.is_set():
+                queues.clear()
+            next_wait = math.inf
+            dispatched = True
+            while dispatched and len(in_flight) < max_concurrency:
+                dispatched = False
+                for name in list(queues):
+                    if len(in_flight) >= max_concurrency:
+                        break
+                    q = queues[name]
+                    cell = q[0]
+                    tokens = estimate_tokens(
+                        system_prompt, cell.question_text, cell.max_tokens
+                    )
+                    delay = scheduler.try_acquire(name, tokens)
+                    if delay > 0:
+                        blocked_since.setdefault(id(cell), time.perf_counter())
+                        next_wait = min(next_wait, delay)
+                        continue
+                    q.popleft()
+                    if not q:
+                        del queues[name]
+                    blocked = blocked_since.pop(id(cell), None)
+                    in_flight[
+                        pool.submit(
+                            call_cell,
+                            cell,
+                            system_prompt,
+                            functools.partial(scheduler.pause, name),
+                            queued_at,
+                            None if blocked is None else (time.perf_counter() - blocked) * 1000.0,
+                            functools.partial(scheduler.acquire_retry, name, tokens),
+                        )
+                    ] = name
+                    dispatched = True
+
+            if not in_flight:
+                if cancel is not None:
+                    cancel.wait(min(next_wait, 1.0))
+                else:
+                    time.sleep(min(next_wait, 1.0))
+                continue
+
+            timeout = None if math.isinf(next_wait) or not queues else next_wait
+            done, _ = wait(list(in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+            for fut in done:
+                scheduler.release(in_flight.pop(fut))
+                result = fut.result()
+                if cache is not None and result.status == "ok":
+                    _store_result(result, system_prompt, cache)
+                yield from emit(result)
+
+
+# ---------- Batch execution ----------
+
+class BatchRunner:
+    """
+    Runs cells flagged `batch` as one provider batch job per providers.yaml
+    entry. `start` submits the jobs and yields cache hits and submission
+    failures; `finish` polls the jobs and yields their results, so live
+    cells can run in between.
+
+    `attached` maps entry index -> id of a job an earlier attempt at this
+    run already submitted; it is polled instead of resubmitted.
+    `on_change` receives {entry index: batch id} of unfinished jobs
+    whenever that changes, after the finished job's results were yielded.
+    With `dedupe`, identical requests in a job share one custom_id (their
+    request_key) and are sent once; without it every cell is its own line.
+    """
+
+    def __init__(
+        self,
+        cells: List[MatrixCell],
+        system_prompt: str,
+        *,
+        run_id: str,
+        cache: Optional[ResponseCache] = None,
+        cache_mode: str = "use",
+        completion_window: str = DEFAULT_COMPLETION_WINDOW,
+        attached: Optional[Dict[int, str]] = None,
+        on_change: Optional[Callable[[Dict[int, str]], None]] = None,
+        dedupe: bool = True,
+    ) -> None:
+        self.cells = cells
+        self.system_prompt = system_prompt
+        self.run_id = run_id
+        self.cache = None if cache_mode == "bypass" else cache
+        self.cache_mode = cache_mode
+        self.completion_window = completion_window
+        self.attached = dict(attached or {})
+        self.on_change = on_change
+        self.dedupe = dedupe
+        self.jobs: List[Tuple[int, BatchJob, List[MatrixCell]]] = []
+        self._reported = dict(self.attached)
+
+    @property
+    def pending(self) -> Dict[int, str]:
+        return {mi: job.batch_id for mi, job, _ in self.jobs if job.batch_id}
+
+    def _changed(self) -> None:
+        pending = self.pending
+        if pending != self._reported:
+            self._reported = pending
+            if self.on_change is not None:
+                self.on_change(pending)
+
+    def _custom_id(self, cell: MatrixCell) -> str:
+        return (cell.request_key or cell.key) if self.dedupe else cell.key
+
+    def _body(self, cell: MatrixCell) -> Dict[str, Any]:
+        return cell.adapter.build_request(
+            cell.provider,
+            cell.api_key,
+            cell.model,
+            _cell_messages(cell, self.system_prompt),
+            cell.temperature,
+            cell.max_tokens,
+        ).payload
+
+    @staticmethod
+    def _error(cell: MatrixCell, message: str, batch_id: Optional[str] = None) -> CellResult:
+        return CellResult(
+            cell=cell,
+            content="",
+            status="error",
+            error_message=message,
+            latency_ms=None,
+            batch_id=batch_id,
+        )
+
+    def start(self) -> Iterator[CellResult]:
+        groups: Dict[int, List[MatrixCell]] = {}
+        for cell in self.cells:
+            if self.cache is not None and self.cache_mode == "use":
+                hit = _cached_result(cell, self.system_prompt, self.cache)
+                if hit is not None:
+                    yield hit
+                    continue
+            groups.setdefault(cell.m_idx, []).append(cell)
+
+        failed: List[CellResult] = []
+        for mi, group in groups.items():
+            first = group[0]
+            try:
+                job = BatchJob(
+                    first.provider,
+                    first.adapter,
+                    first.api_key,
+                    batch_id=self.attached.get(mi),
+                    completion_window=self.completion_window,
+                )
+                if job.batch_id is None:
+                    job.submit(
+                        {self._custom_id(c): self._body(c) for c in group},
+                        metadata={"run_id": self.run_id},
+                    )
+            except Exception as e:  # noqa: BLE001
+                failed.extend(self._error(c, str(e)) for c in group)
+                continue
+            self.jobs.append((mi, job, group))
+        self._changed()
+        yield from failed
+
+    def _collect(self, job: BatchJob, group: List[MatrixCell]) -> List[CellResult]:
+        try:
+            items = job.results()
+        except Exception as e:  # noqa: BLE001
+            return [self._error(c, str(e), job.batch_id) for c in group]
+        out: List[CellResult] = []
+        first: Dict[str, CellResult] = {}
+        for c in group:
+            cid = self._custom_id(c)
+            item = items.get(cid)
+            if item is None:
+                # The job may have been submitted with the other scheme (an
+                # earlier attempt with dedupe toggled, or before request keys).
+                cid = c.request_key if cid == c.key else c.key
+                item = items.get(cid)
+            if item is None or item.response is None:
+                msg = item.error if item is not None else (
+                    f"No result in batch {job.batch_id} (status: {job.status})."
+                )
+                out.append(self._error(c, msg, job.batch_id))
+                continue
+            result = CellResult(
+                cell=c,
+                content=item.response.text,
+                status="ok",
+                error_message=None,
+                latency_ms=None,
+                response=item.response,
+                attempts=1,
+                batch_id=job.batch_id,
+            )
+            leader = first.setdefault(cid, result)
+            if leader is not result:
+                result.dedup_of = leader.cell.key
+                leader.shared_with.append(c.key)
+            out.append(result)
+        return out
+
+    def finish(
+        self,
+        poll_interval_s: float = DEFAULT_BATCH_POLL_S,
+        cancel: Optional[threading.Event] = None,
+    ) -> Iterator[CellResult]:
+        """Poll until every job is collected; with `cancel` set, stop polling
+        and leave the unfinished jobs recorded for a later resume."""
+        while self.jobs:
+            if cancel is not None and cancel.is_set():
+                return
+            for entry in list(self.jobs):
+                mi, job, group = entry
+                try:
+                    job.poll()
+                except Exception as e:  # noqa: BLE001
+                    if classify_error(e)[0]:
+                        continue  # try again next round
+                    results = [self._error(c, str(e), job.batch_id) for c in group]
+                else:
+                    if not job.done:
+                        continue
+                    results = self._collect(job, group)
+                self.jobs.remove(entry)
+                for result in results:
+                    if self.cache is not None and result.status == "ok":
+                        _store_result(result, self.system_prompt, self.cache)
+                    yield result
+                self._changed()
+            if self.jobs:
+                if cancel is not None:
+                    cancel.wait(poll_interval_s)
+                else:
+                    time.sleep(poll_interval_s)
+
+
+# ---------- Run orchestration ----------
+
+@dataclass
+class RunOptions:
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+    stream: bool = False
+    cache_mode: str = "use"
+    cache_ttl_s: Optional[float] = None
+    cache_max_entries: Optional[int] = 100_000
+    experiment_tag: Optional[str] = None
+    resume: bool = False
+    retry: RetryPolicy = field(default_factory=RetryPolicy)
+    batch: bool = False
+    batch_poll_s: float = DEFAULT_BATCH_POLL_S
+    batch_window: str = DEFAULT_COMPLETION_WINDOW
+    parquet: bool = False
+    index: bool = True
+    shard: Optional[Tuple[int, int]] = None  # (index, count), index 0-based
+    dedupe: bool = True
+    repeats: int = 1  # samples per cell; entries may set `repeats:`
+    warmup: int = 0  # unmeasured calls per cell before the samples
+
+
+class MatrixRun:
+    """
+    One benchmark run over a (question × model) selection: plans the cells,
+    writes the manifest, executes them and streams rows into the run file.
+    Shared by the Streamlit UI and the headless CLI; nothing here touches
+    Streamlit.
+
+    Finished cells are recorded in the run journal. With `resume=True`,
+    cells the journal already marks "ok" are skipped and counted as done;
+    missing and failed cells run again.
+
+    `timing` aggregates the per-call phase breakdown by provider; `live`
+    keeps rolling per-provider/model metrics for progress displays.
+
+    Cells of batch entries go to provider batch jobs, submitted before the
+    live cells start and collected after they finish. Unfinished job ids
+    are kept in the manifest so a resumed run picks the jobs back up.
+
+    With `index=True` (the default) rows also go to the export directory's
+    results index as they are written.
+
+    `cancel()` may be called from any thread, e.g. by a job manager; the
+    run then stops starting calls, and unfinished batch jobs stay recorded
+    for a resume.
+
+    With `shard=(k, n)` only the cells of shard k run, and the run's files
+    are named after `part_id` (rows keep `run_id`); `iqc.shard.merge_shards`
+    combines the shards later. Shards skip the results index, the merge
+    feeds it instead.
+
+    With `parquet=True` a run that completes is also compacted into the
+    columnar dataset under <export_dir>/parquet (`parquet_dir`).
+
+    With `repeats` / `warmup` (or the entry keys of the same names) every
+    cell is sent several times; the run then ends by writing per-cell
+    latency statistics to run-<id>.samples.json (`samples_file`), see
+    iqc.sampling.
+    """
+
+    def __init__(
+        self,
+        *,
+        entries: List[Dict[str, Any]],
+        q_bank: List[Dict[str, Any]],
+        selected_q_idxs: List[int],
+        selected_model_idxs: List[int],
+        system_prompt: str,
+        export_dir: Path,
+        run_id: str,
+        options: Optional[RunOptions] = None,
+    ) -> None:
+        self.entries = entries
+        self.q_bank = q_bank
+        self.selected_q_idxs = list(selected_q_idxs)
+        self.selected_model_idxs = list(selected_model_idxs)
+        self.system_prompt = system_prompt
+        self.export_dir = Path(export_dir)
+        self.run_id = run_id
+        self.options = options or RunOptions()
+        shard = self.options.shard
+        self.part_id = shard_run_id(run_id, *shard) if shard else run_id
+
+        self.cells, self.warnings = plan_matrix(
+            entries,
+            q_bank,
+            self.selected_q_idxs,
+            self.selected_model_idxs,
+            stream=self.options.stream,
+            retry=self.options.retry,
+            batch=self.options.batch,
+            repeats=self.options.repeats,
+            warmup=self.options.warmup,
+        )
+        if shard:
+            self.cells = select_shard(self.cells, *shard)
+        if self.options.dedupe:
+            _, followers = group_identical(self.cells)
+            shared = sum(len(f) for f in followers.values())
+            if shared:
+                self.warnings.append(
+                    f"{shared} cell(s) repeat an identical request (same provider, "
+                    "model, settings and question text); each request is sent once "
+                    "and its response shared."
+                )
+        if self.options.parquet and not pyarrow_available():
+            self.options = replace(self.options, parquet=False)
+            self.warnings.append(
+                'pyarrow is not installed (pip install "iqc[parquet]"); '
+                "skipping the Parquet export."
+            )
+        self.sampled = any(c.sampled for c in self.cells)
+        self.total = len(self.cells)
+        self.journal = RunJournal(self.export_dir, self.part_id)
+        self.resumed = 0
+        if self.options.resume:
+            completed = self.journal.completed()
+            self.cells = [c for c in self.cells if c.key not in completed]
+            self.resumed = self.total - len(self.cells)
+        self.done = self.resumed
+        self.errors = 0
+        self.cache_hits = 0
+        self.timing = PhaseStats()
+        self.live = LiveMetrics(self.total, done=self.resumed)
+        self.parquet_dir: Optional[Path] = None
+        self.samples_file: Optional[Path] = None
+        self._cancel = threading.Event()
+
+    def cancel(self) -> None:
+        """Stop starting new calls; `results()` ends once in-flight calls finish."""
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def run_file(self) -> Path:
+        return run_file_path(self.export_dir, self.part_id)
+
+    def _write_manifest(self, **extra: Any) -> None:
+        if self.options.shard:
+            index, count = self.options.shard
+            extra.setdefault("shard", {"run_id": self.run_id, "index": index, "count": count})
+        write_run_manifest(
+            self.export_dir,
+            self.part_id,
+            system_prompt=self.system_prompt,
+            entries=[self.entries[mi] for mi in self.selected_model_idxs],
+            questions=[self.q_bank[qi] for qi in self.selected_q_idxs],
+            **extra,
+        )
+
+    def results(self) -> Iterator[CellResult]:
+        """Execute the run, yielding each result after its row is written."""
+        opts = self.options
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+        attached: Dict[int, str] = {}
+        if opts.resume:
+            saved = load_run_manifest(self.export_dir, self.part_id).get("batches") or {}
+            attached = {int(mi): bid for mi, bid in saved.items() if bid}
+        sampling = None
+        if opts.repeats > 1 or opts.warmup:
+            sampling = {"repeats": opts.repeats, "warmup": opts.warmup}
+        self._write_manifest(experiment_tag=opts.experiment_tag, sampling=sampling)
+        # Keep enough pooled connections per host for every in-flight call.
+        # Never shrink it: other runs may be sharing the sessions.
+        configure_http_pool(
+            pool_size=max(int(opts.max_concurrency), DEFAULT_POOL_SIZE, http_pool_size())
+        )
+        scheduler = ProviderScheduler.from_entries(self.entries)
+        cache = None
+        if opts.cache_mode != "bypass":
+            cache = ResponseCache(
+                self.export_dir / DEFAULT_CACHE_FILE,
+                ttl_s=opts.cache_ttl_s,
+                max_entries=opts.cache_max_entries,
+            )
+
+        on_flush: List[Callable[[List[Dict[str, Any]]], None]] = [self.journal.record_rows]
+        index = None
+        if opts.index and not opts.shard:
+            index = ResultsIndex.for_export_dir(self.export_dir)
+        if index is not None:
+            on_flush.append(index.add_rows)
+        writer = RunWriter(self.export_dir, self.part_id, on_flush=on_flush)
+
+        def record_batches(pending: Dict[int, str]) -> None:
+            # Rows of a finished job must be on disk before it is dropped.
+            writer.flush()
+            self._write_manifest(batches={str(mi): bid for mi, bid in pending.items()})
+
+        batches = BatchRunner(
+            [c for c in self.cells if c.batch],
+            self.system_prompt,
+            run_id=self.run_id,
+            cache=cache,
+            cache_mode=opts.cache_mode,
+            completion_window=opts.batch_window,
+            attached=attached,
+            on_change=record_batches,
+            dedupe=opts.dedupe,
+        )
+        def stages() -> Iterator[CellResult]:
+            if not self.cancelled:
+                yield from batches.start()
+            yield from iter_matrix_results(
+                [c for c in self.cells if not c.batch],
+                self.system_prompt,
+                opts.max_concurrency,
+                scheduler=scheduler,
+                cache=cache,
+                cache_mode=opts.cache_mode,
+                cancel=self._cancel,
+                dedupe=opts.dedupe,
+            )
+            yield from batches.finish(opts.batch_poll_s, cancel=self._cancel)
+
+        self.live.start()
+        try:
+            for result in stages():
+                row = result_row(
+                    result,
+                    run_id=self.run_id,
+                    system_prompt=self.system_prompt,
+                    experiment_tag=opts.experiment_tag,
+                )
+                writer.write(row)
+                self.timing.add_row(row)
+                self.live.add_row(row)
+                self.done += 1
+                self.errors += int(result.status != "ok")
+                self.cache_hits += int(result.cache_hit)
+                yield result
+        finally:
+            writer.close()
+            self.journal.close()
+            if cache is not None:
+                cache.close()
+            if index is not None:
+                index.close()
+        if self.sampled:
+            # From the run file, so samples taken before a resume count too.
+            self.samples_file = write_sample_summary(self.export_dir, self.part_id)
+        if opts.parquet and not self.cancelled and not opts.shard:
+            self.parquet_dir = compact_run(self.export_dir, self.run_id)
@@ -0,0 +1,228 @@
+# src/iqc/sampling.py
+
+"""
+Repeated sampling: latency statistics over the repeats of each cell.
+
+With `repeats: N` a (question, entry) cell is sent N times, optionally
+after `warmup: W` calls whose rows are marked `warmup` and left out of
+every statistic. The samples of one cell share `sample_of` (the cell key
+of sample 0), and a run summary holds, per cell:
+
+    n, errors, mean, std, min, p50, p95, p99, max
+    bootstrap confidence intervals for the mean and the median
+
+Statistics are computed on a (cells × samples) array padded with NaN, so
+a run with thousands of cells is summarised in a handful of NumPy calls.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+import json
+
+import numpy as np
+
+from iqc.export import RUN_FILE_PREFIX, iter_run_rows
+
+
+DEFAULT_BOOTSTRAP = 1000
+DEFAULT_CONFIDENCE = 0.95
+SAMPLE_METRIC = "latency_ms"
+# Upper bound on resampled values held at once (cells × bootstrap × samples).
+_BOOTSTRAP_CHUNK = 4_000_000
+
+
+def samples_path(export_dir: Path, run_id: str) -> Path:
+    return Path(export_dir) / f"{RUN_FILE_PREFIX}{run_id}.samples.json"
+
+
+def _padded(samples: Sequence[Sequence[float]]) -> np.ndarray:
+    """(cells × max samples) array, NaN past each cell's own count."""
+    n = np.array([len(s) for s in samples], dtype=np.int64)
+    values = np.full((len(samples), max(int(n.max(initial=0)), 1)), np.nan)
+    values[np.arange(values.shape[1]) < n[:, None]] = np.concatenate(
+        [np.asarray(s, dtype=np.float64) for s in samples] or [np.empty(0)]
+    )
+    return values
+
+
+def bootstrap_ci(
+    values: np.ndarray,
+    n: np.ndarray,
+    *,
+    n_boot: int = DEFAULT_BOOTSTRAP,
+    confidence: float = DEFAULT_CONFIDENCE,
+    seed: Optional[int] = 0,
+) -> Dict[str, np.ndarray]:
+    """
+    Percentile bootstrap of the mean and median of every row of `values`
+    (padded as by `_padded`, `n` samples per row, all rows n >= 1).
+    Returns {"mean": (cells × 2), "p50": (cells × 2)} low/high bounds.
+    """
+    rng = np.random.default_rng(seed)
+    cells, width = values.shape
+    tail = (1.0 - confidence) / 2.0 * 100.0
+    out = {"mean": np.empty((cells, 2)), "p50": np.empty((cells, 2))}
+    step = max(1, _BOOTSTRAP_CHUNK // max(1, n_boot * width))
+    valid = np.arange(width)
+    for lo in range(0, cells, step):
+        vals, cnt = values[lo : lo + step], n[lo : lo + step]
+        # Draw n_i indices per resample from each row's own samples; slots
+        # past n_i become NaN so every row resamples at its own size.
+        k = cnt[:, None, None]
+        idx = (rng.random((len(vals), n_boot, width)) * k).astype(np.int64)
+        drawn = np.take_along_axis(np.broadcast_to(vals[:, None, :], idx.shape), idx, axis=2)
+        drawn = np.where(valid < k, drawn, np.nan)
+        # Sorting moves the NaN padding to the end, so each resample's
+        # median sits at positions (n_i - 1) // 2 and n_i // 2.
+        drawn.sort(axis=2)
+        median = (
+            np.take_along_axis(drawn, (k - 1) // 2, axis=2)
+            + np.take_along_axis(drawn, k // 2, axis=2)
+        )[..., 0] / 2.0
+        for stat, boot in (("mean", np.nanmean(drawn, axis=2)), ("p50", median)):
+            out[stat][lo : lo + step] = np.percentile(
+                boot, [tail, 100.0 - tail], axis=1
+            ).T
+    return out
+
+
+def sample_stats(
+    samples: Sequence[Sequence[float]],
+    *,
+    n_boot: int = DEFAULT_BOOTSTRAP,
+    confidence: float = DEFAULT_CONFIDENCE,
+    seed: Optional[int] = 0,
+) -> Dict[str, np.ndarray]:
+    """
+    Per-group statistics for a list of sample lists, one array per
+    statistic. Groups without samples get NaN; std and the confidence
+    intervals need at least two samples.
+    """
+    n = np.array([len(s) for s in samples], dtype=np.int64)
+    values = _padded(samples)
+    has = n > 0
+    out: Dict[str, np.ndarray] = {"n": n}
+    for stat in ("mean", "std", "min", "p50", "p95", "p99", "max"):
+        out[stat] = np.full(len(n), np.nan)
+    for stat in ("mean_ci_low", "mean_ci_high", "p50_ci_low", "p50_ci_high"):
+        out[stat] = np.full(len(n), np.nan)
+    if not has.any():
+        return out
+
+    v, k = values[has], n[has]
+    mean = np.nanmean(v, axis=1)
+    out["mean"][has] = mean
+    ss = np.nansum((v - mean[:, None]) ** 2, axis=1)
+    out["std"][has] = np.where(k > 1, np.sqrt(ss / np.maximum(k - 1, 1)), np.nan)
+    out["min"][has] = np.nanmin(v, axis=1)
+    out["max"][has] = np.nanmax(v, axis=1)
+    p50, p95, p99 = np.nanpercentile(v, [50, 95, 99], axis=1)
+    out["p50"][has], out["p95"][has], out["p99"][has] = p50, p95, p99
+
+    multi = k > 1
+    if multi.any() and n_boot > 0:
+        ci = bootstrap_ci(v[multi], k[multi], n_boot=n_boot, confidence=confidence, seed=seed)
+        rows = np.flatnonzero(has)[multi]
+        out["mean_ci_low"][rows], out["mean_ci_high"][rows] = ci["mean"].T
+        out["p50_ci_low"][rows], out["p50_ci_high"][rows] = ci["p50"].T
+    return out
+
+
+def _num(x: Any) -> Optional[float]:
+    return None if x is None or np.isnan(x) else float(x)
+
+
+def summarize_samples(
+    rows: Iterable[Dict[str, Any]],
+    *,
+    metric: str = SAMPLE_METRIC,
+    n_boot: int = DEFAULT_BOOTSTRAP,
+    confidence: float = DEFAULT_CONFIDENCE,
+    seed: Optional[int] = 0,
+) -> List[Dict[str, Any]]:
+    """
+    One summary per sampled cell of an export row stream, ordered by
+    provider, model and question. Warm-ups are left out; cache hits and
+    shared (dedup) copies are counted as `skipped`, not measured. Only the
+    latest row per cell_key counts, as a resume may re-write a sample.
+    Runs without repeats (no `sample_of` on any row) give [].
+    """
+    latest: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        if row.get("sample_of") and row.get("cell_key"):
+            latest[row["cell_key"]] = row
+
+    groups: Dict[str, Dict[str, Any]] = {}
+    for row in latest.values():
+        g = groups.get(row["sample_of"])
+        if g is None:
+            g = groups[row["sample_of"]] = {
+                "cell_key": row["sample_of"],
+                "question_id": row.get("question_id"),
+                "provider": row.get("provider"),
+                "model": row.get("model"),
+                "warmups": 0,
+                "errors": 0,
+                "skipped": 0,
+                "values": [],
+            }
+        if row.get("warmup"):
+            g["warmups"] += 1
+        elif row.get("status") != "ok":
+            g["errors"] += 1
+        elif row.get("cache_hit") or row.get("dedup_of") or row.get(metric) is None:
+            g["skipped"] += 1
+        else:
+            g["values"].append(float(row[metric]))
+    if not groups:
+        return []
+
+    cells = sorted(
+        groups.values(),
+        key=lambda g: (str(g["provider"]), str(g["model"]), str(g["question_id"])),
+    )
+    stats = sample_stats(
+        [g.pop("values") for g in cells], n_boot=n_boot, confidence=confidence, seed=seed
+    )
+    for i, g in enumerate(cells):
+        g["metric"] = metric
+        g["n"] = int(stats["n"][i])
+        for stat in ("mean", "std", "min", "p50", "p95", "p99", "max"):
+            g[stat] = _num(stats[stat][i])
+        g["confidence"] = confidence
+        for stat in ("mean_ci_low", "mean_ci_high", "p50_ci_low", "p50_ci_high"):
+            g[stat] = _num(stats[stat][i])
+    return cells
+
+
+def write_sample_summary(
+    export_dir: Path,
+    run_id: str,
+    rows: Optional[Iterable[Dict[str, Any]]] = None,
+    **kwargs: Any,
+) -> Optional[Path]:
+    """
+    Summarise the samples of run `run_id` (its run files, or `rows`) into
+    run-<run_id>.samples.json. Returns None, writing nothing, for runs
+    without repeats.
+    """
+    cells = summarize_samples(
+        iter_run_rows(export_dir, run_id) if rows is None else rows, **kwargs
+    )
+    if not cells:
+        return None
+    path = samples_path(export_dir, run_id)
+    path.write_text(
+        json.dumps({"run_id": run_id, "cells": cells}, indent=2, ensure_ascii=False),
+        encoding="utf-8",
+    )
+    return path
+
+
+def load_sample_summary(export_dir: Path, run_id: str) -> List[Dict[str, Any]]:
+    path = samples_path(export_dir, run_id)
+    if not path.exists():
+        return []
+    return json.loads(path.read_text(encoding="utf-8")).get("cells") or []
@@ -0,0 +1,233 @@
+# src/iqc/sessions.py
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+import os
+import socket
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError
+
+from iqc.timing import current_timing
+
+
+# ---------- Pool configuration ----------
+
+DEFAULT_POOL_SIZE = int(os.getenv("IQC_HTTP_POOL_SIZE", "16") or 16)
+DEFAULT_KEEP_ALIVE = os.getenv("IQC_HTTP_KEEPALIVE", "1").strip().lower() not in (
+    "0",
+    "false",
+    "no",
+    "off",
+)
+
+_lock = threading.Lock()
+_sessions: Dict[str, requests.Session] = {}
+_config: Dict[str, Any] = {
+    "pool_size": DEFAULT_POOL_SIZE,
+    "keep_alive": DEFAULT_KEEP_ALIVE,
+}
+
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+# ---------- Phase timing hooks ----------
+#
+# Connection classes that report dns / connect / tls / send / ttfb to the
+# calling thread's CallTiming (iqc.timing). Without an active probe they
+# behave exactly like urllib3's.
+
+class _TimedConnectionMixin:
+    _dns_host: str
+    port: int
+
+    def _new_conn(self) -> socket.socket:
+        timing = current_timing()
+        if timing is None:
+            return super()._new_conn()  # type: ignore[misc]
+        t0 = time.perf_counter()
+        host = self._dns_host
+        try:
+            infos = socket.getaddrinfo(host, self.port, 0, socket.SOCK_STREAM)
+        except OSError:
+            infos = []
+        timing.since("dns_ms", t0)
+        t1 = time.perf_counter()
+        addrs = list(dict.fromkeys(info[4][0] for info in infos))
+        if not addrs:
+            sock = super()._new_conn()  # type: ignore[misc]
+            timing.since("connect_ms", t1)
+            return sock
+
+        # Connect to the addresses just resolved, so dns is not paid twice,
+        # trying each in turn as create_connection would. The connect timeout
+        # covers all of them together, not each one.
+        timeout = self.timeout  # type: ignore[attr-defined]
+        deadline = t1 + timeout if isinstance(timeout, (int, float)) else None
+        error: Optional[Exception] = None
+        try:
+            for addr in addrs:
+                if deadline is not None:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self.timeout = remaining
+                self._dns_host = addr
+                try:
+                    sock = super()._new_conn()  # type: ignore[misc]
+                except Exception as e:  # noqa: BLE001
+                    error = e
+                    continue
+                timing.since("connect_ms", t1)
+                return sock
+        finally:
+            self._dns_host = host
+            self.timeout = timeout
+        if error is None:
+            raise ConnectTimeoutError(
+                self, f"Connection to {host} timed out. (connect timeout={timeout})"
+            )
+        raise error
+
+    def request(self, *args: Any, **kwargs: Any) -> Any:
+        timing = current_timing()
+        if timing is None:
+            return super().request(*args, **kwargs)  # type: ignore[misc]
+        setup0 = timing.setup_ms()
+        t0 = time.perf_counter()
+        out = super().request(*args, **kwargs)  # type: ignore[misc]
+        # Plain HTTP connects lazily inside request(); keep that out of send.
+        elapsed = (time.perf_counter() - t0) * 1000.0
+        timing.add("send_ms", max(0.0, elapsed - (timing.setup_ms() - setup0)))
+        return out
+
+    def getresponse(self, *args: Any, **kwargs: Any) -> Any:
+        timing = current_timing()
+        if timing is None:
+            return super().getresponse(*args, **kwargs)  # type: ignore[misc]
+        t0 = time.perf_counter()
+        resp = super().getresponse(*args, **kwargs)  # type: ignore[misc]
+        timing.since("ttfb_ms", t0)
+        timing.headers_received()
+        return resp
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    def connect(self) -> None:
+        timing = current_timing()
+        if timing is None:
+            return super().connect()
+        setup0 = timing.setup_ms()
+        t0 = time.perf_counter()
+        super().connect()
+        elapsed = (time.perf_counter() - t0) * 1000.0
+        timing.add("tls_ms", max(0.0, elapsed - (timing.setup_ms() - setup0)))
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+def _new_session(pool_size: int) -> requests.Session:
+    s = requests.Session()
+    # One host per session, so a single connection pool of `pool_size`
+    # sockets; block=False lets bursts above the cap open extra
+    # short-lived connections instead of stalling.
+    adapter = _TimedAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+
+def close_sessions() -> None:
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for s in sessions:
+        s.close()
+
+
+def configure_http_pool(
+    pool_size: Optional[int] = None,
+    keep_alive: Optional[bool] = None,
+) -> None:
+    """
+    Set the per-host pool size and keep-alive behaviour. Existing sessions
+    are dropped only when the settings actually change.
+    """
+    changed = False
+    with _lock:
+        if pool_size is not None and int(pool_size) != _config["pool_size"]:
+            _config["pool_size"] = max(1, int(pool_size))
+            changed = True
+        if keep_alive is not None and bool(keep_alive) != _config["keep_alive"]:
+            _config["keep_alive"] = bool(keep_alive)
+            changed = True
+    if changed:
+        close_sessions()
+
+
+def http_pool_size() -> int:
+    with _lock:
+        return int(_config["pool_size"])
+
+
+def get_session(url: str) -> requests.Session:
+    """Shared session for the scheme://host of `url`, created on first use."""
+    key = _origin(url)
+    with _lock:
+        s = _sessions.get(key)
+        if s is None:
+            s = _new_session(_config["pool_size"])
+            _sessions[key] = s
+        return s
+
+
+def _request(method: str, url: str, **kwargs: Any) -> requests.Response:
+    if not _config["keep_alive"]:
+        headers = dict(kwargs.pop("headers", None) or {})
+        headers["Connection"] = "close"
+        kwargs["headers"] = headers
+    resp = get_session(url).request(method, url, **kwargs)
+    if not kwargs.get("stream"):
+        timing = current_timing()
+        if timing is not None:
+            timing.body_read()
+    return resp
+
+
+def http_post(url: str, **kwargs: Any) -> requests.Response:
+    """`requests.post` drop-in that reuses pooled, keep-alive connections."""
+    return _request("POST", url, **kwargs)
+
+
+def http_get(url: str, **kwargs: Any) -> requests.Response:
+    """`requests.get` counterpart of `http_post`."""
+    return _request("GET", url, **kwargs)
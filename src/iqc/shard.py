@@ -0,0 +1,237 @@
+# src/iqc/shard.py
+
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, TypeVar
+import hashlib
+import json
+import os
+import re
+
+from iqc.core import utc_timestamp
+from iqc.export import (
+    RUN_FILE_PREFIX,
+    SHARD_RE,
+    iter_run_rows,
+    load_run_manifest,
+    run_file_path,
+    run_files,
+    save_run_manifest,
+)
+from iqc.index import forget_ingested
+from iqc.journal import journal_path
+
+
+# ---------- Shard assignment ----------
+#
+# A cell belongs to shard  sha256(cell_key) mod n. The cell key depends only
+# on the question and the providers.yaml entry, so every process or host
+# that loads the same config and selection computes the same split, with
+# no coordination beyond the shared export directory.
+
+T = TypeVar("T")
+
+
+def parse_shard_spec(spec: str) -> Tuple[int, int]:
+    """"3/8" -> (2, 8): 1-based on the command line, 0-based inside."""
+    m = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", spec or "")
+    if not m:
+        raise ValueError(f"Shard must look like K/N, got {spec!r}")
+    k, n = int(m.group(1)), int(m.group(2))
+    if n < 1 or not 1 <= k <= n:
+        raise ValueError(f"Shard {spec!r} is out of range")
+    return k - 1, n
+
+
+def shard_of(cell_key: str, count: int) -> int:
+    digest = hashlib.sha256(cell_key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+def select_shard(cells: Sequence[T], index: int, count: int) -> List[T]:
+    """
+    Cells (anything with a `.key`) that fall into shard `index` of `count`.
+    Repeats of a cell go by `sample_of`, so one shard holds all its samples.
+    """
+    if count <= 1:
+        return list(cells)
+    return [
+        c
+        for c in cells
+        if shard_of(getattr(c, "sample_of", None) or c.key, count) == index  # type: ignore[attr-defined]
+    ]
+
+
+def find_shards(export_dir: Path, run_id: str) -> Dict[int, Tuple[int, str]]:
+    """{index: (count, shard run id)} for every shard that wrote a manifest."""
+    out: Dict[int, Tuple[int, str]] = {}
+    prefix = f"{RUN_FILE_PREFIX}{run_id}"
+    for path in Path(export_dir).glob(f"{prefix}.shard-*.manifest.json"):
+        part_id = path.name[len(RUN_FILE_PREFIX) : -len(".manifest.json")]
+        m = SHARD_RE.search(part_id)
+        if m and part_id[: m.start()] == run_id:
+            out[int(m.group(1)) - 1] = (int(m.group(2)), part_id)
+    return out
+
+
+# ---------- Merging ----------
+#
+# Duplicate rows for one cell come from resumed shards (a retried cell is
+# appended again), a shard run twice, or shards of runs with a different
+# shard count. The policy decides which row a merged run keeps:
+#   prefer-ok  newest ok row, else the newest row (default)
+#   latest     newest row
+#   first      oldest row
+#   all        keep every row
+# "Newest" is by timestamp_utc, then shard and file order.
+
+DUPLICATE_POLICIES = ("prefer-ok", "latest", "first", "all")
+
+
+@dataclass
+class MergeReport:
+    run_id: str
+    policy: str
+    shards: List[str] = field(default_factory=list)
+    shard_count: int = 0
+    missing: List[int] = field(default_factory=list)  # 1-based shard numbers
+    rows_in: int = 0
+    rows_out: int = 0
+    duplicate_cells: int = 0
+    conflicting_cells: int = 0  # duplicates whose status differs
+    path: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _pick(rows: List[Dict[str, Any]], policy: str) -> Dict[str, Any]:
+    # `rows` are in arrival order; a stable sort keeps it for equal timestamps.
+    ordered = sorted(rows, key=lambda r: r.get("timestamp_utc") or "")
+    if policy == "first":
+        return ordered[0]
+    if policy == "prefer-ok":
+        ok = [r for r in ordered if r.get("status") == "ok"]
+        if ok:
+            return ok[-1]
+    return ordered[-1]
+
+
+def _merge_manifests(
+    export_dir: Path, run_id: str, part_ids: List[str], extra: Dict[str, Any]
+) -> None:
+    merged = load_run_manifest(export_dir, run_id)
+    merged["run_id"] = run_id
+    known = {json.dumps(e, sort_keys=True, default=str) for e in merged["providers"]}
+    for part_id in part_ids:
+        m = load_run_manifest(export_dir, part_id)
+        merged["system_prompts"].update(m.get("system_prompts") or {})
+        for h, q in (m.get("questions") or {}).items():
+            slot = merged["questions"].setdefault(h, {"text": q["text"], "ids": []})
+            slot["ids"].extend(i for i in q.get("ids", []) if i not in slot["ids"])
+        for e in m.get("providers") or []:
+            sig = json.dumps(e, sort_keys=True, default=str)
+            if sig not in known:
+                known.add(sig)
+                merged["providers"].append(e)
+        for k in ("experiment_tag",):
+            if m.get(k) is not None:
+                merged[k] = m[k]
+    merged.pop("batches", None)
+    merged.pop("shard", None)
+    merged.update(extra)
+    save_run_manifest(export_dir, run_id, merged)
+
+
+def merge_shards(
+    export_dir: Path,
+    run_id: str,
+    policy: str = "prefer-ok",
+    allow_missing: bool = False,
+) -> Tuple[MergeReport, List[Dict[str, Any]]]:
+    """
+    Combine the shard files of `run_id` into the plain run: run file,
+    journal (so `--resume` works on the merged run) and manifest. The run
+    file is replaced atomically, so merging again, e.g. after more shards
+    finished, is safe. Returns the report and the merged rows.
+    """
+    if policy not in DUPLICATE_POLICIES:
+        raise ValueError(f"Unknown duplicate policy: {policy}")
+    export_dir = Path(export_dir)
+    shards = find_shards(export_dir, run_id)
+    if not shards:
+        raise FileNotFoundError(f"No shards of run {run_id} in {export_dir}")
+    counts = {count for count, _ in shards.values()}
+    if len(counts) > 1 and not allow_missing:
+        raise ValueError(
+            f"Shards of run {run_id} use different shard counts {sorted(counts)}; "
+            "pass allow_missing to merge them anyway."
+        )
+    count = max(counts)
+    missing = [i + 1 for i in range(count) if i not in shards]
+    if missing and not allow_missing:
+        raise ValueError(f"Run {run_id} is missing shard(s) {missing} of {count}.")
+
+    report = MergeReport(run_id=run_id, policy=policy, shard_count=count, missing=missing)
+    by_cell: Dict[str, List[Dict[str, Any]]] = {}
+    order: List[str] = []
+    unkeyed: List[Dict[str, Any]] = []
+    for index in sorted(shards):
+        part_id = shards[index][1]
+        report.shards.append(part_id)
+        for row in iter_run_rows(export_dir, part_id):
+            report.rows_in += 1
+            row["run_id"] = run_id
+            key = row.get("cell_key")
+            if not key:
+                unkeyed.append(row)
+                continue
+            if key not in by_cell:
+                by_cell[key] = []
+                order.append(key)
+            by_cell[key].append(row)
+
+    merged: List[Dict[str, Any]] = []
+    for key in order:
+        rows = by_cell[key]
+        if len(rows) > 1:
+            report.duplicate_cells += 1
+            report.conflicting_cells += int(len({r.get("status") for r in rows}) > 1)
+        merged.extend(rows if policy == "all" else [_pick(rows, policy)])
+    merged.extend(unkeyed)
+    report.rows_out = len(merged)
+
+    # Run file: written aside, then swapped in; stale size-rotated parts go.
+    target = run_file_path(export_dir, run_id)
+    replaced = [target]
+    for old in run_files(export_dir, run_id):
+        if old != target:
+            old.unlink()
+            replaced.append(old)
+    tmp = target.with_suffix(".jsonl.tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        for row in merged:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    os.replace(tmp, target)
+    # The index read the old files up to a byte offset; start them over.
+    forget_ingested(export_dir, replaced)
+    report.path = str(target)
+
+    ts = utc_timestamp()
+    jpath = journal_path(export_dir, run_id)
+    jtmp = jpath.with_suffix(".jsonl.tmp")
+    with jtmp.open("w", encoding="utf-8") as f:
+        for row in merged:
+            if row.get("cell_key"):
+                f.write(
+                    json.dumps({"cell_key": row["cell_key"], "status": row.get("status"), "ts": ts})
+                    + "\n"
+                )
+    os.replace(jtmp, jpath)
+
+    summary = report.to_dict()
+    summary.pop("path")
+    _merge_manifests(export_dir, run_id, report.shards, {"merge": summary})
+    return report, merged
@@ -0,0 +1,153 @@
+# src/iqc/timing.py
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+import math
+import threading
+import time
+
+
+# ---------- Phases ----------
+#
+# Harness-side waits:
+#   queue_ms     cell queued -> worker starts the call (concurrency cap,
+#                rate limits, pool hand-off)
+#   throttle_ms  part of queue_ms spent refused by the provider's limiter
+#   backoff_ms   retry sleeps (all attempts)
+# Network phases of the final attempt (None when not observed, e.g. a
+# reused keep-alive connection has no dns/connect/tls):
+#   dns_ms, connect_ms, tls_ms   new connection setup
+#   send_ms      writing the request
+#   ttfb_ms      request written -> response headers (server + RTT)
+#   read_ms      headers -> body fully read (for streams: generation time)
+#   decode_ms    JSON decoding and response parsing
+
+HARNESS_PHASES = ("queue_ms", "throttle_ms", "backoff_ms")
+NETWORK_PHASES = (
+    "dns_ms",
+    "connect_ms",
+    "tls_ms",
+    "send_ms",
+    "ttfb_ms",
+    "read_ms",
+    "decode_ms",
+)
+PHASES = HARNESS_PHASES + NETWORK_PHASES
+
+
+class CallTiming:
+    """Phase durations of one provider call attempt."""
+
+    __slots__ = ("phases", "headers_at")
+
+    def __init__(self) -> None:
+        self.phases: Dict[str, float] = {}
+        self.headers_at: Optional[float] = None
+
+    def add(self, phase: str, ms: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + ms
+
+    def since(self, phase: str, t0: float) -> None:
+        self.add(phase, (time.perf_counter() - t0) * 1000.0)
+
+    def setup_ms(self) -> float:
+        p = self.phases
+        return p.get("dns_ms", 0.0) + p.get("connect_ms", 0.0) + p.get("tls_ms", 0.0)
+
+    def headers_received(self) -> None:
+        self.headers_at = time.perf_counter()
+
+    def body_read(self) -> None:
+        """Close the read phase; no-op when headers were never seen."""
+        if self.headers_at is not None:
+            self.since("read_ms", self.headers_at)
+            self.headers_at = None
+
+
+_local = threading.local()
+
+
+def current_timing() -> Optional[CallTiming]:
+    """The probe of the call running on this thread, if it is being timed."""
+    return getattr(_local, "timing", None)
+
+
+@contextmanager
+def measure_call() -> Iterator[CallTiming]:
+    timing = CallTiming()
+    prev = current_timing()
+    _local.timing = timing
+    try:
+        yield timing
+    finally:
+        _local.timing = prev
+
+
+# ---------- Aggregation ----------
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Linear-interpolated percentile, q in [0, 100]."""
+    if not values:
+        return math.nan
+    xs = sorted(values)
+    k = (len(xs) - 1) * q / 100.0
+    lo, hi = int(math.floor(k)), int(math.ceil(k))
+    return xs[lo] + (xs[hi] - xs[lo]) * (k - lo)
+
+
+class PhaseStats:
+    """Per-provider phase samples, fed with export rows."""
+
+    def __init__(self) -> None:
+        self._samples: Dict[str, Dict[str, List[float]]] = {}
+
+    def add_row(self, row: Dict[str, Any]) -> None:
+        if row.get("cache_hit") or row.get("dedup_of") or row.get("warmup"):
+            return
+        slot = self._samples.setdefault(str(row.get("provider")), {})
+        for phase in PHASES + ("latency_ms",):
+            v = row.get(phase)
+            if v is not None:
+                slot.setdefault(phase, []).append(float(v))
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """{provider: {phase: {n, mean, p50, p95}}}"""
+        out: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for provider, phases in sorted(self._samples.items()):
+            out[provider] = {
+                phase: {
+                    "n": len(vals),
+                    "mean": sum(vals) / len(vals),
+                    "p50": percentile(vals, 50),
+                    "p95": percentile(vals, 95),
+                }
+                for phase, vals in phases.items()
+            }
+        return out
+
+
+def summarize_timing(rows: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Dict[str, float]]]:
+    stats = PhaseStats()
+    for row in rows:
+        stats.add_row(row)
+    return stats.summary()
+
+
+def format_timing_table(
+    summary: Dict[str, Dict[str, Dict[str, float]]], stat: str = "mean"
+) -> str:
+    """Plain-text table: one row per provider, one column per phase."""
+    cols = [p for p in PHASES + ("latency_ms",) if any(p in s for s in summary.values())]
+    if not cols:
+        return ""
+    width = max([len("provider")] + [len(p) for p in summary])
+    head = "provider".ljust(width) + "".join(f"{c[:-3]:>10}" for c in cols)
+    lines = [head + f"   ({stat} ms)"]
+    for provider, phases in summary.items():
+        cells = "".join(
+            f"{phases[c][stat]:>10.1f}" if c in phases else f"{'-':>10}" for c in cols
+        )
+        lines.append(provider.ljust(width) + cells)
+    return "\n".join(lines)
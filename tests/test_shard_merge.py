@@ -0,0 +1,67 @@
+# tests/test_shard_merge.py
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from iqc.bench import BENCH_PROVIDERS
+from iqc.index import ResultsIndex
+from iqc.mockserver import MockServer
+from iqc.runner import MatrixRun, RunOptions
+from iqc.shard import merge_shards
+
+
+QUESTIONS = [{"id": f"Q{i}", "text": f"Question {i}?"} for i in range(1, 7)]
+
+
+@pytest.fixture
+def mock_url():
+    with MockServer() as srv:
+        yield srv.url
+
+
+def _run_shard(export_dir: Path, url: str, index: int, count: int) -> None:
+    entries = [
+        {
+            "name": BENCH_PROVIDERS["openai"],
+            "model": "mock-openai",
+            "api_key": "mock-key",
+            "base_url": url,
+        }
+    ]
+    run = MatrixRun(
+        entries=entries,
+        q_bank=QUESTIONS,
+        selected_q_idxs=list(range(len(QUESTIONS))),
+        selected_model_idxs=[0],
+        system_prompt="You are a test target.",
+        export_dir=export_dir,
+        run_id="r1",
+        options=RunOptions(cache_mode="bypass", shard=(index, count)),
+    )
+    for _ in run.results():
+        pass
+
+
+def _indexed(export_dir: Path) -> list:
+    with ResultsIndex.for_export_dir(export_dir) as index:
+        index.ingest_dir(export_dir)
+        return index.runs()
+
+
+def test_remerge_then_query(tmp_path: Path, mock_url: str) -> None:
+    _run_shard(tmp_path, mock_url, 0, 2)
+    _run_shard(tmp_path, mock_url, 1, 2)
+    merge_shards(tmp_path, "r1")
+    assert [r["rows"] for r in _indexed(tmp_path)] == [len(QUESTIONS)]
+
+    # Re-running a shard appends rows for the same cells; merging with
+    # "all" rewrites the run file larger, "prefer-ok" smaller again.
+    _run_shard(tmp_path, mock_url, 1, 2)
+    _run_shard(tmp_path, mock_url, 1, 2)
+    for policy in ("all", "prefer-ok"):
+        report, _ = merge_shards(tmp_path, "r1", policy)
+        assert report.duplicate_cells > 0
+        assert [r["rows"] for r in _indexed(tmp_path)] == [len(QUESTIONS)]